@@ -0,0 +1,117 @@
+"""
+Helpers shared by the benchmarks: loading a ThermalCameraImpl without a camera, timing and allocation
+measurement, and synthetic frames.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_pyspin
+fake_pyspin.install()
+
+import RobotRaconteur as RR
+RRN = RR.RobotRaconteurNode.s
+import RobotRaconteurCompanion as RRC
+from RobotRaconteurCompanion.Util.InfoFileLoader import InfoFileLoader
+
+from flir_thermal_camera_robotraconteur_driver import thermal_camera_driver
+from flir_thermal_camera_robotraconteur_driver.thermal_camera_driver import ThermalCameraImpl
+
+_config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config",
+    "flir_thermovision_a320_default_config.yml")
+
+_types_registered = False
+
+
+def load_camera(**kwargs):
+    """Create a ThermalCameraImpl backed by a fake A320 node map, without starting acquisition"""
+    global _types_registered
+    if not _types_registered:
+        RRC.RegisterStdRobDefServiceTypes(RRN)
+        RRN.RegisterServiceTypeFromFile(thermal_camera_driver._robdef_file)
+        _types_registered = True
+    with open(_config_file) as f:
+        camera_info, _ = InfoFileLoader(RRN).LoadInfoFileFromString(f.read(),
+            "com.robotraconteur.imaging.camerainfo.CameraInfo", "camera")
+    camera = ThermalCameraImpl(None, camera_info, **kwargs)
+    camera._set_nodemap(fake_pyspin.a320_nodemap())
+    camera._current_irformat = "temperature_linear_10mK"
+    camera._update_scale_limits()
+    return camera
+
+
+def synthetic_frame(height, width, ir_format, seed=0):
+    """Frame of a 20 C to 30 C gradient with a 60 C hot spot and noise, in the raw counts of ir_format"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    kelvin = 293.15 + 10.0 * x / max(width - 1, 1) \
+        + 40.0 * np.exp(-((x - width / 2.0) ** 2 + (y - height / 2.0) ** 2) / (2.0 * (width / 40.0) ** 2)) \
+        + rng.normal(0.0, 0.05, (height, width))
+    if ir_format == "temperature_linear_10mK":
+        counts = kelvin * 100.0
+    elif ir_format == "temperature_linear_100mK":
+        counts = kelvin * 10.0
+    else:
+        # Roughly the radiometric counts range of an uncooled microbolometer
+        counts = 12000.0 + (kelvin - 273.15) * 80.0
+    return np.clip(np.round(counts), 0, 65535).astype(np.uint16)
+
+
+def time_stage(f, iterations, warmup=10):
+    """Call f repeatedly and return latency percentiles in microseconds and the call rate"""
+    for _ in range(warmup):
+        f()
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        f()
+        samples[i] = time.perf_counter() - t0
+    return {
+        "iterations": iterations,
+        "mean_us": float(samples.mean() * 1e6),
+        "p50_us": float(np.percentile(samples, 50) * 1e6),
+        "p90_us": float(np.percentile(samples, 90) * 1e6),
+        "p99_us": float(np.percentile(samples, 99) * 1e6),
+        "max_us": float(samples.max() * 1e6),
+        "calls_per_second": float(iterations / samples.sum())
+    }
+
+
+def measure_allocations(f, iterations=20):
+    """
+    Return the bytes and number of blocks allocated per call by f that are still alive after the call,
+    including the result, and the peak bytes allocated during a call
+
+    Measured separately from timing since tracemalloc slows down allocation.
+    """
+    f()
+    tracemalloc.start()
+    try:
+        # Ignore the snapshots themselves
+        snapshot_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        snapshot_before = tracemalloc.take_snapshot().filter_traces(snapshot_filters)
+        peak = 0
+        results = [None] * iterations
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            results[i] = f()
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - start)
+        snapshot_after = tracemalloc.take_snapshot().filter_traces(snapshot_filters)
+        stats = snapshot_after.compare_to(snapshot_before, "filename")
+        del results
+    finally:
+        tracemalloc.stop()
+    return {
+        "allocated_bytes_per_call": sum(stat.size_diff for stat in stats) / iterations,
+        "allocated_blocks_per_call": sum(stat.count_diff for stat in stats) / iterations,
+        "peak_bytes_per_call": peak
+    }
@@ -0,0 +1,150 @@
+"""
+Benchmark the per-frame hot path and the parameter paths of ThermalCameraImpl
+
+Frames are fed through _image_received as PySpin images from the fake_pyspin stand-in, and each encoding
+stage is timed separately on the same frame. Reports latency percentiles, calls per second, and
+allocations for each stage, frame size and ir_format.
+
+Usage: python benchmarks/bench_hot_path.py [--sizes 320x240,640x512] [--iterations N] [--output results.json]
+"""
+
+import argparse
+import datetime
+import json
+import platform
+
+import cv2
+import numpy as np
+
+from bench_common import RRN, fake_pyspin, load_camera, synthetic_frame, time_stage, measure_allocations
+
+import RobotRaconteur as RR
+from RobotRaconteur.RobotRaconteurPythonUtil import PackMessageElement
+
+from flir_thermal_camera_robotraconteur_driver.frame_codecs import compression_modes
+
+_ir_formats = ["temperature_linear_10mK", "temperature_linear_100mK", "radiometric"]
+
+# Parameters a calibration routine pushes each cycle
+_radiometric_param_names = ["object_emissivity", "object_distance", "reflected_temperature",
+    "atmospheric_temperature", "relative_humidity", "estimated_transmission", "ext_optics_temperature",
+    "ext_optics_transmission"]
+
+
+def frame_stages(camera, mat, ir_format):
+    """Return (name, function) pairs for each stage of the per-frame path"""
+    pyspin_image = fake_pyspin.Image(mat)
+    camera._image_received(pyspin_image)
+    frame = camera._current_frame
+    header = frame.data_header
+
+    def compress(mode):
+        def f():
+            camera._frame_compressor.mode = mode
+            return camera._cv_mat_to_compressed_image(mat, header, ir_format)
+        return f
+
+    def frame_path():
+        # Single threaded cost of one frame through capture and the three standard streams
+        camera._image_received(pyspin_image)
+        frame = camera._current_frame
+        camera._frame_compressor.mode = "png"
+        return (camera._cv_mat_to_image(frame.mat, frame.data_header, ir_format),
+            camera._cv_mat_to_compressed_image(frame.mat, frame.data_header, ir_format),
+            camera._cv_mat_to_preview_image(frame.mat, ir_format, frame.data_header))
+
+    stages = [
+        ("image_received", lambda: camera._image_received(pyspin_image)),
+        ("cv_mat_to_image", lambda: camera._cv_mat_to_image(mat, header, ir_format)),
+        ("cv_mat_to_image_marshal", lambda: PackMessageElement(camera._cv_mat_to_image(mat, header, ir_format),
+            "com.robotraconteur.image.Image", node=RRN))
+    ]
+    for mode in compression_modes:
+        stages.append((f"cv_mat_to_compressed_image_{mode}", compress(mode)))
+    stages += [
+        ("cv_mat_to_preview_image", lambda: camera._cv_mat_to_preview_image(mat, ir_format, header)),
+        ("cv_mat_to_temperature_image", lambda: camera._cv_mat_to_temperature_image(mat, ir_format, header)),
+        ("frame_statistics", lambda: camera._frame_to_statistics(frame)),
+        ("change_detector", lambda: camera._change_detector.is_changed(mat)),
+        ("frame_path", frame_path)
+    ]
+    return stages
+
+
+def param_stages(camera):
+    radiometric_params = {param_name: RR.VarValue(np.array([v.data]), "double") 
+        for param_name, v in camera.read_params(_radiometric_param_names).items()}
+    return [
+        ("getf_param_object_emissivity", lambda: camera.getf_param("object_emissivity")),
+        ("setf_param_object_emissivity", 
+            lambda: camera.setf_param("object_emissivity", RR.VarValue(np.array([0.95]), "double"))),
+        ("getf_param_ir_format", lambda: camera.getf_param("ir_format")),
+        ("getf_param_fps", lambda: camera.getf_param("fps")),
+        ("getf_param_compression_mode", lambda: camera.getf_param("compression_mode")),
+        ("setf_param_compression_mode", 
+            lambda: camera.setf_param("compression_mode", RR.VarValue("png", "string"))),
+        ("getf_param_frame_pipeline_stats", lambda: camera.getf_param("frame_pipeline_stats")),
+        ("read_params_radiometric", lambda: camera.read_params(_radiometric_param_names)),
+        ("write_params_radiometric", lambda: camera.write_params(radiometric_params)),
+        ("snapshot_params", camera.snapshot_params)
+    ]
+
+
+def run_stage(f, iterations, allocation_iterations):
+    result = time_stage(f, iterations)
+    result.update(measure_allocations(f, allocation_iterations))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame hot path benchmark")
+    parser.add_argument("--sizes", type=str, default="320x240,640x512", 
+        help="Comma separated frame sizes as WIDTHxHEIGHT")
+    parser.add_argument("--ir-formats", type=str, default=",".join(_ir_formats), 
+        help="Comma separated ir_formats")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--allocation-iterations", type=int, default=20)
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    camera = load_camera()
+    # The fake node map provides Planck constants so radiometric frames are converted as well
+    camera._set_nodemap(fake_pyspin.a320_nodemap(planck_constants=True))
+
+    frames = {}
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.lower().split("x"))
+        frames[size] = {}
+        for ir_format in args.ir_formats.split(","):
+            camera._current_irformat = ir_format
+            mat = synthetic_frame(height, width, ir_format)
+            frames[size][ir_format] = {name: run_stage(f, args.iterations, args.allocation_iterations)
+                for name, f in frame_stages(camera, mat, ir_format)}
+            print(f"{size} {ir_format}: frame_path "
+                f"{frames[size][ir_format]['frame_path']['calls_per_second']:.1f} frames/s")
+    camera._current_irformat = "temperature_linear_10mK"
+
+    params = {name: run_stage(f, args.iterations, args.allocation_iterations) for name, f in param_stages(camera)}
+
+    results = {
+        "metadata": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "iterations": args.iterations
+        },
+        "frames": frames,
+        "params": params
+    }
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
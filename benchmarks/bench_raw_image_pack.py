@@ -0,0 +1,84 @@
+"""
+Benchmark packing a raw frame into a com.robotraconteur.image.Image and marshalling it
+
+Compares the previous implementation, which rebuilt ImageInfo and copied the frame with tobytes() for
+every frame, with ThermalCameraImpl._cv_mat_to_image, which hands a view of the frame to the Image.
+
+Usage: python benchmarks/bench_raw_image_pack.py [--iterations N] [--output results.json]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench_common import RRN, load_camera
+
+import RobotRaconteur as RR
+from RobotRaconteur.RobotRaconteurPythonUtil import PackMessageElement
+
+
+def legacy_cv_mat_to_image(camera, mat):
+    image_info = camera._image_info_type()
+    image_info.width = mat.shape[1]
+    image_info.height = mat.shape[0]
+    image_info.step = mat.shape[1]
+    image_info.encoding = camera._image_consts["ImageEncoding"]["mono16"]
+    image_info.data_header = camera._sensor_data_util.FillSensorDataHeader(camera._camera_info.device_info,
+        camera._seqno)
+    image_info.extended = {
+        "ir_format": RR.VarValue(camera._current_irformat, "string")
+    }
+    image = camera._image_type()
+    image.image_info = image_info
+    image.data = mat.reshape(mat.size, order='C').tobytes()
+    return image
+
+
+def time_per_call(f, iterations):
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        f()
+        samples[i] = time.perf_counter() - t0
+    return {
+        "mean_us": float(samples.mean() * 1e6),
+        "p50_us": float(np.percentile(samples, 50) * 1e6),
+        "p99_us": float(np.percentile(samples, 99) * 1e6)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw Image packing benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    camera = load_camera()
+    image_type = "com.robotraconteur.image.Image"
+    header = camera._sensor_data_util.FillSensorDataHeader(camera._camera_info.device_info, 0)
+
+    results = {}
+    for height, width in ((240, 320), (480, 640)):
+        mat = np.random.default_rng(0).integers(27315, 37315, (height, width), dtype=np.uint16)
+        size_name = f"{width}x{height}"
+        results[size_name] = {
+            "legacy_pack": time_per_call(lambda: legacy_cv_mat_to_image(camera, mat), args.iterations),
+            "zero_copy_pack": time_per_call(lambda: camera._cv_mat_to_image(mat, header), args.iterations),
+            "legacy_pack_marshal": time_per_call(
+                lambda: PackMessageElement(legacy_cv_mat_to_image(camera, mat), image_type, node=RRN),
+                args.iterations),
+            "zero_copy_pack_marshal": time_per_call(
+                lambda: PackMessageElement(camera._cv_mat_to_image(mat, header), image_type, node=RRN),
+                args.iterations)
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Minimal stand-in for the PySpin module so the driver can be imported and benchmarked without the
+Spinnaker SDK or a camera. Call install() before importing thermal_camera_driver.
+
+Provides images and a GenICam style node map with the nodes the driver reads and writes. All nodes are
+available, readable and writable.
+"""
+
+import sys
+
+import numpy as np
+
+intfIString = 1
+intfIInteger = 2
+intfIFloat = 3
+intfIEnumeration = 4
+
+PixelFormat_Mono8 = 8
+PixelFormat_Mono16 = 16
+
+AcquisitionMode_Continuous = 2
+
+
+class ImageEventHandler(object):
+    def __init__(self):
+        pass
+
+
+class Image(object):
+    """Received image wrapping a numpy array"""
+
+    def __init__(self, mat, pixel_format=PixelFormat_Mono16, image_status=0):
+        self._mat = mat
+        self._pixel_format = pixel_format
+        self._image_status = image_status
+
+    def IsIncomplete(self):
+        return self._image_status != 0
+
+    def GetImageStatus(self):
+        return self._image_status
+
+    def GetPixelFormat(self):
+        return self._pixel_format
+
+    def GetNDArray(self):
+        return self._mat
+
+    def Convert(self, pixel_format):
+        assert pixel_format == PixelFormat_Mono16
+        return Image(self._mat.astype(np.uint16), PixelFormat_Mono16)
+
+    def GetWidth(self):
+        return self._mat.shape[1]
+
+    def GetHeight(self):
+        return self._mat.shape[0]
+
+
+class Node(object):
+    def __init__(self, interface_type, value, entries=None):
+        self.interface_type = interface_type
+        self.value = value
+        self.entries = entries
+
+    def GetPrincipalInterfaceType(self):
+        return self.interface_type
+
+
+class _ValuePtr(object):
+    def __init__(self, node):
+        self._node = node
+
+    def GetValue(self):
+        return self._node.value
+
+    def SetValue(self, value):
+        self._node.value = value
+
+
+class CStringPtr(_ValuePtr):
+    pass
+
+
+class CIntegerPtr(_ValuePtr):
+    pass
+
+
+class CFloatPtr(_ValuePtr):
+    pass
+
+
+class _EnumEntry(object):
+    def __init__(self, name, value):
+        self._name = name
+        self._value = value
+
+    def GetDisplayName(self):
+        return self._name
+
+    def GetSymbolic(self):
+        return self._name
+
+    def GetValue(self):
+        return self._value
+
+
+def CEnumEntryPtr(entry):
+    return entry
+
+
+class CEnumerationPtr(_ValuePtr):
+    def GetIntValue(self):
+        return self._node.entries.index(self._node.value)
+
+    def SetIntValue(self, value):
+        self._node.value = self._node.entries[value]
+
+    def GetEntry(self, value):
+        return _EnumEntry(self._node.entries[value], value)
+
+    def GetEntries(self):
+        return [_EnumEntry(name, i) for i, name in enumerate(self._node.entries)]
+
+    def GetEntryByName(self, name):
+        return _EnumEntry(name, self._node.entries.index(name))
+
+    def GetCurrentEntry(self):
+        return self.GetEntry(self.GetIntValue())
+
+
+def IsAvailable(node):
+    return True
+
+
+def IsReadable(node):
+    return True
+
+
+def IsWritable(node):
+    return True
+
+
+class NodeMap(object):
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def GetNode(self, name):
+        return self.nodes.get(name)
+
+
+def a320_nodemap(ir_format="TemperatureLinear10mK", planck_constants=False):
+    """
+    Node map with the nodes and default values of a ThermoVision A320
+
+    If planck_constants is True the R, B, and F calibration nodes of newer cameras are added, so radiometric
+    frames can be converted to temperature.
+    """
+    nodemap = NodeMap({
+        "IRFormat": Node(intfIEnumeration, ir_format,
+            ["TemperatureLinear10mK", "TemperatureLinear100mK", "Radiometric"]),
+        "IRFrameRate": Node(intfIEnumeration, "Rate30Hz", ["Rate60Hz", "Rate30Hz", "Rate15Hz"]),
+        "ObjectEmissivity": Node(intfIFloat, 0.95),
+        "ObjectDistance": Node(intfIFloat, 1.0),
+        "ReflectedTemperature": Node(intfIFloat, 293.15),
+        "AtmosphericTemperature": Node(intfIFloat, 293.15),
+        "RelativeHumidity": Node(intfIFloat, 0.5),
+        "EstimatedTransmission": Node(intfIFloat, 1.0),
+        "ExtOpticsTemperature": Node(intfIFloat, 293.15),
+        "ExtOpticsTransmission": Node(intfIFloat, 1.0),
+        "FocusPos": Node(intfIInteger, 1000),
+        "ScaleLimitLow": Node(intfIFloat, 273.15),
+        "ScaleLimitUpper": Node(intfIFloat, 373.15),
+        "CurrentCase": Node(intfIInteger, 0)
+    })
+    if planck_constants:
+        nodemap.nodes["R"] = Node(intfIFloat, 16000.0)
+        nodemap.nodes["B"] = Node(intfIFloat, 1430.0)
+        nodemap.nodes["F"] = Node(intfIFloat, 1.0)
+    return nodemap
+
+
+def install():
+    """Register this module as PySpin in sys.modules and return it"""
+    module = sys.modules[__name__]
+    sys.modules["PySpin"] = module
+    return module
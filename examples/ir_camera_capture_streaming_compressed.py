@@ -3,7 +3,7 @@
 from RobotRaconteur.Client import *
 import numpy as np
 import matplotlib.pyplot as plt
-import cv2
+from flir_thermal_camera_robotraconteur_driver.frame_codecs import decode_compressed_frame
 
 def packet_received(self, pipe):
     pass
@@ -60,7 +60,9 @@ def new_frame(pipe_ep):
         rr_img=pipe_ep.ReceivePacket()
                
         #Convert the packet to an image and set the global variable
-        mat = cv2.imdecode(rr_img.data,cv2.IMREAD_UNCHANGED)
+        compression = rr_img.image_info.extended["compression"].data if "compression" in rr_img.image_info.extended \
+            else "png"
+        mat = decode_compressed_frame(rr_img.data, rr_img.image_info.height, rr_img.image_info.width, compression)
         ir_format = rr_img.image_info.extended["ir_format"].data
 
         if ir_format == "temperature_linear_10mK":
@@ -0,0 +1,50 @@
+# Read frames from the shared memory ring of a driver running on the same host. The driver must be started
+# with --shared-memory-slots
+
+from RobotRaconteur.Client import *
+from flir_thermal_camera_robotraconteur_driver.shared_frame_ring import SharedFrameRingReader
+import time
+
+def main():
+
+    url='rr+tcp://127.0.0.1:60827/?service=camera'
+
+    c1=RRN.ConnectService(url)
+
+    #Wait for the first frame so the shared memory ring has been created
+    ring_name = ""
+    while not ring_name:
+        ring_name = c1.getf_param("shared_memory_ring").data["name"].data
+        time.sleep(0.1)
+
+    reader = SharedFrameRingReader(ring_name)
+    try:
+        frame_index = reader.frames_written
+        while True:
+            if not reader.wait(frame_index, timeout=1):
+                continue
+
+            #view() references the shared memory without copying
+            frame = reader.view(frame_index)
+            if frame is None:
+                #Overwritten before it was read, skip to the latest frame
+                frame_index = reader.frames_written
+                continue
+
+            mat = frame.mat
+            if frame.ir_format == "temperature_linear_10mK":
+                max_temperature = mat.max() * 0.01 - 273.15
+            elif frame.ir_format == "temperature_linear_100mK":
+                max_temperature = mat.max() * 0.1 - 273.15
+            else:
+                max_temperature = None
+
+            #Check that the frame was not overwritten while it was being used
+            if reader.valid(frame):
+                print(f"seqno {frame.seqno}, max temperature {max_temperature}")
+            frame_index += 1
+    finally:
+        reader.close()
+
+if __name__ == "__main__":
+    main()
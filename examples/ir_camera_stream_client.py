@@ -0,0 +1,43 @@
+# Receive streaming frames converted to temperature using the client library
+
+from RobotRaconteur.Client import *
+from flir_thermal_camera_robotraconteur_driver.client import ThermalStreamClient
+import matplotlib.pyplot as plt
+
+def main():
+
+    url='rr+tcp://127.0.0.1:60827/?service=camera'
+
+    c1=RRN.ConnectService(url)
+
+    #Frames are received and decoded in the background. frame_stream_compressed and temperature_stream
+    #can be used the same way
+    with ThermalStreamClient(c1, "frame_stream") as client:
+        try:
+            c1.start_streaming()
+        except: pass
+
+        fig = plt.figure(1)
+
+        try:
+            #Iterating returns the newest frame, skipping frames if displaying is slower than the stream
+            for frame in client:
+                if frame.temperature is not None:
+                    plt.imshow(frame.temperature, cmap='inferno', aspect='auto')
+                else:
+                    plt.imshow(frame.mat, cmap='inferno', aspect='auto')
+                plt.colorbar(format='%.2f')
+                plt.title(f"seqno {frame.seqno}")
+                plt.pause(0.001)
+                plt.clf()
+
+                if not plt.fignum_exists(1):
+                    break
+        finally:
+            print(client.stats())
+            try:
+                c1.stop_streaming()
+            except: pass
+
+if __name__ == "__main__":
+    main()
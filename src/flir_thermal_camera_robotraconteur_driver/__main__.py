@@ -1,3 +1,3 @@
-from .thermal_camera_driver import main
+from .driver_main import main
 
-main()
\ No newline at end of file
+main()
@@ -0,0 +1,139 @@
+import math
+
+adaptive_quality_max_level = 3
+
+# Frame downsample factor at each adaptive quality level for frame_stream, frame_stream_compressed,
+# temperature_stream, and frame_stream_roi
+adaptive_frame_downsample = (1, 2, 4, 8)
+# preview_stream lowers JPEG quality at level 1, also halves the resolution at level 2, and only starts
+# dropping frames at level 3
+adaptive_preview_downsample = (1, 1, 1, 2)
+
+# Weight of the newest sample in the smoothed send latency
+_latency_ewma_alpha = 0.2
+# Minimum time between level increases, so a new level has time to take effect
+_escalate_hold_time = 0.5
+
+
+class AdaptiveQualitySettings(object):
+    """
+    Settings shared by the per-client adaptive quality controllers
+
+    Adaptive quality is disabled by default, so slow clients only drop frames when their backlog is full.
+    When enabled, a client is congested when the smoothed time from sending a packet to its send completion exceeds
+    latency_threshold, or when a frame is dropped because the client already has the maximum number of
+    packets in flight. Each congestion event raises the adaptive quality level of the client by one, at most
+    once per half second, up to adaptive_quality_max_level. The level is lowered by one after the client
+    has not been congested for recovery_time seconds.
+
+    If delta_keyframe_interval is greater than zero, frame_stream_compressed sends delta frames with this
+    keyframe interval to clients above level 0. Clients at level 0 keep receiving standalone frames.
+    """
+
+    def __init__(self, enabled=0, latency_threshold=0.1, recovery_time=2.0, delta_keyframe_interval=0):
+        self.enabled = enabled
+        self.latency_threshold = latency_threshold
+        self.recovery_time = recovery_time
+        self.delta_keyframe_interval = delta_keyframe_interval
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        value = int(value)
+        if value not in (0, 1):
+            raise ValueError("Adaptive quality enabled must be 0 or 1")
+        self._enabled = value
+
+    @property
+    def latency_threshold(self):
+        return self._latency_threshold
+
+    @latency_threshold.setter
+    def latency_threshold(self, value):
+        value = float(value)
+        if value <= 0:
+            raise ValueError("Adaptive quality latency threshold must be greater than zero")
+        self._latency_threshold = value
+
+    @property
+    def recovery_time(self):
+        return self._recovery_time
+
+    @recovery_time.setter
+    def recovery_time(self, value):
+        value = float(value)
+        if value < 0:
+            raise ValueError("Adaptive quality recovery time must not be negative")
+        self._recovery_time = value
+
+    @property
+    def delta_keyframe_interval(self):
+        return self._delta_keyframe_interval
+
+    @delta_keyframe_interval.setter
+    def delta_keyframe_interval(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError("Adaptive delta keyframe interval must not be negative")
+        self._delta_keyframe_interval = value
+
+
+class AdaptiveQualityController(object):
+    """
+    Adaptive quality level of one pipe endpoint
+
+    Fed with send completion latencies and backlog drops by the endpoint. Not thread safe, the endpoint
+    serializes calls.
+    """
+
+    def __init__(self, settings):
+        self._settings = settings
+        self._level = 0
+        self._latency = 0.0
+        self._last_change = -math.inf
+        self._last_congestion = -math.inf
+        self.escalation_count = 0
+
+    @property
+    def level(self):
+        return self._level if self._settings.enabled else 0
+
+    @property
+    def latency(self):
+        """Smoothed send completion latency in seconds"""
+        return self._latency
+
+    def packet_sent(self, latency, now):
+        self._latency += _latency_ewma_alpha * (latency - self._latency)
+        self._update(self._latency > self._settings.latency_threshold, now)
+
+    def packet_dropped(self, now):
+        self._update(True, now)
+
+    def _update(self, congested, now):
+        if not self._settings.enabled:
+            self._level = 0
+            return
+        if congested:
+            self._last_congestion = now
+            if self._level < adaptive_quality_max_level and now - self._last_change >= _escalate_hold_time:
+                self._level += 1
+                self._last_change = now
+                self.escalation_count += 1
+        elif self._level > 0:
+            recovery_time = self._settings.recovery_time
+            if now - self._last_congestion >= recovery_time and now - self._last_change >= recovery_time:
+                self._level -= 1
+                self._last_change = now
+
+
+def adaptive_preview_encoding(level, downscale, quality):
+    """:return: Tuple of the preview downscale and JPEG quality to use at an adaptive quality level"""
+    if level >= 1:
+        quality = min(quality, max(quality // 2, 10))
+    if level >= 2:
+        downscale = downscale * 2
+    return downscale, quality
@@ -0,0 +1,275 @@
+import json
+import os
+import socket
+import struct
+import traceback
+
+# Only PySpin is imported here, so cameras can be listed without loading OpenCV and Robot Raconteur
+try:
+    import PySpin
+except ImportError:
+    PySpin = None
+
+_discovery_cache_version = 1
+
+
+class CameraDiscoveryCache(object):
+    """
+    Persistent map from camera serial number to the IP address, MAC address, and device ID last seen
+
+    Opening a camera by IP or MAC address normally reads the transport layer nodes of every camera until
+    one matches. With the cache, the serial number of the camera is looked up and the camera is opened
+    directly with CameraList.GetBySerial(). Entries are only hints: the camera found is always checked
+    against the requested address, and all cameras are scanned if it does not match. A missing or
+    unreadable file is treated as an empty cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cameras = dict()
+        self._dirty = False
+        try:
+            with open(path, "r") as f:
+                cache_file = json.load(f)
+            if cache_file.get("version", None) == _discovery_cache_version:
+                self._cameras = {str(k): v for k, v in cache_file.get("cameras", {}).items() if isinstance(v, dict)}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError):
+            print(f"Warning: ignoring invalid camera discovery cache {path}")
+
+    def find_serial_number(self, ip_integer=None, mac_integer=None):
+        """:return: The cached serial number of the camera with the IP or MAC address, or None"""
+        for serial_number, camera in self._cameras.items():
+            if ip_integer is not None and _ip_str_to_gige_integer_or_none(camera.get("ip_address")) == ip_integer:
+                return serial_number
+            if mac_integer is not None and _mac_str_to_gige_integer_or_none(camera.get("mac_address")) == mac_integer:
+                return serial_number
+        return None
+
+    def update(self, identity):
+        serial_number = identity.get("serial_number")
+        if serial_number is None:
+            return
+        camera = {
+            "ip_address": _gige_integer_to_ip_str(identity.get("ip_address")),
+            "mac_address": _gige_integer_to_mac_str(identity.get("mac_address")),
+            "device_id": identity.get("device_id")
+        }
+        # Addresses are unique, drop cameras that previously had them
+        for other_serial_number, other in list(self._cameras.items()):
+            if other_serial_number == serial_number:
+                continue
+            if (camera["ip_address"] is not None and other.get("ip_address") == camera["ip_address"]) \
+                    or (camera["mac_address"] is not None and other.get("mac_address") == camera["mac_address"]):
+                del self._cameras[other_serial_number]
+                self._dirty = True
+        if self._cameras.get(serial_number) != camera:
+            self._cameras[serial_number] = camera
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            cache_dir = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(cache_dir, exist_ok=True)
+            # Written to a temporary file and renamed, so a driver killed while saving leaves a valid cache
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": _discovery_cache_version, "cameras": self._cameras}, f, indent=2,
+                    sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError:
+            print(f"Warning: could not save camera discovery cache {self.path}")
+            traceback.print_exc()
+
+
+class PySpinSystem:
+
+    def __init__(self):
+        self._system = None
+
+    def start(self):
+        assert PySpin is not None, "PySpin is not installed"
+        self._system = PySpin.System.GetInstance()
+
+    def open_thermal_camera(self, serial_number = None, ip_address = None, mac_address = None,
+            discovery_cache = None):
+
+        ip_integer = _ip_str_to_gige_integer(ip_address)
+        mac_integer = _mac_str_to_gige_integer(mac_address)
+        if serial_number is not None:
+            serial_number = serial_number.strip()
+
+        cam_list = self._system.GetCameras()
+        try:
+
+            num_cameras = cam_list.GetSize()
+
+            assert num_cameras > 0, "Could not find any cameras!"
+
+            if serial_number is None and ip_integer is None and mac_integer is None:
+                for cam in cam_list:
+                    return cam
+
+            # GetBySerial() finds the camera without reading the node maps of the other cameras
+            lookup_serial_number = serial_number
+            if lookup_serial_number is None and discovery_cache is not None:
+                lookup_serial_number = discovery_cache.find_serial_number(ip_integer, mac_integer)
+            if lookup_serial_number is not None:
+                cam = _get_camera_by_serial(cam_list, lookup_serial_number)
+                if cam is not None:
+                    identity = _read_camera_identity(cam)
+                    if discovery_cache is not None:
+                        discovery_cache.update(identity)
+                    if _camera_identity_matches(identity, serial_number, ip_integer, mac_integer):
+                        return cam
+
+            for cam in cam_list:
+                identity = _read_camera_identity(cam)
+                if discovery_cache is not None:
+                    discovery_cache.update(identity)
+                if _camera_identity_matches(identity, serial_number, ip_integer, mac_integer):
+                    return cam
+
+            assert False, "Could not find requested camera!"
+
+        finally:
+            if discovery_cache is not None:
+                discovery_cache.save()
+            cam_list.Clear()
+
+    def print_detected_cameras(self, discovery_cache = None):
+        cam_list = self._system.GetCameras()
+        try:
+
+            num_cameras = cam_list.GetSize()
+
+            assert num_cameras > 0, "Could not find any cameras!"
+
+            # Cameras are probed one at a time, Spinnaker does not document concurrent node map access from
+            # several threads as safe
+            for cam in cam_list:
+                identity = _read_camera_identity(cam, True)
+                if discovery_cache is not None:
+                    discovery_cache.update(identity)
+                device_ip_address = _gige_integer_to_ip_str(identity["ip_address"])
+                device_mac_address = _gige_integer_to_mac_str(identity["mac_address"])
+                print(f"{identity['vendor']}, {identity['model']}, {identity['serial_number']}, " \
+                    f"{identity['device_id']}, {device_ip_address}, {device_mac_address}")
+        finally:
+            if discovery_cache is not None:
+                discovery_cache.save()
+            cam_list.Clear()
+
+    def close(self):
+        if self._system is not None:
+            self._system.ReleaseInstance()
+
+
+def list_cameras(discovery_cache_path=None):
+    """Print the detected cameras, and update the discovery cache if a path is specified"""
+    discovery_cache = CameraDiscoveryCache(discovery_cache_path) if discovery_cache_path is not None else None
+    cam_sys = PySpinSystem()
+    cam_sys.start()
+    try:
+        cam_sys.print_detected_cameras(discovery_cache)
+    finally:
+        cam_sys.close()
+
+
+def _get_camera_by_serial(cam_list, serial_number):
+    try:
+        cam = cam_list.GetBySerial(serial_number)
+    except Exception:
+        # Raised by Spinnaker if no camera has the serial number
+        return None
+    if cam is None or not cam.IsValid():
+        return None
+    return cam
+
+
+def _read_camera_identity(cam, include_description = False):
+    nodemap_tldevice = cam.GetTLDeviceNodeMap()
+    device_serial_number = _read_tl_node_value(nodemap_tldevice, 'DeviceSerialNumber')
+    identity = {
+        "serial_number": device_serial_number.strip() if device_serial_number is not None else None,
+        "ip_address": _read_tl_node_value(nodemap_tldevice, 'GevDeviceIPAddress'),
+        "mac_address": _read_tl_node_value(nodemap_tldevice, 'GevDeviceMACAddress'),
+        "device_id": _read_tl_node_value(nodemap_tldevice, 'DeviceID')
+    }
+    if include_description:
+        identity["vendor"] = _read_tl_node_value(nodemap_tldevice, 'DeviceVendorName')
+        identity["model"] = _read_tl_node_value(nodemap_tldevice, 'DeviceModelName')
+    return identity
+
+
+def _camera_identity_matches(identity, serial_number, ip_integer, mac_integer):
+    if serial_number is not None and identity["serial_number"] == serial_number:
+        return True
+    if ip_integer is not None and identity["ip_address"] == ip_integer:
+        return True
+    if mac_integer is not None and identity["mac_address"] == mac_integer:
+        return True
+    return False
+
+
+def _read_tl_node_value(nodemap_tldevice, nodename):
+    # The transport layer nodes used for discovery are strings or integers
+    node = nodemap_tldevice.GetNode(nodename)
+    if node is None:
+        return None
+    node_type_code = node.GetPrincipalInterfaceType()
+    if node_type_code == PySpin.intfIString:
+        node_ptr = PySpin.CStringPtr(node)
+    elif node_type_code == PySpin.intfIInteger:
+        node_ptr = PySpin.CIntegerPtr(node)
+    else:
+        return None
+    if not (PySpin.IsAvailable(node_ptr) and PySpin.IsReadable(node_ptr)):
+        return None
+    return node_ptr.GetValue()
+
+
+def _gige_integer_to_ip_str(ip_integer):
+    if ip_integer is None:
+        return None
+    # https://stackoverflow.com/questions/9590965/convert-an-ip-string-to-a-number-and-vice-versa
+    return socket.inet_ntoa(struct.pack("!L", ip_integer))
+
+def _ip_str_to_gige_integer(ip_str):
+    if ip_str is None:
+        return None
+    # https://stackoverflow.com/questions/9590965/convert-an-ip-string-to-a-number-and-vice-versa
+    packedIP = socket.inet_aton(ip_str)
+    return struct.unpack("!L", packedIP)[0]
+
+def _gige_integer_to_mac_str(mac_integer):
+    if mac_integer is None:
+        return None
+    # https://stackoverflow.com/questions/36857521/how-to-convert-mac-address-to-decimal-in-python
+    mac_hex = "{:012x}".format(mac_integer)
+    mac_str = ":".join(mac_hex[i:i+2] for i in range(0, len(mac_hex), 2))
+    return mac_str
+
+def _mac_str_to_gige_integer(mac_str):
+    if mac_str is None:
+        return None
+    # https://stackoverflow.com/questions/36857521/how-to-convert-mac-address-to-decimal-in-python
+    mac_int = int(mac_str.translate(str.maketrans('','', ":.- ")), 16)
+    return mac_int
+
+def _ip_str_to_gige_integer_or_none(ip_str):
+    # Cache entries are edited by hand or written by older versions, ignore invalid addresses
+    try:
+        return _ip_str_to_gige_integer(ip_str)
+    except (OSError, TypeError):
+        return None
+
+def _mac_str_to_gige_integer_or_none(mac_str):
+    try:
+        return _mac_str_to_gige_integer(mac_str)
+    except (ValueError, AttributeError):
+        return None
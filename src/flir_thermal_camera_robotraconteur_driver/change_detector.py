@@ -0,0 +1,145 @@
+import threading
+import zlib
+import numpy as np
+
+change_detector_modes = ["off", "exact", "hash", "mad"]
+
+
+class FrameChangeDetector(object):
+    """
+    Detects frames that have not changed since the last frame that was streamed
+
+    Modes:
+
+    * ``off`` - Every frame is treated as changed
+    * ``exact`` - Frame must differ in at least one pixel from the previous frame
+    * ``hash`` - CRC32 of every stride'th pixel in each direction must differ from the previous frame
+    * ``mad`` - Mean absolute difference of every stride'th pixel from the last changed frame must exceed
+      threshold raw counts. Comparing against the last changed frame rather than the previous frame means
+      slow drift is still detected once it accumulates past the threshold.
+
+    All comparison buffers are preallocated and reused.
+    """
+
+    def __init__(self, mode="exact", stride=4, threshold=4.0):
+        self._lock = threading.Lock()
+        self._reference = None
+        self._sample = None
+        self._diff = None
+        self._reference_hash = None
+        self.mode = mode
+        self.stride = stride
+        self.threshold = threshold
+
+        self.checked_count = 0
+        self.suppressed_count = 0
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        if value not in change_detector_modes:
+            raise ValueError(f"Invalid change detector mode: {value}")
+        with self._lock:
+            self._mode = value
+            self._reset()
+
+    @property
+    def stride(self):
+        return self._stride
+
+    @stride.setter
+    def stride(self, value):
+        value = int(value)
+        if value < 1:
+            raise ValueError("Change detector stride must be at least 1")
+        with self._lock:
+            self._stride = value
+            self._reset()
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        value = float(value)
+        if value < 0:
+            raise ValueError("Change detector threshold must not be negative")
+        self._threshold = value
+
+    def is_changed(self, mat):
+        """Return True if mat should be treated as a new frame, False if it is static"""
+        with self._lock:
+            self.checked_count += 1
+            mode = self._mode
+            if mode == "off":
+                return True
+            if mode == "exact":
+                changed = self._check_exact(mat)
+            elif mode == "hash":
+                changed = self._check_hash(mat)
+            else:
+                changed = self._check_mad(mat)
+            if not changed:
+                self.suppressed_count += 1
+            return changed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self._mode,
+                "checked": self.checked_count,
+                "suppressed": self.suppressed_count
+            }
+
+    def _reset(self):
+        self._reference = None
+        self._sample = None
+        self._diff = None
+        self._reference_hash = None
+
+    def _ensure_buffers(self, shape):
+        if self._reference is None or self._reference.shape != shape:
+            self._reference = np.empty(shape, dtype=np.uint16)
+            self._sample = np.empty(shape, dtype=np.uint16)
+            self._diff = np.empty(shape, dtype=np.int32)
+            self._reference_hash = None
+            return False
+        return True
+
+    def _check_exact(self, mat):
+        if not self._ensure_buffers(mat.shape):
+            np.copyto(self._reference, mat)
+            return True
+        if np.array_equal(mat, self._reference):
+            return False
+        np.copyto(self._reference, mat)
+        return True
+
+    def _subsample(self, mat):
+        subsampled = mat[::self._stride, ::self._stride]
+        had_buffers = self._ensure_buffers(subsampled.shape)
+        np.copyto(self._sample, subsampled)
+        return had_buffers
+
+    def _check_hash(self, mat):
+        self._subsample(mat)
+        sample_hash = zlib.crc32(self._sample)
+        if sample_hash == self._reference_hash:
+            return False
+        self._reference_hash = sample_hash
+        return True
+
+    def _check_mad(self, mat):
+        if not self._subsample(mat):
+            self._reference, self._sample = self._sample, self._reference
+            return True
+        np.subtract(self._sample, self._reference, out=self._diff, dtype=np.int32)
+        np.abs(self._diff, out=self._diff)
+        if self._diff.mean() <= self._threshold:
+            return False
+        self._reference, self._sample = self._sample, self._reference
+        return True
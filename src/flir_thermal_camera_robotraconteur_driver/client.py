@@ -0,0 +1,355 @@
+import asyncio
+import threading
+import time
+import traceback
+import numpy as np
+from .frame_codecs import DeltaFrameDecoder
+from .temperature_lut import TemperatureLut
+
+client_stream_pipes = ["frame_stream", "frame_stream_compressed", "frame_stream_roi", "temperature_stream",
+    "frame_stream_mean", "frame_stream_max", "frame_stream_min"]
+
+# dtype of temperature_stream frames for each temperature_unit
+_temperature_unit_dtypes = {
+    "celsius": np.float32,
+    "centicelsius": np.int16
+}
+
+_temperature_output_format_dtypes = {
+    "celsius_f32": np.float32,
+    "centicelsius_i16": np.int16
+}
+
+
+class ThermalFrame(object):
+    """
+    Frame decoded by ThermalStreamClient
+
+    ``mat`` is the uint16 frame, or None for temperature_stream. ``temperature`` is the frame converted to
+    temperature in ``temperature_format``, or None if the ir_format cannot be converted. ``index`` counts the
+    frames decoded by the client, starting at 1.
+    """
+    __slots__ = ["index", "seqno", "timestamp", "ir_format", "mat", "temperature", "temperature_format",
+        "image_info"]
+
+    def __init__(self, index, seqno, timestamp, ir_format, mat, temperature, temperature_format, image_info):
+        self.index = index
+        self.seqno = seqno
+        self.timestamp = timestamp
+        self.ir_format = ir_format
+        self.mat = mat
+        self.temperature = temperature
+        self.temperature_format = temperature_format
+        self.image_info = image_info
+
+
+class _OutputBuffers(object):
+    """Fixed number of reused output arrays per shape and dtype, handed out in rotation"""
+
+    def __init__(self, buffer_count):
+        self._buffer_count = buffer_count
+        self._buffers = dict()
+        self._next = dict()
+        self.allocated_count = 0
+
+    def next(self, shape, dtype):
+        key = (tuple(shape), np.dtype(dtype))
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            # Only the current frame format is kept
+            self._buffers.clear()
+            self._next.clear()
+            buffers = []
+            self._buffers[key] = buffers
+            self._next[key] = 0
+        i = self._next[key]
+        self._next[key] = (i + 1) % self._buffer_count
+        if i == len(buffers):
+            buffers.append(np.empty(key[0], dtype=key[1]))
+            self.allocated_count += 1
+        return buffers[i]
+
+
+class ThermalStreamClient(object):
+    """
+    Receives and decodes frames from a streaming pipe of a connected camera service
+
+    The pipe callback only stores the newest packet, so the Robot Raconteur thread is never blocked by
+    decoding. A worker thread decodes the newest packet and converts it to temperature with a lookup table
+    for its ir_format. If packets arrive faster than they can be decoded, older packets are skipped and
+    counted. On frame_stream_compressed a skipped delta frame breaks the reference chain, so frames are not
+    decoded again until the next keyframe.
+
+    Decoded frames are written into buffer_count reused arrays. A frame returned by any of the APIs is valid
+    until buffer_count - 1 further frames have been decoded, copy the arrays to keep them longer.
+
+    Frames can be consumed with get_frame(), with callbacks registered with add_frame_callback(), which run
+    on the worker thread, or by iterating over the client with ``for`` or ``async for``. Iterators only
+    return frames decoded after they were created, skipping frames if the consumer is slower than the
+    stream.
+
+    :param camera: Connected camera service object
+    :param pipe_name: One of client_stream_pipes
+    :param temperature_output_format: ``celsius_f32`` or ``centicelsius_i16``, or None to not convert raw
+        frames to temperature. Ignored for temperature_stream, which is converted by the driver.
+    :param read_radiometric_params: Function returning the radiometric parameters used to convert
+        ``radiometric`` frames, as accepted by TemperatureLut, or None if they are not known
+    :param buffer_count: Number of reused output buffers
+    """
+
+    def __init__(self, camera, pipe_name="frame_stream", temperature_output_format="celsius_f32",
+            read_radiometric_params=None, buffer_count=3):
+        if pipe_name not in client_stream_pipes:
+            raise ValueError(f"Invalid stream pipe: {pipe_name}")
+        if buffer_count < 2:
+            raise ValueError("buffer_count must be at least 2")
+        self._camera = camera
+        self._pipe_name = pipe_name
+        self._temperature_lut = None
+        if temperature_output_format is not None:
+            self._temperature_lut = TemperatureLut(read_radiometric_params or (lambda: None),
+                temperature_output_format)
+        self._delta_decoder = DeltaFrameDecoder()
+        self._raw_buffers = _OutputBuffers(buffer_count)
+        self._temperature_buffers = _OutputBuffers(buffer_count)
+
+        self._cv = threading.Condition()
+        self._pipe_ep = None
+        self._thread = None
+        self._keep_going = False
+        self._packet = None
+        self._latest_frame = None
+        self._consumed_index = 0
+        self._callbacks = []
+        self._async_waiters = set()
+
+        self.received_count = 0
+        self.decoded_count = 0
+        self.skipped_count = 0
+        self.undecodable_count = 0
+        self.error_count = 0
+
+    def start(self):
+        """Connect to the pipe and start the decode thread. Streaming must be started separately."""
+        with self._cv:
+            if self._keep_going:
+                return
+            self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name=f"{self._pipe_name}_client", daemon=True)
+        self._thread.start()
+        self._pipe_ep = getattr(self._camera, self._pipe_name).Connect(-1)
+        self._pipe_ep.PacketReceivedEvent += self._packet_received
+
+    def close(self):
+        """Close the pipe and stop the decode thread. Blocked get_frame() calls and iterators return."""
+        with self._cv:
+            if not self._keep_going:
+                return
+            self._keep_going = False
+            self._packet = None
+            self._cv.notify_all()
+            async_waiters = list(self._async_waiters)
+        for loop, event in async_waiters:
+            loop.call_soon_threadsafe(event.set)
+        try:
+            self._pipe_ep.Close()
+        except Exception:
+            pass
+        self._pipe_ep = None
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    @property
+    def latest_frame(self):
+        """The most recently decoded frame, or None"""
+        return self._latest_frame
+
+    def invalidate_temperature_lut(self):
+        """Rebuild the temperature lookup tables, for instance after changing a radiometric parameter"""
+        if self._temperature_lut is not None:
+            self._temperature_lut.invalidate()
+
+    def get_frame(self, timeout=None):
+        """
+        Wait for a frame newer than the one returned by the previous call
+
+        :return: The newest decoded frame, or None on timeout or if the client was closed
+        """
+        with self._cv:
+            frame = self._wait_frame(self._consumed_index, timeout)
+            if frame is not None:
+                self._consumed_index = frame.index
+            return frame
+
+    def add_frame_callback(self, callback):
+        """Call callback(frame) on the decode thread for every decoded frame"""
+        with self._cv:
+            self._callbacks = self._callbacks + [callback]
+
+    def remove_frame_callback(self, callback):
+        with self._cv:
+            self._callbacks = [c for c in self._callbacks if c is not callback]
+
+    def __iter__(self):
+        with self._cv:
+            index = self._latest_frame.index if self._latest_frame is not None else 0
+        while True:
+            with self._cv:
+                frame = self._wait_frame(index, None)
+            if frame is None:
+                return
+            index = frame.index
+            yield frame
+
+    async def __aiter__(self):
+        # get_running_loop() requires Python 3.7, get_event_loop() returns the running loop inside a coroutine
+        loop = asyncio.get_event_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        with self._cv:
+            index = self._latest_frame.index if self._latest_frame is not None else 0
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cv:
+                    if not self._keep_going:
+                        return
+                    frame = self._latest_frame
+                    event.clear()
+                if frame is not None and frame.index > index:
+                    index = frame.index
+                    yield frame
+                else:
+                    await event.wait()
+        finally:
+            with self._cv:
+                self._async_waiters.discard(waiter)
+
+    def stats(self):
+        with self._cv:
+            return {
+                "received": self.received_count,
+                "decoded": self.decoded_count,
+                "skipped": self.skipped_count,
+                "undecodable": self.undecodable_count,
+                "errors": self.error_count,
+                "buffers_allocated": self._raw_buffers.allocated_count + self._temperature_buffers.allocated_count
+            }
+
+    def _wait_frame(self, index, timeout):
+        # Called with self._cv held
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._keep_going and (self._latest_frame is None or self._latest_frame.index <= index):
+            if deadline is None:
+                self._cv.wait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cv.wait(remaining)
+        if not self._keep_going:
+            return None
+        return self._latest_frame
+
+    def _packet_received(self, pipe_ep):
+        packets = []
+        while pipe_ep.Available > 0:
+            packets.append(pipe_ep.ReceivePacket())
+        if len(packets) == 0:
+            return
+        with self._cv:
+            if not self._keep_going:
+                return
+            self.received_count += len(packets)
+            self.skipped_count += len(packets) - 1
+            if self._packet is not None:
+                self.skipped_count += 1
+            self._packet = packets[-1]
+            self._cv.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while self._keep_going and self._packet is None:
+                    self._cv.wait()
+                if not self._keep_going:
+                    return
+                packet = self._packet
+                self._packet = None
+
+            try:
+                frame = self._decode(packet)
+            except Exception:
+                traceback.print_exc()
+                with self._cv:
+                    self.error_count += 1
+                continue
+
+            with self._cv:
+                if frame is None:
+                    self.undecodable_count += 1
+                    continue
+                self.decoded_count += 1
+                frame.index = self.decoded_count
+                self._latest_frame = frame
+                callbacks = self._callbacks
+                async_waiters = list(self._async_waiters)
+                self._cv.notify_all()
+
+            for loop, event in async_waiters:
+                loop.call_soon_threadsafe(event.set)
+            for callback in callbacks:
+                try:
+                    callback(frame)
+                except Exception:
+                    traceback.print_exc()
+
+    def _decode(self, packet):
+        image_info = packet.image_info
+        extended = image_info.extended if image_info.extended is not None else {}
+        ir_format = extended["ir_format"].data if "ir_format" in extended else None
+        height = image_info.height
+        width = image_info.width
+
+        if "temperature_unit" in extended:
+            dtype = _temperature_unit_dtypes[extended["temperature_unit"].data]
+            temperature = self._raw_buffers.next((height, width), dtype)
+            np.copyto(temperature, packet.data.view(dtype).reshape(height, width))
+            temperature_format = "celsius_f32" if dtype is np.float32 else "centicelsius_i16"
+            return self._new_frame(packet, ir_format, None, temperature, temperature_format)
+
+        if "compression" in extended:
+            decoded = self._delta_decoder.decode(packet)
+            if decoded is None:
+                return None
+            mat = self._raw_buffers.next((height, width), np.uint16)
+            np.copyto(mat, decoded)
+        else:
+            mat = self._raw_buffers.next((height, width), np.uint16)
+            np.copyto(mat, packet.data.view(np.uint16).reshape(height, width))
+
+        temperature = None
+        temperature_format = None
+        if self._temperature_lut is not None and ir_format is not None:
+            temperature_format = self._temperature_lut.output_format
+            out = self._temperature_buffers.next((height, width), _temperature_output_format_dtypes[temperature_format])
+            temperature, temperature_format = self._temperature_lut.convert(mat, ir_format, out)
+        return self._new_frame(packet, ir_format, mat, temperature, temperature_format)
+
+    def _new_frame(self, packet, ir_format, mat, temperature, temperature_format):
+        data_header = packet.image_info.data_header
+        seqno = None
+        timestamp = None
+        if data_header is not None:
+            seqno = int(data_header.seqno)
+            ts = data_header.ts[0]
+            timestamp = float(ts["seconds"]) + float(ts["nanoseconds"]) * 1e-9
+        return ThermalFrame(0, seqno, timestamp, ir_format, mat, temperature, temperature_format,
+            packet.image_info)
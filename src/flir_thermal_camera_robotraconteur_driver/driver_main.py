@@ -0,0 +1,237 @@
+import argparse
+import os
+import re
+import sys
+import time
+import weakref
+from contextlib import suppress
+from .camera_discovery import PySpinSystem, CameraDiscoveryCache, list_cameras
+from .instrumentation import StartupTimer
+
+def main():
+    startup_timer = StartupTimer(time.perf_counter())
+
+    parser = argparse.ArgumentParser(description="Flir thermal camera driver service for Robot Raconteur")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--camera-info-file", type=argparse.FileType('r'),default=None,help="Camera info file (required)")
+    group.add_argument("--list-cameras", action='store_true',default=False,help="List available cameras and exit")
+    group.add_argument("--cameras-file", type=argparse.FileType('r'), default=None, 
+        help="YAML file listing several cameras to serve from one process")
+    group2 = parser.add_mutually_exclusive_group()
+    group2.add_argument("--camera-serial-number", type=str, default=None, help="Serial number of desired camera")
+    group2.add_argument("--camera-ip-address", type=str, default=None, help="IP address of desired camera")
+    group2.add_argument("--camera-mac-address", type=str, default=None, help="MAC address of desired camera")
+    parser.add_argument("--wait-signal",action='store_const',const=True,default=False, help="wait for SIGTERM orSIGINT (Linux only)")
+    parser.add_argument("--encoder-threads", type=int, default=2, help="Number of frame encoder threads (default 2)")
+    parser.add_argument("--frame-queue-size", type=int, default=2, 
+        help="Maximum frames queued for encoding before the oldest is dropped (default 2)")
+    parser.add_argument("--frame-cache-size", type=int, default=8, 
+        help="Maximum number of encoded frames cached for capture and streaming (default 8)")
+    parser.add_argument("--frame-cache-max-bytes", type=int, default=16*1024*1024, 
+        help="Maximum total size of encoded frames cached in bytes (default 16 MiB)")
+    parser.add_argument("--recording-dir", type=str, default=None, 
+        help="Directory for recordings started with start_recording() (default recording disabled)")
+    parser.add_argument("--stats-log-interval", type=float, default=0, 
+        help="Print a hot path statistics line every N seconds, 0 to disable (default 0)")
+    parser.add_argument("--replay-recording", type=str, default=None, 
+        help="Serve frames from a recording directory instead of a camera")
+    parser.add_argument("--replay-synthetic", action='store_true', default=False, 
+        help="Serve synthetic frames instead of a camera")
+    parser.add_argument("--replay-pacing", type=str, default="realtime", choices=["realtime", "fixed", "max"],
+        help="Replay frame pacing (default realtime)")
+    parser.add_argument("--replay-fps", type=float, default=None, 
+        help="Replay frame rate for fixed pacing (default recorded frame rate, or 30 for synthetic frames)")
+    parser.add_argument("--ring-buffer-max-bytes", type=int, default=0, 
+        help="Memory used for the pre-trigger ring buffer in bytes, 0 to disable (default 0)")
+    parser.add_argument("--encoder-pool-threads", type=int, default=0, 
+        help="Encoder threads shared by the cameras of --cameras-file, 0 for the number of CPU cores (default 0)")
+    parser.add_argument("--shared-memory-slots", type=int, default=0, 
+        help="Frames kept in the shared memory ring for clients on the same host, 0 to disable (default 0)")
+    parser.add_argument("--discovery-cache", type=str, default=None, 
+        help="Cache file of camera serial numbers and addresses to find cameras faster (default disabled)")
+
+    args, _ = parser.parse_known_args()
+
+    if (args.list_cameras):
+        list_cameras(args.discovery_cache)
+        return
+
+    # Listing cameras only needs PySpin, so OpenCV, Robot Raconteur, and the driver are imported after it.
+    # Imports are a significant part of the startup time and are timed as the first phase.
+    import RobotRaconteur as RR
+    RRN = RR.RobotRaconteurNode.s
+    import RobotRaconteurCompanion as RRC
+    from RobotRaconteurCompanion.Util.InfoFileLoader import InfoFileLoader
+    from RobotRaconteurCompanion.Util.AttributesUtil import AttributesUtil
+    import yaml
+    from .thermal_camera_driver import ThermalCameraImpl, _robdef_file
+    from .frame_pipeline import FramePipelinePool
+    startup_timer.lap("imports")
+
+    rr_args = ["--robotraconteur-jumbo-message=true"] + sys.argv
+
+    #RRN.RegisterServiceTypesFromFiles(['com.robotraconteur.imaging'],True)
+    RRC.RegisterStdRobDefServiceTypes(RRN)
+    RRN.RegisterServiceTypeFromFile(_robdef_file)
+    startup_timer.lap("register_types")
+
+    if args.cameras_file is not None:
+        with args.cameras_file:
+            camera_entries = _load_cameras_file(args.cameras_file)
+    else:
+        with args.camera_info_file:
+            camera_info_text = args.camera_info_file.read()
+        camera_entries = [{
+            "name": "camera",
+            "camera_info_text": camera_info_text,
+            "serial_number": args.camera_serial_number,
+            "ip_address": args.camera_ip_address,
+            "mac_address": args.camera_mac_address,
+            "replay_recording": args.replay_recording,
+            "replay_synthetic": args.replay_synthetic
+        }]
+    
+    camera_kwargs = {
+        "encoder_threads": args.encoder_threads,
+        "frame_queue_size": args.frame_queue_size,
+        "frame_cache_size": args.frame_cache_size,
+        "frame_cache_max_bytes": args.frame_cache_max_bytes,
+        "ring_buffer_max_bytes": args.ring_buffer_max_bytes,
+        "recording_dir": args.recording_dir,
+        "stats_log_interval": args.stats_log_interval,
+        "shared_memory_slots": args.shared_memory_slots
+    }
+
+    # With several cameras the encoder threads are shared, each camera may use up to encoder_threads of them
+    encoder_pool = None
+    if args.cameras_file is not None:
+        encoder_pool = FramePipelinePool(args.encoder_pool_threads, "thermal_camera_encoder")
+        camera_kwargs["encoder_pool"] = encoder_pool
+
+    discovery_cache = CameraDiscoveryCache(args.discovery_cache) if args.discovery_cache is not None else None
+
+    cam_sys = None
+    cam = None
+    camera = None
+    cams = []
+    cameras = []
+    try:
+        for camera_entry in camera_entries:
+            # Driver settings are not part of CameraInfo and are ignored by the info file loader
+            camera_info_text = camera_entry["camera_info_text"]
+            driver_settings = (yaml.safe_load(camera_info_text) or {}).get("driver_settings", None) or {}
+
+            info_loader = InfoFileLoader(RRN)
+            camera_info, camera_ident_fd = info_loader.LoadInfoFileFromString(camera_info_text, "com.robotraconteur.imaging.camerainfo.CameraInfo", "camera")
+            startup_timer.lap("load_config")
+
+            if camera_entry["replay_recording"] is not None or camera_entry["replay_synthetic"]:
+                from .replay_camera import ReplayThermalCameraImpl, RecordingFrameSource, SyntheticFrameSource
+                if camera_entry["replay_recording"] is not None:
+                    frame_source = RecordingFrameSource(camera_entry["replay_recording"])
+                else:
+                    frame_source = SyntheticFrameSource(fps = args.replay_fps or 30.0)
+                camera = ReplayThermalCameraImpl(frame_source, camera_info, args.replay_pacing, args.replay_fps,
+                    **camera_kwargs)
+            else:
+                if cam_sys is None:
+                    cam_sys = PySpinSystem()
+                    cam_sys.start()
+                cam = cam_sys.open_thermal_camera(camera_entry["serial_number"], camera_entry["ip_address"], 
+                    camera_entry["mac_address"], discovery_cache)
+                cams.append(cam)
+                startup_timer.lap("discovery")
+
+                # Use weakref.proxy to avoid creating dangling references to camera
+                weak_cam_proxy = weakref.proxy(cam)
+                camera = ThermalCameraImpl(weak_cam_proxy, camera_info, **camera_kwargs)
+            camera._apply_driver_settings(driver_settings)
+            cameras.append((camera_entry["name"], camera))
+            startup_timer.lap("camera_init")
+
+        if encoder_pool is not None:
+            encoder_pool.start()
+        for _, camera in cameras:
+            camera._start()
+        startup_timer.lap("camera_start")
+
+        
+        with RR.ServerNodeSetup("experimental.flir_thermal_camera",60827,argv=rr_args):
+
+            attributes_util = AttributesUtil(RRN)
+            for service_name, camera in cameras:
+                camera_attributes = attributes_util.GetDefaultServiceAttributesFromDeviceInfo(camera.device_info)
+                service_ctx = RRN.RegisterService(service_name,"experimental.flir_thermal_camera.ThermalCamera",camera)
+                service_ctx.SetServiceAttributes(camera_attributes)
+            startup_timer.lap("service_registration")
+            time.sleep(1)
+            startup_timer.lap("startup_delay")
+            for _, camera in cameras:
+                camera.start_streaming()
+            startup_timer.lap("start_streaming")
+            print(f"Startup: {startup_timer.summary()}")
+
+            if args.wait_signal:  
+                #Wait for shutdown signal if running in service mode          
+                print("Press Ctrl-C to quit...")
+                import signal
+                signal.sigwait([signal.SIGTERM,signal.SIGINT])
+            else:            
+                input("Server started, press enter to quit...")
+            
+            for _, camera in cameras:
+                camera._close_rr()
+            time.sleep(0.1)
+    finally:
+        for _, camera in cameras:
+            camera._close_rr()
+            with suppress(Exception):
+                camera._close()
+        cameras.clear()
+        del camera
+        if encoder_pool is not None:
+            encoder_pool.stop()
+
+        cams.clear()
+        del cam
+
+        if cam_sys is not None:
+            with suppress(Exception):
+                cam_sys.close()
+
+def _load_cameras_file(f):
+    """
+    Load the cameras listed in a cameras file
+
+    The file contains a list of cameras, each with the Robot Raconteur service name, the camera info file,
+    and optionally one of serial_number, ip_address, or mac_address to select the camera, or replay_recording
+    or replay_synthetic to replay frames instead. Relative paths are relative to the cameras file.
+    """
+    import yaml
+    cameras_file = yaml.safe_load(f) or {}
+    base_dir = os.path.dirname(os.path.abspath(f.name))
+    ret = []
+    for camera_entry in cameras_file.get("cameras", None) or []:
+        name = camera_entry.get("name", None)
+        assert name is not None and re.match(r"^[a-zA-Z][a-zA-Z0-9_]*$", name), \
+            f"Invalid camera service name: {name}"
+        assert name not in (e["name"] for e in ret), f"Duplicate camera service name: {name}"
+        assert "camera_info_file" in camera_entry, f"camera_info_file not specified for camera {name}"
+        with open(os.path.join(base_dir, camera_entry["camera_info_file"]), "r") as camera_info_f:
+            camera_info_text = camera_info_f.read()
+        replay_recording = camera_entry.get("replay_recording", None)
+        ret.append({
+            "name": name,
+            "camera_info_text": camera_info_text,
+            "serial_number": _optional_str(camera_entry.get("serial_number", None)),
+            "ip_address": _optional_str(camera_entry.get("ip_address", None)),
+            "mac_address": _optional_str(camera_entry.get("mac_address", None)),
+            "replay_recording": os.path.join(base_dir, replay_recording) if replay_recording is not None else None,
+            "replay_synthetic": bool(camera_entry.get("replay_synthetic", False))
+        })
+    assert len(ret) > 0, "No cameras listed in cameras file"
+    return ret
+
+def _optional_str(value):
+    # YAML loads serial numbers without quotes as integers
+    return str(value) if value is not None else None
@@ -0,0 +1,119 @@
+import threading
+import numpy as np
+
+aggregate_modes = ["mean", "max", "min"]
+
+# The running sum is uint32, which cannot overflow for windows of up to 65536 uint16 frames
+_max_window_frames = 65536
+
+
+class AggregatedFrame(object):
+    """Mean, maximum, and minimum of the frames of one window"""
+    __slots__ = ["window_index", "first_seqno", "last_seqno", "frame_count", "ir_format", "data_header", "mean",
+        "max", "min"]
+
+    def __init__(self, window_index, first_seqno, last_seqno, frame_count, ir_format, data_header, mean, max,
+            min):
+        self.window_index = window_index
+        self.first_seqno = first_seqno
+        self.last_seqno = last_seqno
+        self.frame_count = frame_count
+        self.ir_format = ir_format
+        self.data_header = data_header
+        self.mean = mean
+        self.max = max
+        self.min = min
+
+
+class FrameAggregator(object):
+    """
+    Per-pixel mean, maximum, and minimum of consecutive frames over windows of window_frames frames
+
+    add() updates a uint32 running sum and uint16 running maximum and minimum in place, and returns the
+    aggregated frame when the window is complete. The mean is rounded to the nearest count. A partial window
+    is discarded when the frame shape or ir_format changes, since the frames cannot be combined, or when
+    reset() is called. Frames must be added from a single thread.
+    """
+
+    def __init__(self, window_frames=30):
+        self._lock = threading.Lock()
+        self.window_frames = window_frames
+        self._sum = None
+        self._max = None
+        self._min = None
+        self._count = 0
+        self._first_seqno = 0
+        self._ir_format = None
+        self._window_index = 0
+
+        self.aggregated_count = 0
+        self.discarded_count = 0
+
+    @property
+    def window_frames(self):
+        return self._window_frames
+
+    @window_frames.setter
+    def window_frames(self, value):
+        value = int(value)
+        if value < 1 or value > _max_window_frames:
+            raise ValueError(f"Aggregate window must be between 1 and {_max_window_frames} frames")
+        self._window_frames = value
+
+    def add(self, mat, ir_format, seqno, data_header):
+        """
+        Add a uint16 frame to the current window
+
+        :return: The AggregatedFrame if the frame completed the window, otherwise None
+        """
+        if self._count > 0 and (mat.shape != self._sum.shape or ir_format != self._ir_format):
+            self._discard()
+        if self._count == 0:
+            if self._sum is None or self._sum.shape != mat.shape:
+                self._sum = np.empty(mat.shape, dtype=np.uint32)
+            np.copyto(self._sum, mat)
+            # The maximum and minimum are sent without copying, so each window gets new arrays
+            self._max = mat.copy()
+            self._min = mat.copy()
+            self._first_seqno = seqno
+            self._ir_format = ir_format
+        else:
+            np.add(self._sum, mat, out=self._sum)
+            np.maximum(self._max, mat, out=self._max)
+            np.minimum(self._min, mat, out=self._min)
+        self._count += 1
+        if self._count < self._window_frames:
+            return None
+
+        frame_count = self._count
+        np.add(self._sum, frame_count // 2, out=self._sum)
+        np.floor_divide(self._sum, frame_count, out=self._sum)
+        mean = self._sum.astype(np.uint16)
+        ret = AggregatedFrame(self._window_index, self._first_seqno, seqno, frame_count, ir_format, data_header,
+            mean, self._max, self._min)
+        self._count = 0
+        self._max = None
+        self._min = None
+        with self._lock:
+            self._window_index += 1
+            self.aggregated_count += 1
+        return ret
+
+    def reset(self):
+        """Discard the current partial window"""
+        if self._count > 0:
+            self._discard()
+
+    def _discard(self):
+        self._count = 0
+        with self._lock:
+            self.discarded_count += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_frames": self._window_frames,
+                "frames_in_window": self._count,
+                "aggregated": self.aggregated_count,
+                "discarded_windows": self.discarded_count
+            }
@@ -0,0 +1,90 @@
+import threading
+import numpy as np
+
+
+class PooledFrameBuffer(object):
+    """
+    Reference counted uint16 frame buffer owned by a FrameBufferPool
+
+    The buffer is returned to the pool when the last reference is released. Code holding a reference
+    must not keep views of ``mat`` after calling release().
+    """
+
+    __slots__ = ["mat", "_pool", "_refcount"]
+
+    def __init__(self, pool, shape):
+        self.mat = np.empty(shape, dtype=np.uint16)
+        self._pool = pool
+        self._refcount = 0
+
+    def retain(self):
+        self._pool._retain(self)
+        return self
+
+    def release(self):
+        self._pool._release(self)
+
+
+class FrameBufferPool(object):
+    """
+    Pool of reusable uint16 frame buffers
+
+    acquire() returns a buffer holding one reference, reusing a free buffer of the same shape when one is
+    available. Buffers are only allocated when all pooled buffers are in use or the frame shape changes.
+    At most max_free unreferenced buffers are kept.
+    """
+
+    def __init__(self, max_free=8):
+        self._max_free = max_free
+        self._lock = threading.Lock()
+        self._free = []
+        self._shape = None
+        self._in_use_count = 0
+
+        self._allocated_count = 0
+        self._reused_count = 0
+        self._discarded_count = 0
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self._lock:
+            if shape != self._shape:
+                self._shape = shape
+                self._discarded_count += len(self._free)
+                self._free = []
+            if len(self._free) > 0:
+                buf = self._free.pop()
+                self._reused_count += 1
+            else:
+                buf = PooledFrameBuffer(self, shape)
+                self._allocated_count += 1
+            buf._refcount = 1
+            self._in_use_count += 1
+            return buf
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allocated": self._allocated_count,
+                "reused": self._reused_count,
+                "discarded": self._discarded_count,
+                "in_use": self._in_use_count,
+                "free": len(self._free)
+            }
+
+    def _retain(self, buf):
+        with self._lock:
+            assert buf._refcount > 0, "Cannot retain a released frame buffer"
+            buf._refcount += 1
+
+    def _release(self, buf):
+        with self._lock:
+            assert buf._refcount > 0, "Frame buffer released too many times"
+            buf._refcount -= 1
+            if buf._refcount > 0:
+                return
+            self._in_use_count -= 1
+            if buf.mat.shape == self._shape and len(self._free) < self._max_free:
+                self._free.append(buf)
+            else:
+                self._discarded_count += 1
@@ -0,0 +1,108 @@
+import threading
+import collections
+
+
+class _PendingEncode(object):
+    __slots__ = ["event", "value", "error"]
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class EncodedFrameCache(object):
+    """
+    LRU cache of encoded frames keyed by frame sequence number and encoding
+
+    The cache is bounded both by entry count and by total encoded size. When several threads request
+    the same frame and encoding at once, only the first runs the encoder and the others wait for its
+    result.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=16*1024*1024):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._pending = dict()
+        self._total_bytes = 0
+
+        self._hit_count = 0
+        self._miss_count = 0
+        self._eviction_count = 0
+
+    def get_or_encode(self, seqno, encoding, encode_fn, size_fn):
+        """
+        Return the cached encoding of a frame, running encode_fn() on a miss
+
+        :param seqno: The frame sequence number
+        :param encoding: Name of the encoding, for instance "mono16" or "png"
+        :param encode_fn: Callable that encodes the frame
+        :param size_fn: Callable returning the size in bytes of an encoded frame
+        """
+        key = (seqno, encoding)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hit_count += 1
+                return value[0]
+            pending = self._pending.get(key)
+            if pending is not None:
+                self._hit_count += 1
+                owner = False
+            else:
+                pending = _PendingEncode()
+                self._pending[key] = pending
+                self._miss_count += 1
+                owner = True
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = encode_fn()
+            size = size_fn(value)
+        except Exception as e:
+            with self._lock:
+                del self._pending[key]
+            pending.error = e
+            pending.event.set()
+            raise
+
+        with self._lock:
+            del self._pending[key]
+            if size <= self._max_bytes:
+                self._entries[key] = (value, size)
+                self._total_bytes += size
+                self._evict()
+        pending.value = value
+        pending.event.set()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self._max_entries,
+                "max_bytes": self._max_bytes,
+                "hits": self._hit_count,
+                "misses": self._miss_count,
+                "evictions": self._eviction_count
+            }
+
+    def _evict(self):
+        while len(self._entries) > self._max_entries or self._total_bytes > self._max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._eviction_count += 1
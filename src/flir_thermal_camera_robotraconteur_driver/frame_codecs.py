@@ -0,0 +1,466 @@
+import cv2
+import numpy as np
+import threading
+import weakref
+import zlib
+
+try:
+    import lz4.frame as _lz4_frame
+except ImportError:
+    _lz4_frame = None
+
+_preview_colormaps = {
+    "inferno": cv2.COLORMAP_INFERNO,
+    "jet": cv2.COLORMAP_JET,
+    "hot": cv2.COLORMAP_HOT,
+    "magma": cv2.COLORMAP_MAGMA,
+    "plasma": cv2.COLORMAP_PLASMA,
+    "turbo": cv2.COLORMAP_TURBO,
+    "bone": cv2.COLORMAP_BONE
+}
+
+# Raw counts per Kelvin for the temperature linear IR formats
+_ir_format_counts_per_kelvin = {
+    "temperature_linear_10mK": 100.0,
+    "temperature_linear_100mK": 10.0
+}
+
+
+class PreviewEncoder(object):
+    """
+    Low cost colormapped JPEG preview of a 16-bit thermal frame
+
+    The frame is downscaled first so the remaining steps only touch a fraction of the pixels. It is
+    then mapped to 8-bit using either the frame min/max ("auto") or the camera scale limits ("fixed"),
+    colormapped and JPEG encoded.
+    """
+
+    def __init__(self, downscale=2, quality=70, colormap="inferno", scale_mode="auto"):
+        self.downscale = downscale
+        self.quality = quality
+        self.colormap = colormap
+        self.scale_mode = scale_mode
+
+    @property
+    def downscale(self):
+        return self._downscale
+
+    @downscale.setter
+    def downscale(self, value):
+        value = int(value)
+        if value < 1:
+            raise ValueError("Preview downscale must be at least 1")
+        self._downscale = value
+
+    @property
+    def quality(self):
+        return self._quality
+
+    @quality.setter
+    def quality(self, value):
+        value = int(value)
+        if value < 0 or value > 100:
+            raise ValueError("Preview quality must be between 0 and 100")
+        self._quality = value
+
+    @property
+    def colormap(self):
+        return self._colormap
+
+    @colormap.setter
+    def colormap(self, value):
+        if value not in _preview_colormaps:
+            raise ValueError(f"Invalid preview colormap: {value}")
+        self._colormap = value
+
+    @property
+    def scale_mode(self):
+        return self._scale_mode
+
+    @scale_mode.setter
+    def scale_mode(self, value):
+        if value not in ("auto", "fixed"):
+            raise ValueError(f"Invalid preview scale mode: {value}")
+        self._scale_mode = value
+
+    def encode(self, mat, ir_format, scale_limits=None, downscale=None, quality=None):
+        """
+        Encode a preview of mat
+
+        :param mat: uint16 frame
+        :param ir_format: The ir_format of the frame, used to convert scale limits to raw counts
+        :param scale_limits: (low, high) scale limits in Kelvin, used when scale_mode is "fixed"
+        :param downscale: Overrides the configured downscale if not None
+        :param quality: Overrides the configured JPEG quality if not None
+        :return: Tuple of the encoded JPEG buffer, the preview shape and the (low, high) range in raw counts
+        """
+        downscale = self._downscale if downscale is None else downscale
+        quality = self._quality if quality is None else quality
+        if downscale > 1:
+            small = cv2.resize(mat, (mat.shape[1] // downscale, mat.shape[0] // downscale),
+                interpolation=cv2.INTER_AREA)
+        else:
+            small = mat
+
+        low, high = self._scale_range(small, ir_format, scale_limits)
+        # Saturating subtract clamps values below the range to zero before scaling
+        shifted = cv2.subtract(small, low)
+        alpha = 255.0 / max(high - low, 1)
+        mat8 = cv2.convertScaleAbs(shifted, alpha=alpha)
+        bgr = cv2.applyColorMap(mat8, _preview_colormaps[self._colormap])
+
+        res, encimg = cv2.imencode(".jpg", bgr, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        assert res, "Could not compress preview frame!"
+        return encimg, small.shape, (low, high)
+
+    def _scale_range(self, small, ir_format, scale_limits):
+        if self._scale_mode == "fixed" and scale_limits is not None:
+            counts_per_kelvin = _ir_format_counts_per_kelvin.get(ir_format)
+            if counts_per_kelvin is not None:
+                low = int(scale_limits[0] * counts_per_kelvin)
+                high = int(scale_limits[1] * counts_per_kelvin)
+                low = min(max(low, 0), 65535)
+                high = min(max(high, 0), 65535)
+                if high > low:
+                    return low, high
+        # Radiometric frames have no fixed mapping to Kelvin, so fall back to auto range
+        low, high, _, _ = cv2.minMaxLoc(small)
+        return int(low), int(high)
+
+
+compression_modes = ["png", "tiff_lzw", "byteplane_zlib"]
+if _lz4_frame is not None:
+    compression_modes.append("byteplane_lz4")
+
+
+class FrameCompressor(object):
+    """
+    Lossless compressor for 16-bit frames sent on frame_stream_compressed
+
+    Supported modes:
+
+    * ``png`` - 16-bit PNG with a tunable zlib level (0-9)
+    * ``tiff_lzw`` - 16-bit TIFF with LZW compression
+    * ``byteplane_zlib`` - Frame split into a plane of low bytes followed by a plane of high bytes, then
+      compressed with zlib. Temperature linear frames have nearly constant high bytes, so the high plane
+      compresses to almost nothing.
+    * ``byteplane_lz4`` - Same layout compressed with LZ4 frame format. Requires the ``lz4`` package.
+
+    The mode name is advertised in the ``compression`` field of ``image_info.extended``. Use
+    decode_compressed_frame() to decode any of the modes.
+    """
+
+    def __init__(self, mode="png", png_level=1, zlib_level=1):
+        self.mode = mode
+        self.png_level = png_level
+        self.zlib_level = zlib_level
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        if value not in compression_modes:
+            raise ValueError(f"Invalid compression mode: {value}")
+        self._mode = value
+
+    @property
+    def png_level(self):
+        return self._png_level
+
+    @png_level.setter
+    def png_level(self, value):
+        value = int(value)
+        if value < 0 or value > 9:
+            raise ValueError("PNG compression level must be between 0 and 9")
+        self._png_level = value
+
+    @property
+    def zlib_level(self):
+        return self._zlib_level
+
+    @zlib_level.setter
+    def zlib_level(self, value):
+        value = int(value)
+        if value < 0 or value > 9:
+            raise ValueError("zlib compression level must be between 0 and 9")
+        self._zlib_level = value
+
+    @property
+    def cache_key(self):
+        """Key identifying the current encoding, used to cache compressed frames"""
+        if self._mode == "png":
+            return f"png{self._png_level}"
+        if self._mode == "byteplane_zlib":
+            return f"byteplane_zlib{self._zlib_level}"
+        return self._mode
+
+    def encode(self, mat):
+        """
+        Compress a uint16 frame
+
+        :return: Tuple of the compressed data as a uint8 array and the compression mode name
+        """
+        mode = self._mode
+        if mode == "png":
+            res, encimg = cv2.imencode(".png", mat, [int(cv2.IMWRITE_PNG_COMPRESSION), self._png_level])
+            assert res, "Could not compress frame!"
+            return encimg, mode
+        if mode == "tiff_lzw":
+            # 5 is COMPRESSION_LZW in libtiff
+            res, encimg = cv2.imencode(".tiff", mat, [int(cv2.IMWRITE_TIFF_COMPRESSION), 5])
+            assert res, "Could not compress frame!"
+            return encimg, mode
+        planes = split_byte_planes(mat)
+        if mode == "byteplane_zlib":
+            # Run length strategy is several times faster than the default match search, and the high
+            # byte plane is mostly long runs
+            compressor = zlib.compressobj(self._zlib_level, zlib.DEFLATED, 15, 9, zlib.Z_RLE)
+            data = compressor.compress(planes) + compressor.flush()
+        else:
+            data = _lz4_frame.compress(planes)
+        return np.frombuffer(data, dtype=np.uint8), mode
+
+
+class DeltaFrameEncoder(object):
+    """
+    Temporal delta encoder for frame_stream_compressed
+
+    When keyframe_interval is greater than zero, frame_stream_compressed sends a standalone keyframe every
+    keyframe_interval frames, and residual frames in between. A residual is the wrapping uint16 difference
+    between the frame and the previously sent frame, zigzag encoded so small negative changes have small
+    values, split into byte planes and compressed. Static thermal scenes produce residuals that are almost
+    all zero. Not thread safe, frames must be encoded in order.
+    """
+
+    def __init__(self, keyframe_interval=0):
+        self.keyframe_interval = keyframe_interval
+        self._reference = None
+        self._reference_seqno = 0
+        self._frames_since_keyframe = 0
+
+    @property
+    def keyframe_interval(self):
+        return self._keyframe_interval
+
+    @keyframe_interval.setter
+    def keyframe_interval(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError("Keyframe interval must not be negative")
+        self._keyframe_interval = value
+
+    @property
+    def enabled(self):
+        return self._keyframe_interval > 0
+
+    @property
+    def reference_seqno(self):
+        """Seqno of the frame the next residual is encoded against"""
+        return self._reference_seqno
+
+    def reset(self):
+        """Force the next frame to be a keyframe"""
+        self._reference = None
+
+    def needs_keyframe(self, mat):
+        return self._reference is None or self._reference.shape != mat.shape \
+            or self._frames_since_keyframe + 1 >= self._keyframe_interval
+
+    def set_keyframe(self, seqno, mat):
+        if self._reference is None or self._reference.shape != mat.shape:
+            self._reference = np.empty(mat.shape, dtype=np.uint16)
+        np.copyto(self._reference, mat)
+        self._reference_seqno = seqno
+        self._frames_since_keyframe = 0
+
+    def encode_delta(self, seqno, mat):
+        """
+        Encode mat as a residual against the previous frame
+
+        :return: Tuple of the compressed residual as a uint8 array, the compression name and the
+         seqno of the reference frame
+        """
+        residual = np.subtract(mat, self._reference, dtype=np.uint16).view(np.int16)
+        zigzag = ((residual << 1) ^ (residual >> 15)).view(np.uint16)
+        planes = split_byte_planes(zigzag)
+        if _lz4_frame is not None:
+            data = _lz4_frame.compress(planes)
+            compression = "delta_byteplane_lz4"
+        else:
+            compressor = zlib.compressobj(1, zlib.DEFLATED, 15, 9, zlib.Z_RLE)
+            data = compressor.compress(planes) + compressor.flush()
+            compression = "delta_byteplane_zlib"
+        reference_seqno = self._reference_seqno
+        np.copyto(self._reference, mat)
+        self._reference_seqno = seqno
+        self._frames_since_keyframe += 1
+        return np.frombuffer(data, dtype=np.uint8), compression, reference_seqno
+
+
+class DeltaEncoderGroups(object):
+    """
+    Temporal delta encoders for the clients of frame_stream_compressed
+
+    A residual can only be decoded by a client that received its reference frame, and clients do not
+    receive the same frames because of isoch_downsample, adaptive quality downsampling and backlog drops.
+    Each client is assigned a DeltaFrameEncoder whose reference is the last frame the client was sent.
+    Clients sent the same frames share an encoder and its encoded frames. A client that missed the reference
+    frame of its encoder is sent a keyframe, and clients due a keyframe are moved to one encoder so clients
+    at the same downsample end up sharing it. Clients are only weakly referenced.
+    """
+
+    def __init__(self, keyframe_interval=0):
+        self._lock = threading.Lock()
+        # Client -> tuple of its encoder and the seqno of the last frame it was sent
+        self._clients = weakref.WeakKeyDictionary()
+        self.keyframe_interval = keyframe_interval
+
+    @property
+    def keyframe_interval(self):
+        return self._keyframe_interval
+
+    @keyframe_interval.setter
+    def keyframe_interval(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError("Keyframe interval must not be negative")
+        with self._lock:
+            if value != getattr(self, "_keyframe_interval", None):
+                self._clients.clear()
+            self._keyframe_interval = value
+
+    @property
+    def enabled(self):
+        return self._keyframe_interval > 0
+
+    def reset(self):
+        """Start every client over with a keyframe"""
+        with self._lock:
+            self._clients.clear()
+
+    def discard(self, client):
+        """Start client over with a keyframe, for instance because it was sent a standalone frame or sending failed"""
+        with self._lock:
+            self._clients.pop(client, None)
+
+    def group(self, clients, mat):
+        """
+        Group clients by the encoder holding the last frame they were sent
+
+        :return: List of tuples of a DeltaFrameEncoder and its clients. Frames must be encoded in order, and
+         sent() called for each group before the next frame is grouped.
+        """
+        groups = dict()
+        keyframe_clients = []
+        keyframe_encoder = None
+        with self._lock:
+            for client in clients:
+                encoder, seqno = self._clients.get(client, (None, None))
+                if encoder is not None and encoder.reference_seqno == seqno and not encoder.needs_keyframe(mat):
+                    groups.setdefault(id(encoder), (encoder, []))[1].append(client)
+                    continue
+                keyframe_clients.append(client)
+                if keyframe_encoder is None and encoder is not None and encoder.reference_seqno == seqno:
+                    # Reuse the buffers of an encoder whose clients are all due a keyframe
+                    keyframe_encoder = encoder
+            ret = list(groups.values())
+            if len(keyframe_clients) > 0:
+                if keyframe_encoder is None or id(keyframe_encoder) in groups:
+                    keyframe_encoder = DeltaFrameEncoder(self._keyframe_interval)
+                keyframe_encoder.reset()
+                ret.append((keyframe_encoder, keyframe_clients))
+        return ret
+
+    def sent(self, encoder, clients):
+        """Record that clients were sent the frame last encoded by encoder"""
+        with self._lock:
+            for client in clients:
+                self._clients[client] = (encoder, encoder.reference_seqno)
+
+
+class DeltaFrameDecoder(object):
+    """
+    Client side decoder for frame_stream_compressed packets, including temporal delta frames
+
+    Residual frames can only be decoded if the referenced frame was received. If a frame was missed,
+    for instance because of client downsampling or pipe backlog, decode() returns None until the next
+    keyframe arrives.
+    """
+
+    def __init__(self):
+        self._reference = None
+        self._reference_seqno = None
+        self.decoded_count = 0
+        self.missed_count = 0
+
+    def decode(self, compressed_image):
+        """
+        Decode a CompressedImage received from frame_stream_compressed
+
+        :return: The uint16 frame, or None if the frame references a frame that was not received
+        """
+        image_info = compressed_image.image_info
+        extended = image_info.extended if image_info.extended is not None else {}
+        compression = extended["compression"].data if "compression" in extended else "png"
+        frame_type = extended["delta_frame_type"].data if "delta_frame_type" in extended else None
+        seqno = image_info.data_header.seqno
+
+        if frame_type == "delta":
+            reference_seqno = int(extended["delta_reference_seqno"].data[0])
+            if self._reference is None or reference_seqno != self._reference_seqno:
+                self._reference = None
+                self.missed_count += 1
+                return None
+            zigzag = decode_compressed_frame(compressed_image.data, image_info.height, image_info.width,
+                compression[len("delta_"):])
+            residual = (zigzag >> 1) ^ (np.uint16(0) - (zigzag & 1))
+            mat = np.add(self._reference, residual, dtype=np.uint16)
+        else:
+            mat = decode_compressed_frame(compressed_image.data, image_info.height, image_info.width, compression)
+
+        if frame_type is not None:
+            self._reference = mat
+            self._reference_seqno = seqno
+        self.decoded_count += 1
+        return mat
+
+
+def split_byte_planes(mat):
+    """Return the bytes of a uint16 frame as all low bytes followed by all high bytes"""
+    mat_le = mat.astype("<u2", copy=False)
+    return np.ascontiguousarray(mat_le.reshape(-1).view(np.uint8).reshape(-1, 2).T).tobytes()
+
+
+def join_byte_planes(planes, height, width):
+    """Inverse of split_byte_planes()"""
+    planes_u8 = np.frombuffer(planes, dtype=np.uint8).reshape(2, height * width)
+    ret = np.empty((height, width), dtype="<u2")
+    ret_u8 = ret.reshape(-1).view(np.uint8).reshape(-1, 2)
+    ret_u8[:, 0] = planes_u8[0]
+    ret_u8[:, 1] = planes_u8[1]
+    return ret.astype(np.uint16, copy=False)
+
+
+def decode_compressed_frame(data, height, width, compression="png"):
+    """
+    Decode a frame compressed by FrameCompressor
+
+    :param data: The compressed data, usually CompressedImage.data
+    :param height: Frame height, from image_info.height
+    :param width: Frame width, from image_info.width
+    :param compression: The ``compression`` field of image_info.extended. Defaults to png for older drivers
+    :return: The decoded uint16 frame
+    """
+    if compression in ("png", "tiff_lzw"):
+        mat = cv2.imdecode(np.asarray(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        assert mat is not None, "Could not decode frame!"
+        return mat
+    if compression == "byteplane_zlib":
+        return join_byte_planes(zlib.decompress(memoryview(np.asarray(data, dtype=np.uint8))), height, width)
+    if compression == "byteplane_lz4":
+        assert _lz4_frame is not None, "lz4 package is required to decode byteplane_lz4 frames"
+        return join_byte_planes(_lz4_frame.decompress(memoryview(np.asarray(data, dtype=np.uint8))), 
+            height, width)
+    raise ValueError(f"Unknown compression: {compression}")
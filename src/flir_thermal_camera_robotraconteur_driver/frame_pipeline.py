@@ -0,0 +1,209 @@
+import threading
+import collections
+import traceback
+import os
+
+
+class FramePipeline(object):
+    """
+    Bounded frame queue serviced by a pool of worker threads
+
+    The acquisition callback submits frames with submit(), which never blocks. When the
+    queue is full the oldest queued frame is discarded to make room, and the drop is counted.
+    Worker threads call process_frame(frame) for each queued frame. Encoders such as
+    cv2.imencode release the GIL, so several workers can encode concurrently. If release_frame is
+    specified, it is called once for every submitted frame after it has been processed or dropped.
+
+    If pool is specified, the frames are processed by the workers of the shared pool instead of threads
+    owned by the pipeline, by at most worker_count workers at a time.
+    """
+
+    def __init__(self, process_frame, worker_count=2, max_queue_size=2, name="frame_pipeline", release_frame=None,
+        pool=None):
+        assert worker_count > 0, "worker_count must be greater than zero"
+        assert max_queue_size > 0, "max_queue_size must be greater than zero"
+        self._process_frame = process_frame
+        self._release_frame = release_frame
+        self._worker_count = worker_count
+        self._max_queue_size = max_queue_size
+        self._name = name
+        self._pool = pool
+        self._queue = collections.deque()
+        # Pipelines in a pool share the pool condition, so pool workers can wait on all of their queues
+        self._cv = pool._cv if pool is not None else threading.Condition()
+        self._threads = []
+        self._running = False
+        self._active_count = 0
+
+        self._submitted_count = 0
+        self._processed_count = 0
+        self._dropped_count = 0
+        self._error_count = 0
+
+    def start(self):
+        with self._cv:
+            if self._running:
+                return
+            self._running = True
+            if self._pool is not None:
+                self._pool._add(self)
+                return
+        for i in range(self._worker_count):
+            t = threading.Thread(target=self._worker_threadfunc, name=f"{self._name}_{i}")
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._cv:
+            self._running = False
+            self._dropped_count += len(self._queue)
+            dropped = list(self._queue)
+            self._queue.clear()
+            self._cv.notify_all()
+            if self._pool is not None:
+                self._pool._remove(self)
+                # Wait for the frames being processed by the pool workers
+                self._cv.wait_for(lambda: self._active_count == 0, timeout=1)
+        for frame in dropped:
+            self._release(frame)
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+
+    def submit(self, frame):
+        """Queue a frame for processing, dropping the oldest queued frame if the queue is full"""
+        dropped = None
+        with self._cv:
+            if not self._running:
+                return False
+            self._submitted_count += 1
+            if len(self._queue) >= self._max_queue_size:
+                dropped = self._queue.popleft()
+                self._dropped_count += 1
+            self._queue.append(frame)
+            self._cv.notify()
+        if dropped is not None:
+            self._release(dropped)
+        return True
+
+    def stats(self):
+        with self._cv:
+            return {
+                "worker_count": self._worker_count,
+                "max_queue_size": self._max_queue_size,
+                "queued": len(self._queue),
+                "submitted": self._submitted_count,
+                "processed": self._processed_count,
+                "dropped": self._dropped_count,
+                "errors": self._error_count
+            }
+
+    def _worker_threadfunc(self):
+        while True:
+            with self._cv:
+                while self._running and len(self._queue) == 0:
+                    self._cv.wait()
+                if not self._running:
+                    return
+                frame = self._queue.popleft()
+            self._process(frame)
+
+    def _process(self, frame):
+        try:
+            self._process_frame(frame)
+            with self._cv:
+                self._processed_count += 1
+        except Exception:
+            with self._cv:
+                self._error_count += 1
+            traceback.print_exc()
+        finally:
+            self._release(frame)
+
+    def _release(self, frame):
+        if self._release_frame is not None:
+            self._release_frame(frame)
+
+
+class FramePipelinePool(object):
+    """
+    Worker threads shared by the frame pipelines of several cameras
+
+    Each pipeline keeps its own bounded queue, so a camera that produces frames faster than they can be
+    processed only drops its own frames. Workers take frames from the pipeline queues in turn, and each
+    pipeline is processed by at most its worker_count workers at a time, so a camera with slow frames
+    cannot occupy the whole pool. worker_count defaults to the number of CPU cores.
+    """
+
+    def __init__(self, worker_count=None, name="frame_pipeline_pool"):
+        if not worker_count:
+            worker_count = os.cpu_count() or 2
+        assert worker_count > 0, "worker_count must be greater than zero"
+        self._worker_count = worker_count
+        self._name = name
+        self._cv = threading.Condition()
+        self._pipelines = []
+        self._next_pipeline = 0
+        self._threads = []
+        self._running = False
+
+    @property
+    def worker_count(self):
+        return self._worker_count
+
+    def start(self):
+        with self._cv:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self._worker_count):
+            t = threading.Thread(target=self._worker_threadfunc, name=f"{self._name}_{i}")
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._cv:
+            self._running = False
+            self._cv.notify_all()
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+
+    def _add(self, pipeline):
+        # Called with the pool condition held
+        self._pipelines.append(pipeline)
+
+    def _remove(self, pipeline):
+        # Called with the pool condition held
+        if pipeline in self._pipelines:
+            self._pipelines.remove(pipeline)
+
+    def _take_frame(self):
+        pipeline_count = len(self._pipelines)
+        for i in range(pipeline_count):
+            pipeline = self._pipelines[(self._next_pipeline + i) % pipeline_count]
+            if len(pipeline._queue) > 0 and pipeline._active_count < pipeline._worker_count:
+                self._next_pipeline = (self._next_pipeline + i + 1) % pipeline_count
+                pipeline._active_count += 1
+                return pipeline, pipeline._queue.popleft()
+        return None, None
+
+    def _worker_threadfunc(self):
+        while True:
+            with self._cv:
+                while True:
+                    if not self._running:
+                        return
+                    pipeline, frame = self._take_frame()
+                    if pipeline is not None:
+                        break
+                    self._cv.wait()
+            try:
+                pipeline._process(frame)
+            finally:
+                with self._cv:
+                    pipeline._active_count -= 1
+                    # A frame of this pipeline may be waiting for a free worker
+                    self._cv.notify_all()
@@ -0,0 +1,256 @@
+import threading
+import collections
+import traceback
+import json
+import os
+import re
+import time
+import numpy as np
+
+recording_index_dtype = np.dtype([
+    ("seqno", "<u8"),
+    ("chunk", "<u4"),
+    ("chunk_frame", "<u4"),
+    ("ts_seconds", "<i8"),
+    ("ts_nanoseconds", "<i4"),
+    ("ir_format", "<u4")
+])
+
+_recording_name_re = re.compile(r"^[A-Za-z0-9_\-\.]+$")
+
+
+class FrameRecorder(object):
+    """
+    Records raw frames to memory-mapped chunk files on a dedicated I/O thread
+
+    Each recording is a directory containing:
+
+    * ``chunk_NNNNN.raw`` - Raw little endian uint16 frames, chunk_frames per chunk. Chunk files are preallocated
+      and the last chunk is truncated to the frames written when recording stops.
+    * ``index.bin`` - One fixed size record of recording_index_dtype per frame, so frame N is at byte offset
+      N * recording_index_dtype.itemsize.
+    * ``recording.json`` - Frame shape of each chunk, chunk size, and the ir_format names referenced by the index.
+
+    submit() never blocks. Frames are queued for the I/O thread, and when the queue is full the frame is
+    dropped and counted. If release_frame is specified, it is called once for every submitted frame.
+    """
+
+    def __init__(self, directory, chunk_frames=1024, max_queue_size=64, release_frame=None):
+        assert chunk_frames > 0, "chunk_frames must be greater than zero"
+        assert max_queue_size > 0, "max_queue_size must be greater than zero"
+        self._directory = directory
+        self._chunk_frames = chunk_frames
+        self._max_queue_size = max_queue_size
+        self._release_frame = release_frame
+        self._queue = collections.deque()
+        self._cv = threading.Condition()
+        self._thread = None
+        self._recording = False
+        self._path = None
+
+        self._chunk = None
+        self._chunks = []
+        self._chunk_frame = 0
+        self._index_f = None
+        self._ir_formats = []
+
+        self._recorded_count = 0
+        self._dropped_count = 0
+        self._error_count = 0
+
+    @property
+    def enabled(self):
+        return self._directory is not None
+
+    @property
+    def recording(self):
+        return self._recording
+
+    def start(self, name=None):
+        """Start a new recording, returning the path of the recording directory"""
+        with self._cv:
+            if not self.enabled:
+                raise ValueError("Recording directory not specified")
+            if self._recording:
+                raise ValueError("Already recording")
+            if not name:
+                name = time.strftime("recording_%Y%m%d_%H%M%S")
+            if _recording_name_re.match(name) is None or name in (".", ".."):
+                raise ValueError(f"Invalid recording name: {name}")
+            path = os.path.join(self._directory, name)
+            if os.path.exists(path):
+                raise ValueError(f"Recording already exists: {name}")
+            os.makedirs(path)
+            self._path = path
+            self._chunk = None
+            self._chunks = []
+            self._chunk_frame = 0
+            self._ir_formats = []
+            self._recorded_count = 0
+            self._dropped_count = 0
+            self._error_count = 0
+            self._index_f = open(os.path.join(path, "index.bin"), "wb")
+            self._recording = True
+            self._thread = threading.Thread(target=self._io_threadfunc, name="thermal_camera_recorder")
+            self._thread.daemon = True
+            self._thread.start()
+            return path
+
+    def stop(self):
+        """Stop recording after the queued frames have been written"""
+        with self._cv:
+            if not self._recording:
+                return
+            self._recording = False
+            self._cv.notify_all()
+            t = self._thread
+        t.join()
+        self._thread = None
+
+    def submit(self, frame):
+        with self._cv:
+            if not self._recording:
+                return False
+            if len(self._queue) >= self._max_queue_size:
+                self._dropped_count += 1
+                dropped = True
+            else:
+                self._queue.append(frame)
+                self._cv.notify()
+                dropped = False
+        if dropped:
+            self._release(frame)
+        return True
+
+    def stats(self):
+        with self._cv:
+            return {
+                "recording": int(self._recording),
+                "path": self._path or "",
+                "queued": len(self._queue),
+                "recorded": self._recorded_count,
+                "dropped": self._dropped_count,
+                "errors": self._error_count,
+                "chunks": len(self._chunks)
+            }
+
+    def _io_threadfunc(self):
+        while True:
+            with self._cv:
+                while self._recording and len(self._queue) == 0:
+                    self._cv.wait()
+                if len(self._queue) == 0:
+                    break
+                frame = self._queue.popleft()
+            try:
+                self._write_frame(frame)
+                with self._cv:
+                    self._recorded_count += 1
+            except Exception:
+                with self._cv:
+                    self._error_count += 1
+                traceback.print_exc()
+            finally:
+                self._release(frame)
+        try:
+            self._close_recording()
+        except Exception:
+            traceback.print_exc()
+
+    def _write_frame(self, frame):
+        mat = frame.mat
+        if self._chunk is None or self._chunk_frame >= self._chunk_frames or self._chunk.shape[1:] != mat.shape:
+            self._close_chunk()
+            chunk_fname = os.path.join(self._path, "chunk_%05d.raw" % len(self._chunks))
+            self._chunk = np.memmap(chunk_fname, dtype="<u2", mode="w+", shape=(self._chunk_frames,) + mat.shape)
+            self._chunks.append({"file": os.path.basename(chunk_fname), "height": mat.shape[0],
+                "width": mat.shape[1], "frames": 0})
+            self._chunk_frame = 0
+            self._write_metadata()
+
+        np.copyto(self._chunk[self._chunk_frame], mat)
+
+        if frame.ir_format not in self._ir_formats:
+            self._ir_formats.append(frame.ir_format)
+            self._write_metadata()
+        ts = frame.data_header.ts[0]
+        index_entry = np.zeros(1, dtype=recording_index_dtype)
+        index_entry["seqno"] = frame.seqno
+        index_entry["chunk"] = len(self._chunks) - 1
+        index_entry["chunk_frame"] = self._chunk_frame
+        index_entry["ts_seconds"] = ts["seconds"]
+        index_entry["ts_nanoseconds"] = ts["nanoseconds"]
+        index_entry["ir_format"] = self._ir_formats.index(frame.ir_format)
+        self._index_f.write(index_entry.tobytes())
+
+        self._chunk_frame += 1
+        self._chunks[-1]["frames"] = self._chunk_frame
+
+    def _close_chunk(self):
+        if self._chunk is None:
+            return
+        self._chunk.flush()
+        chunk_fname = self._chunk.filename
+        chunk_bytes = self._chunk_frame * self._chunk[0].nbytes
+        del self._chunk
+        self._chunk = None
+        # Remove the unused preallocated frames from the end of the chunk
+        os.truncate(chunk_fname, chunk_bytes)
+
+    def _close_recording(self):
+        self._close_chunk()
+        self._index_f.close()
+        self._index_f = None
+        self._write_metadata()
+
+    def _write_metadata(self):
+        metadata = {
+            "dtype": "<u2",
+            "chunk_frames": self._chunk_frames,
+            "chunks": self._chunks,
+            "ir_formats": self._ir_formats
+        }
+        with open(os.path.join(self._path, "recording.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    def _release(self, frame):
+        if self._release_frame is not None:
+            self._release_frame(frame)
+
+
+class RecordingReader(object):
+    """
+    Random access reader for recordings made by FrameRecorder
+
+    Frames are returned as read-only memory-mapped views of the chunk files.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "recording.json"), "r") as f:
+            self._metadata = json.load(f)
+        self.index = np.fromfile(os.path.join(path, "index.bin"), dtype=recording_index_dtype)
+        self._chunks = []
+        for chunk in self._metadata["chunks"]:
+            shape = (chunk["frames"], chunk["height"], chunk["width"])
+            if chunk["frames"] == 0:
+                self._chunks.append(np.zeros(shape, dtype=np.uint16))
+            else:
+                self._chunks.append(np.memmap(os.path.join(path, chunk["file"]), dtype=self._metadata["dtype"],
+                    mode="r", shape=shape))
+
+    def __len__(self):
+        return len(self.index)
+
+    def read(self, i):
+        """:return: Tuple of the frame, seqno, timestamp in seconds, and ir_format of frame i"""
+        entry = self.index[i]
+        ts = float(entry["ts_seconds"]) + float(entry["ts_nanoseconds"]) * 1e-9
+        return (self._chunks[entry["chunk"]][entry["chunk_frame"]], int(entry["seqno"]), ts,
+            self._metadata["ir_formats"][entry["ir_format"]])
+
+    def find_seqno(self, seqno):
+        """Return the index of the frame with seqno, or -1 if it was not recorded"""
+        i = int(np.searchsorted(self.index["seqno"], seqno))
+        if i < len(self.index) and self.index["seqno"][i] == seqno:
+            return i
+        return -1
@@ -0,0 +1,190 @@
+import threading
+import numpy as np
+
+class PretriggerRingBuffer(object):
+    """
+    Ring buffer of the most recent raw frames, for capturing the frames before and after a trigger
+
+    Storage for as many frames as fit in max_bytes is allocated when the first frame arrives, and frames are
+    copied in with push(). trigger() starts a capture. Recording continues for post_seconds, then the buffer
+    is frozen so the capture is not overwritten. get_capture() returns the frames from pre_seconds before the
+    trigger to post_seconds after it, limited by the buffer capacity. release() discards the capture and
+    resumes recording. If release_timeout is greater than zero, a capture that is not released within
+    release_timeout seconds of completing is discarded by the next push().
+
+    States are ``recording``, ``post_trigger`` and ``captured``.
+    """
+
+    def __init__(self, max_bytes=0, pre_seconds=2.0, post_seconds=1.0, release_timeout=60.0):
+        self._max_bytes = max_bytes
+        self._cv = threading.Condition()
+        self._frames = None
+        self._seqnos = None
+        self._timestamps = None
+        self._ir_formats = None
+        self._data_headers = None
+        self._capacity = 0
+        self._count = 0
+        self._state = "recording"
+        self._trigger_seqno = 0
+        self._trigger_timestamp = 0.0
+        self._captured_timestamp = 0.0
+        self._owner = None
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.release_timeout = release_timeout
+
+        self.pushed_count = 0
+        self.skipped_count = 0
+        self.trigger_count = 0
+        self.expired_count = 0
+
+    @property
+    def enabled(self):
+        return self._max_bytes > 0
+
+    @property
+    def pre_seconds(self):
+        return self._pre_seconds
+
+    @pre_seconds.setter
+    def pre_seconds(self, value):
+        value = float(value)
+        if value < 0:
+            raise ValueError("Pre-trigger time must not be negative")
+        self._pre_seconds = value
+
+    @property
+    def post_seconds(self):
+        return self._post_seconds
+
+    @post_seconds.setter
+    def post_seconds(self, value):
+        value = float(value)
+        if value < 0:
+            raise ValueError("Post-trigger time must not be negative")
+        self._post_seconds = value
+
+    @property
+    def release_timeout(self):
+        return self._release_timeout
+
+    @release_timeout.setter
+    def release_timeout(self, value):
+        value = float(value)
+        if value < 0:
+            raise ValueError("Trigger capture release timeout must not be negative")
+        self._release_timeout = value
+
+    @property
+    def state(self):
+        with self._cv:
+            return self._state
+
+    def push(self, seqno, mat, ir_format, data_header, timestamp):
+        with self._cv:
+            if self._state == "captured":
+                if self._release_timeout == 0 or timestamp < self._captured_timestamp + self._release_timeout:
+                    self.skipped_count += 1
+                    return
+                self.expired_count += 1
+                self._state = "recording"
+                self._owner = None
+            if self._frames is None or self._frames.shape[1:] != mat.shape:
+                if not self._allocate(mat.shape):
+                    self.skipped_count += 1
+                    return
+            slot = self._count % self._capacity
+            np.copyto(self._frames[slot], mat)
+            self._seqnos[slot] = seqno
+            self._timestamps[slot] = timestamp
+            self._ir_formats[slot] = ir_format
+            self._data_headers[slot] = data_header
+            self._count += 1
+            self.pushed_count += 1
+            if self._state == "post_trigger" and timestamp >= self._trigger_timestamp + self._post_seconds:
+                self._state = "captured"
+                self._captured_timestamp = timestamp
+                self._cv.notify_all()
+
+    def trigger(self, seqno, timestamp, owner=None):
+        """Start a capture. owner identifies the capture for release()"""
+        with self._cv:
+            if not self.enabled:
+                raise ValueError("Pre-trigger ring buffer is disabled")
+            if self._state != "recording":
+                raise ValueError("Trigger capture already in progress")
+            self._trigger_seqno = seqno
+            self._trigger_timestamp = timestamp
+            self._captured_timestamp = timestamp
+            self._owner = owner
+            self._state = "captured" if self._post_seconds == 0 else "post_trigger"
+            self.trigger_count += 1
+
+    def get_capture(self, timeout, index=0, count=0, max_bytes=0):
+        """
+        Wait for the trigger capture to complete and return count frames of it starting at frame index
+
+        A count of 0 returns every frame from index. If max_bytes is greater than zero, fewer frames are returned
+        if needed to keep the frame stack within max_bytes, but at least one.
+
+        :return: Tuple of the trigger seqno, total number of frames in the capture, frame stack copied from the
+         buffer, seqnos, timestamps relative to the trigger, ir_formats, and data headers, oldest first
+        """
+        with self._cv:
+            if self._state == "recording":
+                raise ValueError("No trigger capture")
+            if not self._cv.wait_for(lambda: self._state != "post_trigger", timeout):
+                raise ValueError("Trigger capture not complete")
+            if self._state != "captured":
+                raise ValueError("No trigger capture")
+
+            # Slots in age order, oldest first
+            n = min(self._count, self._capacity)
+            order = (np.arange(self._count - n, self._count) % self._capacity) if n > 0 else np.zeros(0, np.int64)
+            timestamps = self._timestamps[order] - self._trigger_timestamp
+            order = order[(timestamps >= -self._pre_seconds) & (timestamps <= self._post_seconds)]
+            frame_count = len(order)
+            if max_bytes > 0 and self._frames is not None:
+                max_count = max(max_bytes // self._frames[0].nbytes, 1)
+                count = max_count if count == 0 else min(count, max_count)
+            order = order[index:index + count] if count > 0 else order[index:]
+            return (self._trigger_seqno, frame_count, self._frames[order], self._seqnos[order],
+                self._timestamps[order] - self._trigger_timestamp,
+                [self._ir_formats[i] for i in order], [self._data_headers[i] for i in order])
+
+    def release(self, owner=None):
+        """Discard the capture and resume recording. If owner is specified, only a capture triggered by owner"""
+        with self._cv:
+            if owner is not None and (self._state == "recording" or owner != self._owner):
+                return
+            self._state = "recording"
+            self._owner = None
+            self._cv.notify_all()
+
+    def stats(self):
+        with self._cv:
+            return {
+                "state": self._state,
+                "capacity": self._capacity,
+                "frames": min(self._count, self._capacity),
+                "pushed": self.pushed_count,
+                "skipped": self.skipped_count,
+                "triggers": self.trigger_count,
+                "expired": self.expired_count
+            }
+
+    def _allocate(self, shape):
+        frame_bytes = int(np.prod(shape)) * 2
+        capacity = self._max_bytes // frame_bytes
+        if capacity < 1:
+            return False
+        # A resolution change discards the buffered frames, including any capture in progress
+        self._frames = np.empty((capacity,) + tuple(shape), dtype=np.uint16)
+        self._seqnos = np.zeros(capacity, dtype=np.uint64)
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._ir_formats = [None] * capacity
+        self._data_headers = [None] * capacity
+        self._capacity = capacity
+        self._count = 0
+        return True
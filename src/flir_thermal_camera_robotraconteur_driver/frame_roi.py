@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+roi_decimation_modes = ["stride", "bin"]
+
+
+class RoiSettings(object):
+    """
+    Region of interest and spatial decimation requested by a frame_stream_roi client
+
+    roi is (x, y, width, height) in pixels, or None for the full frame. Decimation by an integer factor
+    either keeps every decimation'th pixel ("stride") or averages decimation x decimation blocks ("bin").
+    """
+
+    __slots__ = ["_roi", "_decimation", "_decimation_mode"]
+
+    def __init__(self, roi=None, decimation=1, decimation_mode="stride"):
+        self.roi = roi
+        self.decimation = decimation
+        self.decimation_mode = decimation_mode
+
+    @property
+    def roi(self):
+        return self._roi
+
+    @roi.setter
+    def roi(self, value):
+        if value is None or len(value) == 0:
+            self._roi = None
+            return
+        if len(value) != 4:
+            raise ValueError("ROI must be [x, y, width, height]")
+        roi = tuple(int(v) for v in value)
+        if roi[0] < 0 or roi[1] < 0 or roi[2] <= 0 or roi[3] <= 0:
+            raise ValueError("ROI origin must not be negative and size must be greater than zero")
+        self._roi = roi
+
+    @property
+    def decimation(self):
+        return self._decimation
+
+    @decimation.setter
+    def decimation(self, value):
+        value = int(value)
+        if value < 1:
+            raise ValueError("ROI decimation must be at least 1")
+        self._decimation = value
+
+    @property
+    def decimation_mode(self):
+        return self._decimation_mode
+
+    @decimation_mode.setter
+    def decimation_mode(self, value):
+        if value not in roi_decimation_modes:
+            raise ValueError(f"Invalid ROI decimation mode: {value}")
+        self._decimation_mode = value
+
+    @property
+    def key(self):
+        """Hashable key, clients with equal keys receive the same image"""
+        return (self._roi, self._decimation, self._decimation_mode)
+
+
+def extract_roi(mat, settings):
+    """
+    Crop and decimate a frame
+
+    The ROI is clipped to the frame. Binning drops trailing rows and columns that do not fill a
+    complete block.
+
+    :return: Tuple of the contiguous uint16 result, or None if the ROI is outside the frame, and the
+     (x, y) origin of the ROI in the frame
+    """
+    x, y = 0, 0
+    sub = mat
+    if settings.roi is not None:
+        x, y, w, h = settings.roi
+        sub = mat[y:y+h, x:x+w]
+        if sub.size == 0:
+            return None, (x, y)
+
+    d = settings.decimation
+    if d > 1:
+        if settings.decimation_mode == "stride":
+            sub = sub[::d, ::d]
+        else:
+            h2 = sub.shape[0] // d
+            w2 = sub.shape[1] // d
+            if h2 == 0 or w2 == 0:
+                return None, (x, y)
+            # Area interpolation with an integer factor is the mean of each block
+            sub = cv2.resize(sub[:h2*d, :w2*d], (w2, h2), interpolation=cv2.INTER_AREA)
+
+    return np.ascontiguousarray(sub), (x, y)
@@ -0,0 +1,99 @@
+import threading
+import cv2
+import numpy as np
+
+
+class FrameStatistics(object):
+    """
+    Per-frame statistics of the whole frame and of named regions of interest
+
+    For each region compute() returns the min, max, mean, and standard deviation in raw counts, the location of
+    the hottest pixel in frame coordinates, and a histogram of the raw counts with 65536 >> histogram_shift bins.
+    Regions are (x, y, width, height) tuples clipped to the frame. The whole frame is always reported first,
+    named ``frame``.
+    """
+
+    def __init__(self, histogram_shift=8, rois=None):
+        self._lock = threading.Lock()
+        self.histogram_shift = histogram_shift
+        self.rois = rois if rois is not None else dict()
+
+        self.computed_count = 0
+
+    @property
+    def histogram_shift(self):
+        return self._histogram_shift
+
+    @histogram_shift.setter
+    def histogram_shift(self, value):
+        value = int(value)
+        if value < 0 or value > 16:
+            raise ValueError("Histogram shift must be between 0 and 16")
+        self._histogram_shift = value
+
+    @property
+    def rois(self):
+        with self._lock:
+            return dict(self._rois)
+
+    @rois.setter
+    def rois(self, value):
+        rois = dict()
+        for name, roi in value.items():
+            if name == "frame":
+                raise ValueError("Statistics ROI name frame is reserved")
+            if len(roi) != 4:
+                raise ValueError("Statistics ROI must be [x, y, width, height]")
+            roi = tuple(int(v) for v in roi)
+            if roi[0] < 0 or roi[1] < 0 or roi[2] <= 0 or roi[3] <= 0:
+                raise ValueError("Statistics ROI origin must not be negative and size must be greater than zero")
+            rois[str(name)] = roi
+        with self._lock:
+            self._rois = rois
+
+    def compute(self, mat):
+        """
+        Compute the statistics of mat
+
+        :return: Tuple of the histogram shift and a list of (name, (x, y, width, height), region statistics dict)
+         tuples. Regions that are entirely outside the frame are omitted.
+        """
+        with self._lock:
+            rois = list(self._rois.items())
+            self.computed_count += 1
+        histogram_shift = self._histogram_shift
+
+        ret = [("frame", (0, 0, mat.shape[1], mat.shape[0]), _region_statistics(mat, histogram_shift))]
+        for name, (x, y, w, h) in rois:
+            sub = mat[y:y+h, x:x+w]
+            if sub.size == 0:
+                continue
+            region = _region_statistics(sub, histogram_shift)
+            region["max_x"] += x
+            region["max_y"] += y
+            ret.append((name, (x, y, sub.shape[1], sub.shape[0]), region))
+        return histogram_shift, ret
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rois": len(self._rois),
+                "computed": self.computed_count
+            }
+
+
+def _region_statistics(mat, histogram_shift):
+    # cv2.minMaxLoc and cv2.meanStdDev each make a single pass over the region without temporaries
+    min_val, max_val, _, max_loc = cv2.minMaxLoc(mat)
+    mean, std = cv2.meanStdDev(mat)
+    bins = np.right_shift(mat, histogram_shift).reshape(-1) if histogram_shift > 0 else mat.reshape(-1)
+    histogram = np.bincount(bins, minlength=65536 >> histogram_shift).astype(np.uint32)
+    return {
+        "min": int(min_val),
+        "max": int(max_val),
+        "mean": float(mean[0, 0]),
+        "std": float(std[0, 0]),
+        "max_x": max_loc[0],
+        "max_y": max_loc[1],
+        "histogram": histogram
+    }
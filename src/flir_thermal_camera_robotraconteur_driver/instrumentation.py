@@ -0,0 +1,132 @@
+import threading
+import time
+import numpy as np
+
+# Bucket i counts durations of less than 2^i microseconds, the last bucket counts everything longer
+_histogram_bucket_count = 24
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of durations with power of two microsecond buckets
+
+    Recording is a few integer operations, so it can be used on every frame. Percentiles are reported as the
+    upper bound of the bucket they fall in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = [0] * _histogram_bucket_count
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), _histogram_bucket_count - 1)
+        with self._lock:
+            self._buckets[bucket] += 1
+            self._count += 1
+            self._total += seconds
+            if seconds > self._max:
+                self._max = seconds
+
+    def stats(self):
+        with self._lock:
+            buckets = list(self._buckets)
+            count = self._count
+            total = self._total
+            max_seconds = self._max
+        return {
+            "count": count,
+            "mean_us": (total / count) * 1e6 if count > 0 else 0.0,
+            "p50_us": float(_bucket_percentile(buckets, count, 0.5)),
+            "p99_us": float(_bucket_percentile(buckets, count, 0.99)),
+            "max_us": max_seconds * 1e6,
+            "histogram": np.array(buckets, dtype=np.uint64)
+        }
+
+
+def _bucket_percentile(buckets, count, fraction):
+    if count == 0:
+        return 0
+    target = fraction * count
+    cumulative = 0
+    for i, n in enumerate(buckets):
+        cumulative += n
+        if cumulative >= target:
+            return 1 << i
+    return 1 << (len(buckets) - 1)
+
+
+class HotPathInstrumentation(object):
+    """
+    Per-stage latency histograms and event counters for the frame path
+
+    Stages and counters are created on first use. stats() flattens them into a single dict with
+    ``<stage>_<statistic>`` keys, where ``<stage>_histogram`` is the bucket counts of the stage histogram.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = dict()
+        self._counters = dict()
+
+    def record(self, stage, seconds):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, LatencyHistogram())
+        histogram.record(seconds)
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def stats(self):
+        with self._lock:
+            stages = list(self._stages.items())
+            ret = dict(self._counters)
+        for stage, histogram in stages:
+            for k, v in histogram.stats().items():
+                ret[f"{stage}_{k}"] = v
+        return ret
+
+    def summary(self):
+        """One line summary of the stage p99 latencies and counters, for logging"""
+        with self._lock:
+            stages = sorted(self._stages.items())
+            counters = sorted(self._counters.items())
+        parts = [f"{stage} p99 {histogram.stats()['p99_us']:.0f} us" for stage, histogram in stages]
+        parts += [f"{counter} {n}" for counter, n in counters]
+        return ", ".join(parts)
+
+
+class StartupTimer(object):
+    """
+    Durations of the driver startup phases
+
+    lap(phase) adds the time since the previous lap, or since the timer was created, to the phase. Phases
+    that run once per camera accumulate. Phases are reported in the order they first ran.
+    """
+
+    def __init__(self, start_time=None):
+        self._start_time = start_time if start_time is not None else time.perf_counter()
+        self._last_time = self._start_time
+        self._phases = dict()
+
+    def add(self, phase, seconds):
+        self._phases[phase] = self._phases.get(phase, 0.0) + seconds
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.add(phase, now - self._last_time)
+        self._last_time = now
+
+    def phases(self):
+        return dict(self._phases)
+
+    def summary(self):
+        """One line summary of the phase durations and the total, for logging"""
+        parts = [f"{phase} {seconds:.3f} s" for phase, seconds in self._phases.items()]
+        parts.append(f"total {self._last_time - self._start_time:.3f} s")
+        return ", ".join(parts)
@@ -0,0 +1,174 @@
+import threading
+import traceback
+import time
+import numpy as np
+import RobotRaconteur as RR
+
+from .thermal_camera_driver import ThermalCameraImpl, _normal_params
+from .frame_recorder import RecordingReader
+
+replay_pacing_modes = ["realtime", "fixed", "max"]
+
+
+class RecordingFrameSource(object):
+    """
+    Frames read from a recording made with start_recording()
+
+    The frame rate is estimated from the recorded timestamps. Frames yield the recorded time of each frame,
+    so realtime pacing reproduces the original timing including dropped frames.
+    """
+
+    def __init__(self, path, loop=True):
+        self._reader = RecordingReader(path)
+        assert len(self._reader) > 0, "Recording is empty"
+        self._loop = loop
+        ts = self._reader.index["ts_seconds"] + self._reader.index["ts_nanoseconds"] * 1e-9
+        dt = np.diff(ts)
+        dt = dt[dt > 0]
+        self.fps = float(1.0 / np.median(dt)) if len(dt) > 0 else 30.0
+
+    def frames(self):
+        """Yield (mat, ir_format, timestamp) tuples"""
+        while True:
+            for i in range(len(self._reader)):
+                mat, _, ts, ir_format = self._reader.read(i)
+                yield mat, ir_format, ts
+            if not self._loop:
+                return
+
+
+class SyntheticFrameSource(object):
+    """
+    Synthetic temperature_linear_10mK frames of a hot spot moving over a background gradient with noise
+
+    A cycle of frame_count frames is generated up front and repeated, so generating frames costs nothing
+    when replaying as fast as possible.
+    """
+
+    def __init__(self, width=320, height=240, fps=30.0, frame_count=64, seed=0):
+        self.fps = fps
+        rng = np.random.default_rng(seed)
+        y, x = np.mgrid[0:height, 0:width]
+        # 20 C to 30 C background in 10 mK counts
+        background = 29315.0 + 1000.0 * x / max(width - 1, 1)
+        self._frames = np.empty((frame_count, height, width), dtype=np.uint16)
+        radius = min(width, height) / 3.0
+        for i in range(frame_count):
+            angle = 2.0 * np.pi * i / frame_count
+            cx = width / 2.0 + radius * np.cos(angle)
+            cy = height / 2.0 + radius * np.sin(angle)
+            # 60 C hot spot
+            spot = 4000.0 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2.0 * 8.0 ** 2))
+            noise = rng.normal(0.0, 5.0, (height, width))
+            self._frames[i] = np.clip(background + spot + noise, 0, 65535).astype(np.uint16)
+
+    def frames(self):
+        i = 0
+        while True:
+            yield self._frames[i % len(self._frames)], "temperature_linear_10mK", i / self.fps
+            i += 1
+
+
+class ReplayThermalCameraImpl(ThermalCameraImpl):
+    """
+    Camera service fed from a frame source instead of a PySpin camera
+
+    Pacing modes:
+
+    * ``realtime`` - Frames are sent with the timing of the source timestamps
+    * ``fixed`` - Frames are sent at fps
+    * ``max`` - Frames are sent as fast as they can be ingested
+
+    Camera parameters that are stored on the camera are not available. ir_format is read only and follows
+    the source.
+    """
+
+    def __init__(self, frame_source, camera_info, pacing="realtime", fps=None, **kwargs):
+        assert pacing in replay_pacing_modes, f"Invalid replay pacing: {pacing}"
+        super().__init__(None, camera_info, **kwargs)
+        self._frame_source = frame_source
+        self._pacing = pacing
+        self._fps = float(fps) if fps is not None else frame_source.fps
+        self._current_irformat = "temperature_linear_10mK"
+        self._replay_thread = None
+        self._replay_running = False
+
+        self.replayed_count = 0
+
+    def _start(self):
+        self._ingest_pipeline.start()
+        self._frame_pipeline.start()
+        self._aggregate_pipeline.start()
+        self._replay_running = True
+        self._replay_thread = threading.Thread(target=self._replay_threadfunc, name="thermal_camera_replay")
+        self._replay_thread.daemon = True
+        self._replay_thread.start()
+
+    def _close(self):
+        self._replay_running = False
+        if self._replay_thread is not None:
+            self._replay_thread.join(timeout=1)
+        self._ingest_pipeline.stop()
+        self._frame_pipeline.stop()
+        self._aggregate_pipeline.stop()
+        self._frame_recorder.stop()
+        self._shared_frame_ring.close()
+        self._streaming = False
+
+    def _update_scale_limits(self):
+        self._scale_limits = None
+
+    def _read_radiometric_params(self):
+        return None
+
+    def _replay_threadfunc(self):
+        period = 1.0 / self._fps
+        next_time = time.perf_counter()
+        first_ts = None
+        prev_ts = None
+        start_time = next_time
+        try:
+            for mat, ir_format, ts in self._frame_source.frames():
+                if not self._replay_running:
+                    return
+                if self._pacing == "realtime":
+                    if prev_ts is None or ts <= prev_ts:
+                        # Restart the clock when the source loops
+                        first_ts = ts
+                        start_time = time.perf_counter() + period
+                    prev_ts = ts
+                    next_time = start_time + (ts - first_ts)
+                elif self._pacing == "fixed":
+                    # Do not try to catch up after falling more than a frame behind
+                    next_time = max(next_time + period, time.perf_counter() - period)
+                if self._pacing != "max":
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                if ir_format != self._current_irformat:
+                    self._current_irformat = ir_format
+                    self._temperature_lut.invalidate()
+                self._begin_frame()
+                self._ingest_frame(mat)
+                self.replayed_count += 1
+        except Exception:
+            traceback.print_exc()
+
+    def getf_param(self, param_name):
+        if param_name in _normal_params:
+            raise RR.InvalidArgumentException(f"Parameter {param_name} is not available in replay")
+        if param_name == "fps":
+            return RR.VarValue(self._fps, "double")
+        if param_name == "ir_format":
+            return RR.VarValue(self._current_irformat, "string")
+        if param_name == "replay_pacing":
+            return RR.VarValue(self._pacing, "string")
+        if param_name == "replay_count":
+            return RR.VarValue(self.replayed_count, "uint64")
+        return super().getf_param(param_name)
+
+    def setf_param(self, param_name, value):
+        if param_name in _normal_params or param_name in ("fps", "ir_format"):
+            raise RR.InvalidArgumentException(f"Parameter {param_name} is read only in replay")
+        super().setf_param(param_name, value)
@@ -0,0 +1,277 @@
+import os
+import time
+import numpy as np
+
+# multiprocessing.shared_memory was added in Python 3.8, the driver runs without it if the ring is not enabled
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+shared_frame_ring_magic = b"FLIRSHM1"
+shared_frame_ring_version = 1
+# ir_format values are stored as an index into this list
+shared_frame_ring_ir_formats = ["temperature_linear_10mK", "temperature_linear_100mK", "radiometric"]
+
+shared_frame_ring_header_dtype = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("slot_count", "<u4"),
+    ("header_bytes", "<u4"),
+    ("slot_header_bytes", "<u4"),
+    ("slot_bytes", "<u8"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+    # Number of frames published, the latest frame is in slot (frames_written - 1) % slot_count
+    ("frames_written", "<u8"),
+    ("_reserved", "S16")
+])
+
+shared_frame_ring_slot_header_dtype = np.dtype([
+    # Odd while the slot is being written
+    ("sequence", "<u8"),
+    # Index of the frame in the ring, frames_written - 1 when it was published
+    ("frame_index", "<u8"),
+    ("seqno", "<u8"),
+    ("ts_seconds", "<i8"),
+    ("ts_nanoseconds", "<i4"),
+    ("ir_format", "<u4"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+    ("_reserved", "S16")
+])
+
+assert shared_frame_ring_header_dtype.itemsize == 64
+assert shared_frame_ring_slot_header_dtype.itemsize == 64
+
+
+class SharedFrame(object):
+    """Frame read from a shared frame ring"""
+    __slots__ = ["frame_index", "seqno", "mat", "ir_format", "timestamp", "_sequence"]
+
+    def __init__(self, frame_index, seqno, mat, ir_format, timestamp, sequence):
+        self.frame_index = frame_index
+        self.seqno = seqno
+        self.mat = mat
+        self.ir_format = ir_format
+        self.timestamp = timestamp
+        self._sequence = sequence
+
+
+class SharedFrameRingWriter(object):
+    """
+    Publishes raw frames to a named shared memory ring for clients on the same host
+
+    The segment starts with a header of shared_frame_ring_header_dtype, followed by slot_count slots of
+    slot_header_bytes of shared_frame_ring_slot_header_dtype and slot_bytes of little endian uint16 frame
+    data. Each slot is protected by a sequence lock: the slot sequence is odd while the slot is written, so a
+    reader that sees the same even sequence before and after reading a slot has a consistent frame. There is
+    a single writer and any number of readers, and readers never block the writer.
+
+    The segment is created when the first frame is written, sized for its resolution, and recreated with a
+    new name if the resolution changes. If name is None, a unique name is generated.
+    """
+
+    def __init__(self, slot_count=0, name=None):
+        assert slot_count >= 0, "slot_count must not be negative"
+        assert slot_count == 0 or shared_memory is not None, "Shared memory frame ring requires Python 3.8 or newer"
+        self._slot_count = slot_count
+        self._name = name
+        self._shm = None
+        self._header = None
+        self._slot_headers = None
+        self._slots = None
+        self._frames_written = 0
+
+    @property
+    def enabled(self):
+        return self._slot_count > 0
+
+    def write(self, seqno, mat, ir_format, ts_seconds, ts_nanoseconds):
+        if self._shm is None or self._slots.shape[1:] != mat.shape:
+            self._create(mat.shape)
+        frame_index = self._frames_written
+        slot = frame_index % self._slot_count
+        slot_header = self._slot_headers[slot]
+        sequence = int(slot_header["sequence"])
+        slot_header["sequence"] = sequence + 1
+        slot_header["frame_index"] = frame_index
+        slot_header["seqno"] = seqno
+        slot_header["ts_seconds"] = ts_seconds
+        slot_header["ts_nanoseconds"] = ts_nanoseconds
+        slot_header["ir_format"] = shared_frame_ring_ir_formats.index(ir_format)
+        slot_header["width"] = mat.shape[1]
+        slot_header["height"] = mat.shape[0]
+        np.copyto(self._slots[slot], mat)
+        slot_header["sequence"] = sequence + 2
+        self._frames_written = frame_index + 1
+        self._header["frames_written"] = self._frames_written
+
+    def layout(self):
+        """Segment name and layout, advertised to clients through getf_param"""
+        if self._shm is None:
+            return {"name": "", "slot_count": self._slot_count, "frames_written": 0}
+        return {
+            "name": self._shm.name,
+            "slot_count": self._slot_count,
+            "header_bytes": shared_frame_ring_header_dtype.itemsize,
+            "slot_header_bytes": shared_frame_ring_slot_header_dtype.itemsize,
+            "slot_bytes": self._slots[0].nbytes,
+            "width": self._slots.shape[2],
+            "height": self._slots.shape[1],
+            "frames_written": self._frames_written
+        }
+
+    def close(self):
+        if self._shm is None:
+            return
+        # The numpy views must be released before the segment can be closed
+        self._header = None
+        self._slot_headers = None
+        self._slots = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def _create(self, shape):
+        self.close()
+        height, width = shape
+        header_bytes = shared_frame_ring_header_dtype.itemsize
+        slot_header_bytes = shared_frame_ring_slot_header_dtype.itemsize
+        slot_bytes = height * width * 2
+        size = header_bytes + self._slot_count * (slot_header_bytes + slot_bytes)
+        self._shm = shared_memory.SharedMemory(name=self._name, create=True, size=size)
+        buf = self._shm.buf
+        self._header = np.ndarray((), dtype=shared_frame_ring_header_dtype, buffer=buf)
+        self._header["magic"] = shared_frame_ring_magic
+        self._header["version"] = shared_frame_ring_version
+        self._header["slot_count"] = self._slot_count
+        self._header["header_bytes"] = header_bytes
+        self._header["slot_header_bytes"] = slot_header_bytes
+        self._header["slot_bytes"] = slot_bytes
+        self._header["width"] = width
+        self._header["height"] = height
+        self._header["frames_written"] = 0
+        self._slot_headers, self._slots = _slot_views(buf, header_bytes, self._slot_count, slot_header_bytes,
+            height, width)
+        self._frames_written = 0
+        # Further resizes get a generated name, the old name may still be mapped by clients
+        self._name = None
+
+
+class SharedFrameRingReader(object):
+    """
+    Reads frames from a shared frame ring published by the driver on the same host
+
+    The segment name is the "name" field of the "shared_memory_ring" parameter of the camera service.
+    read() copies a frame out of the ring. view() returns a frame that references the ring memory without
+    copying, which remains valid until the writer wraps around to its slot. Check valid() after using a
+    view to detect that it was overwritten while in use.
+    """
+
+    def __init__(self, name):
+        self._shm = _attach_shared_memory(name)
+        buf = self._shm.buf
+        self._header = np.ndarray((), dtype=shared_frame_ring_header_dtype, buffer=buf)
+        if bytes(self._header["magic"]) != shared_frame_ring_magic \
+                or int(self._header["version"]) != shared_frame_ring_version:
+            self.close()
+            raise ValueError(f"Not a shared frame ring: {name}")
+        self.slot_count = int(self._header["slot_count"])
+        self.width = int(self._header["width"])
+        self.height = int(self._header["height"])
+        self._slot_headers, self._slots = _slot_views(buf, int(self._header["header_bytes"]), self.slot_count,
+            int(self._header["slot_header_bytes"]), self.height, self.width)
+
+    @property
+    def frames_written(self):
+        return int(self._header["frames_written"])
+
+    def view(self, frame_index=None):
+        """
+        Frame referencing the ring memory, or None if the frame is being written or has been overwritten
+
+        :param frame_index: Index of the frame to read, or None for the latest frame
+        """
+        if frame_index is None:
+            frame_index = self.frames_written - 1
+        if frame_index < 0 or frame_index >= self.frames_written:
+            return None
+        slot = frame_index % self.slot_count
+        slot_header = self._slot_headers[slot]
+        sequence = int(slot_header["sequence"])
+        if sequence & 1 or int(slot_header["frame_index"]) != frame_index:
+            return None
+        frame = SharedFrame(frame_index, int(slot_header["seqno"]), self._slots[slot],
+            shared_frame_ring_ir_formats[int(slot_header["ir_format"])],
+            float(slot_header["ts_seconds"]) + float(slot_header["ts_nanoseconds"]) * 1e-9, sequence)
+        if int(slot_header["sequence"]) != sequence:
+            return None
+        return frame
+
+    def valid(self, frame):
+        """True if a frame returned by view() has not been overwritten"""
+        return int(self._slot_headers[frame.frame_index % self.slot_count]["sequence"]) == frame._sequence
+
+    def read(self, frame_index=None, out=None):
+        """
+        Copy a frame out of the ring, or return None if the frame is being written or has been overwritten
+
+        :param frame_index: Index of the frame to read, or None for the latest frame
+        :param out: Optional preallocated uint16 array to copy the frame into
+        """
+        frame = self.view(frame_index)
+        if frame is None:
+            return None
+        if out is None:
+            out = np.empty(frame.mat.shape, dtype=np.uint16)
+        np.copyto(out, frame.mat)
+        if not self.valid(frame):
+            return None
+        frame.mat = out
+        return frame
+
+    def wait(self, frame_index, timeout=None, poll_interval=0.0005):
+        """Wait until the frame with frame_index has been published, returning False on timeout"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.frames_written <= frame_index:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def close(self):
+        self._header = None
+        self._slot_headers = None
+        self._slots = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Frames returned by view() are still referenced, the segment is unmapped when they are released
+            pass
+
+
+def _slot_views(buf, header_bytes, slot_count, slot_header_bytes, height, width):
+    slot_bytes = height * width * 2
+    slot_dtype = np.dtype([
+        ("header", shared_frame_ring_slot_header_dtype, (1,)),
+        ("data", "<u2", (height, width))
+    ])
+    assert slot_dtype.itemsize == slot_header_bytes + slot_bytes
+    slots = np.ndarray((slot_count,), dtype=slot_dtype, buffer=buf, offset=header_bytes)
+    return slots["header"][:, 0], slots["data"]
+
+
+def _attach_shared_memory(name):
+    assert shared_memory is not None, "Shared memory frame ring requires Python 3.8 or newer"
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        # Before Python 3.13 attaching registers the segment with the resource tracker, which unlinks it when
+        # this process exits even though the driver owns it. There is no resource tracker on Windows.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
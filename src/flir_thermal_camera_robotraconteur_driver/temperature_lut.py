@@ -0,0 +1,132 @@
+import threading
+import numpy as np
+
+temperature_output_formats = ["celsius_f32", "centicelsius_i16"]
+
+# Kelvin per raw count of the linear temperature formats
+_linear_ir_format_scales = {
+    "temperature_linear_10mK": 0.01,
+    "temperature_linear_100mK": 0.1
+}
+
+_centicelsius_i16_invalid = np.iinfo(np.int16).min
+
+
+class TemperatureLut(object):
+    """
+    Raw count to temperature lookup tables, one per ir_format
+
+    Each table has 65536 entries, so converting a frame is a single np.take() instead of per pixel floating
+    point arithmetic. Tables are built on first use and must be invalidated with invalidate() when the
+    ir_format or a radiometric parameter changes.
+
+    Output formats:
+
+    * ``celsius_f32`` - float32 degrees Celsius. Counts that do not map to a temperature are NaN.
+    * ``centicelsius_i16`` - int16 hundredths of a degree Celsius, saturating at -327.67 and 327.67 C.
+      Counts that do not map to a temperature are -32768.
+
+    Linear ir_formats are converted using their fixed scale. ``radiometric`` frames are converted with the
+    FLIR measurement formula, using the Planck constants and environment parameters returned by
+    read_radiometric_params(). If that returns None the camera does not provide calibration and no table
+    is built.
+    """
+
+    def __init__(self, read_radiometric_params, output_format="celsius_f32"):
+        self._read_radiometric_params = read_radiometric_params
+        self._lock = threading.Lock()
+        self._luts = dict()
+        self.output_format = output_format
+
+        self.built_count = 0
+
+    @property
+    def output_format(self):
+        return self._output_format
+
+    @output_format.setter
+    def output_format(self, value):
+        if value not in temperature_output_formats:
+            raise ValueError(f"Invalid temperature output format: {value}")
+        with self._lock:
+            self._output_format = value
+            self._luts.clear()
+
+    def invalidate(self):
+        with self._lock:
+            self._luts.clear()
+
+    def convert(self, mat, ir_format, out=None):
+        """
+        Convert a uint16 frame to temperature
+
+        :param out: Optional preallocated array of the output format dtype and the shape of mat to convert into
+        :return: Tuple of the converted frame, or None if ir_format cannot be converted, and the output format
+        """
+        with self._lock:
+            output_format = self._output_format
+            if ir_format in self._luts:
+                lut = self._luts[ir_format]
+            else:
+                lut = self._build(ir_format, output_format)
+                self._luts[ir_format] = lut
+                self.built_count += 1
+        if lut is None:
+            return None, output_format
+        return np.take(lut, mat, out=out), output_format
+
+    def stats(self):
+        with self._lock:
+            return {
+                "output_format": self._output_format,
+                "tables": len(self._luts),
+                "built": self.built_count
+            }
+
+    def _build(self, ir_format, output_format):
+        counts = np.arange(65536, dtype=np.float64)
+        scale = _linear_ir_format_scales.get(ir_format)
+        if scale is not None:
+            kelvin = counts * scale
+        elif ir_format == "radiometric":
+            params = self._read_radiometric_params()
+            if params is None:
+                return None
+            kelvin = _radiometric_counts_to_kelvin(counts, params)
+        else:
+            return None
+
+        celsius = kelvin - 273.15
+        if output_format == "celsius_f32":
+            return celsius.astype(np.float32)
+        valid = np.isfinite(celsius)
+        centicelsius = np.clip(np.round(np.where(valid, celsius, 0.0) * 100.0), -32767, 32767)
+        centicelsius[~valid] = _centicelsius_i16_invalid
+        return centicelsius.astype(np.int16)
+
+
+def _radiometric_counts_to_kelvin(counts, params):
+    # FLIR measurement formula. The object signal is the measured signal with the reflected, atmospheric and
+    # external optics contributions removed.
+    R = params["R"]
+    B = params["B"]
+    F = params["F"]
+    J0 = params.get("J0", 0.0)
+    J1 = params.get("J1", 1.0)
+    emissivity = params["object_emissivity"]
+    tau = params["estimated_transmission"]
+    optics_tau = params["ext_optics_transmission"]
+
+    def planck_signal(kelvin):
+        return R / (np.exp(B / kelvin) - F)
+
+    k2 = ((1 - emissivity) / emissivity) * planck_signal(params["reflected_temperature"]) \
+        + ((1 - tau) / (emissivity * tau)) * planck_signal(params["atmospheric_temperature"]) \
+        + ((1 - optics_tau) / (emissivity * tau * optics_tau)) * planck_signal(params["ext_optics_temperature"])
+
+    signal = (counts - J0) / J1
+    object_signal = signal / emissivity / tau / optics_tau - k2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kelvin = B / np.log(R / object_signal + F)
+    kelvin[~(object_signal > 0) | ~(kelvin > 0)] = np.nan
+    return kelvin
@@ -1,27 +1,38 @@
-import cv2
+import time
 import RobotRaconteur as RR
 RRN = RR.RobotRaconteurNode.s
-import RobotRaconteurCompanion as RRC
-import argparse
-import sys, copy
-import platform
+import copy, os
 import threading
 import numpy as np
-from RobotRaconteurCompanion.Util.InfoFileLoader import InfoFileLoader
 from RobotRaconteurCompanion.Util.DateTimeUtil import DateTimeUtil
 from RobotRaconteurCompanion.Util.SensorDataUtil import SensorDataUtil
-from RobotRaconteurCompanion.Util.AttributesUtil import AttributesUtil
-import struct
-import socket
 import re
-import time
 import weakref
-from contextlib import suppress
 import traceback
 
-import PySpin
-
-class _ImageEventHandler(PySpin.ImageEventHandler):
+# PySpin is only required for physical cameras, the replay backend runs without it
+try:
+    import PySpin
+except ImportError:
+    PySpin = None
+
+from .frame_pipeline import FramePipeline
+from .frame_codecs import PreviewEncoder, FrameCompressor, DeltaEncoderGroups
+from .frame_cache import EncodedFrameCache
+from .change_detector import FrameChangeDetector
+from .frame_buffers import FrameBufferPool
+from .frame_roi import RoiSettings, extract_roi
+from .temperature_lut import TemperatureLut
+from .frame_stats import FrameStatistics
+from .frame_aggregator import FrameAggregator
+from .frame_ring import PretriggerRingBuffer
+from .frame_recorder import FrameRecorder
+from .instrumentation import HotPathInstrumentation
+from .shared_frame_ring import SharedFrameRingWriter
+from .adaptive_quality import AdaptiveQualitySettings, AdaptiveQualityController, adaptive_frame_downsample, \
+    adaptive_preview_downsample, adaptive_preview_encoding
+
+class _ImageEventHandler(PySpin.ImageEventHandler if PySpin is not None else object):
     def __init__(self, parent):
         super().__init__()
 
@@ -32,12 +43,188 @@ class _ImageEventHandler(PySpin.ImageEventHandler):
         self.parent._image_received(image)
 
 
+class _CapturedFrame(object):
+    """A received frame stored in a pooled buffer. The buffer is reused once every reference is released"""
+    __slots__ = ["seqno", "mat", "ir_format", "data_header", "received_time", "_buffer"]
+
+    def __init__(self, seqno, buffer, ir_format, data_header, received_time):
+        self.seqno = seqno
+        self.mat = buffer.mat
+        self.ir_format = ir_format
+        self.data_header = data_header
+        self.received_time = received_time
+        self._buffer = buffer
+
+    def retain(self):
+        self._buffer.retain()
+        return self
+
+    def release(self):
+        self._buffer.release()
+
+
+class _PipeSubscribers(object):
+    """
+    Tracks the endpoints connected to a pipe and decides for each frame which of them receive it
+
+    An endpoint receives a frame when the frame seqno matches both the client isoch_downsample and the
+    downsample of the endpoint adaptive quality level, and the endpoint has fewer than max_backlog packets
+    in flight. Frames that no endpoint will receive are not encoded.
+    """
+
+    def __init__(self, pipe, get_client_downsample, adaptive_settings, level_downsample, max_backlog=2,
+        packet_failed=None):
+        self._get_client_downsample = get_client_downsample
+        self._adaptive_settings = adaptive_settings
+        self._level_downsample = level_downsample
+        self._max_backlog = max_backlog
+        self._packet_failed = packet_failed
+        self._lock = threading.Lock()
+        self._endpoints = dict()
+        self._closed_backlog_dropped_count = 0
+        self.encoded_count = 0
+        self.skipped_count = 0
+        pipe.PipeConnectCallback = self._connected
+
+    def _connected(self, pipe_ep):
+        ep = _UnicastPipeEndpoint(pipe_ep, self._max_backlog, self._adaptive_settings, self._packet_failed)
+        key = (pipe_ep.Endpoint, pipe_ep.Index)
+        with self._lock:
+            self._endpoints[key] = ep
+        pipe_ep.PipeEndpointClosedCallback = lambda _: self._remove(key)
+
+    def _remove(self, key):
+        with self._lock:
+            ep = self._endpoints.pop(key, None)
+            if ep is None:
+                return
+            self._closed_backlog_dropped_count += ep.backlog_dropped_count
+
+    @property
+    def client_count(self):
+        return len(self._endpoints)
+
+    def endpoints_for_frame(self, seqno):
+        """Reserve a packet for each endpoint that will receive the frame, and return the endpoints"""
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        ret = []
+        for ep in endpoints:
+            step = (self._get_client_downsample(ep.client_endpoint) + 1) * self._level_downsample(ep.level)
+            if seqno % step == 0 and ep.try_reserve():
+                ret.append(ep)
+        with self._lock:
+            if len(ret) > 0:
+                self.encoded_count += 1
+            else:
+                self.skipped_count += 1
+        return ret
+
+    def send_packet(self, endpoints, packet):
+        for ep in endpoints:
+            try:
+                ep.send_packet(packet)
+            except Exception:
+                # Endpoint closed while sending
+                self._remove((ep.pipe_ep.Endpoint, ep.pipe_ep.Index))
+
+    def cancel(self, endpoints):
+        """Release the reservations of endpoints that will not be sent the frame"""
+        for ep in endpoints:
+            ep.cancel_reservation()
+
+    def client_level(self, client_endpoint):
+        """Highest adaptive quality level of the endpoints of a client"""
+        with self._lock:
+            return max((ep.level for k, ep in self._endpoints.items() if k[0] == client_endpoint), default=0)
+
+    def stats(self):
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+            backlog_dropped_count = self._closed_backlog_dropped_count
+        return {
+            "clients": len(endpoints),
+            "degraded_clients": sum(1 for ep in endpoints if ep.level > 0),
+            "backlog_dropped": backlog_dropped_count + sum(ep.backlog_dropped_count for ep in endpoints),
+            "max_send_latency_us": max((ep.latency for ep in endpoints), default=0.0) * 1e6
+        }
+
+class _UnicastPipeEndpoint(object):
+    """
+    Server side pipe endpoint with a limit on packets in flight
+
+    A packet is reserved before the frame is encoded and is in flight until its send completes. The time from
+    sending a packet to its send completion and frames dropped because sent packets fill the backlog are fed
+    to an adaptive quality controller, which raises the quality level of clients that fall behind. Drops
+    caused by reservations still waiting for the encoder are not counted as congestion, since the delay is
+    on the server side.
+    If specified, packet_failed(endpoint) is called when a packet could not be sent.
+    """
+
+    def __init__(self, pipe_ep, max_backlog, adaptive_settings, packet_failed=None):
+        self.pipe_ep = pipe_ep
+        self.client_endpoint = pipe_ep.Endpoint
+        self._max_backlog = max_backlog
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._sending = 0
+        self._adaptive = AdaptiveQualityController(adaptive_settings)
+        self.backlog_dropped_count = 0
+        self._packet_failed = packet_failed
+
+    @property
+    def level(self):
+        return self._adaptive.level
+
+    @property
+    def latency(self):
+        return self._adaptive.latency
+
+    def try_reserve(self):
+        with self._lock:
+            if self._reserved + self._sending >= self._max_backlog:
+                self.backlog_dropped_count += 1
+                if self._sending >= self._max_backlog:
+                    self._adaptive.packet_dropped(time.monotonic())
+                return False
+            self._reserved += 1
+            return True
+
+    def cancel_reservation(self):
+        with self._lock:
+            self._reserved -= 1
+
+    def send_packet(self, packet):
+        send_time = time.monotonic()
+        with self._lock:
+            self._reserved -= 1
+            self._sending += 1
+        try:
+            self.pipe_ep.AsyncSendPacket(packet, lambda packet_number, err: self._packet_sent(send_time, err))
+        except Exception as e:
+            self._packet_sent(None, e)
+            raise
+
+    def _packet_sent(self, send_time, err):
+        now = time.monotonic()
+        with self._lock:
+            self._sending -= 1
+            if send_time is not None and err is None:
+                self._adaptive.packet_sent(now - send_time, now)
+        if err is not None and self._packet_failed is not None:
+            self._packet_failed(self)
+
 class ThermalCameraImpl(object):
     
-    def __init__(self, thermal_camera,camera_info):
+    def __init__(self, thermal_camera,camera_info, encoder_threads=2, frame_queue_size=2, frame_cache_size=8,
+        frame_cache_max_bytes=16*1024*1024, ring_buffer_max_bytes=0, recording_dir=None, stats_log_interval=0,
+        encoder_pool=None, shared_memory_slots=0):
         
         self._cam = thermal_camera
         self._nodemap = None
+        self._nodes = None
+        self._available_fps = dict()
+        self._params_lock = threading.RLock()
         self._fps = 0
 
         self._seqno = 0
@@ -49,42 +236,120 @@ class ThermalCameraImpl(object):
         self._compressed_image_type = RRN.GetStructureType('com.robotraconteur.image.CompressedImage')
         self._date_time_utc_type = RRN.GetPodDType('com.robotraconteur.datetime.DateTimeUTC')
         self._isoch_info = RRN.GetStructureType('com.robotraconteur.device.isoch.IsochInfo')
+        self._frame_statistics_type = RRN.GetStructureType('experimental.flir_thermal_camera.FrameStatistics')
+        self._region_statistics_type = RRN.GetStructureType('experimental.flir_thermal_camera.RegionStatistics')
+        self._trigger_capture_type = RRN.GetStructureType('experimental.flir_thermal_camera.TriggerCapture')
         self._capture_lock = threading.Lock()
+        # Notified when _current_frame is replaced, for capture_frame_next()
+        self._capture_cv = threading.Condition(self._capture_lock)
         self._settings_lock = threading.Lock()
         self._streaming = False
         self._camera_info = camera_info
         self._date_time_util = DateTimeUtil(RRN)
         self._sensor_data_util = SensorDataUtil(RRN)
         self._image_event_handler = None
-        self._current_image = None
+        self._current_frame = None
+        self._image_info_static = dict()
+        self._frame_buffer_pool = FrameBufferPool(encoder_threads + frame_queue_size + _ingest_queue_size + 4)
         self._wires_init = False
+        # Set to None so the service assigns plain pipes instead of broadcasters. Endpoints are tracked by
+        # _PipeSubscribers so backlog and quality are controlled per client.
+        self.frame_stream = None
+        self.frame_stream_compressed = None
+        self.preview_stream = None
+        self.temperature_stream = None
+        self.frame_stream_roi = None
+        self.frame_stream_mean = None
+        self.frame_stream_max = None
+        self.frame_stream_min = None
+        self._roi_lock = threading.Lock()
+        self._roi_settings = dict()
+        self._adaptive_quality = AdaptiveQualitySettings()
+        self._stream_lock = threading.Lock()
+        self._last_streamed_seqno = 0
+        # The consumers that need every frame in order run on a single ingest thread, so the acquisition callback
+        # only copies the frame and hands it off
+        self._ingest_pipeline = FramePipeline(self._consume_frame, 1, _ingest_queue_size, "thermal_camera_ingest",
+            _CapturedFrame.release)
+        self._frame_pipeline = FramePipeline(self._process_frame, encoder_threads, frame_queue_size, 
+            "thermal_camera_encoder", _CapturedFrame.release, encoder_pool)
+        self._preview_encoder = PreviewEncoder()
+        self._frame_compressor = FrameCompressor()
+        self._delta_encoders = DeltaEncoderGroups()
+        self._adaptive_delta_encoders = DeltaEncoderGroups()
+        self._change_detector = FrameChangeDetector()
+        self._temperature_lut = TemperatureLut(self._read_radiometric_params)
+        self._frame_statistics = FrameStatistics()
+        self._frame_aggregator = FrameAggregator()
+        # Packing and sending aggregated frames takes much longer than accumulating them, so it is done off the
+        # ingest thread
+        self._aggregate_pipeline = FramePipeline(self._send_aggregated_frame, 1, 2, "thermal_camera_aggregate",
+            pool=encoder_pool)
+        self._pretrigger_buffer = PretriggerRingBuffer(ring_buffer_max_bytes)
+        self._frame_recorder = FrameRecorder(recording_dir, release_frame=_CapturedFrame.release)
+        self._instrumentation = HotPathInstrumentation()
+        self._shared_frame_ring = SharedFrameRingWriter(shared_memory_slots)
+        self._stats_log_interval = stats_log_interval
+        self._stats_thread = None
+        self._stats_thread_stop = threading.Event()
+        self._delta_ir_format = None
+        self._frame_cache = EncodedFrameCache(frame_cache_size, frame_cache_max_bytes)
+        self._scale_limits = None
 
     def RRServiceObjectInit(self, ctx, service_path):
         self._downsampler = RR.BroadcastDownsampler(ctx)
-        self._downsampler.AddPipeBroadcaster(self.frame_stream)
-        self._downsampler.AddPipeBroadcaster(self.frame_stream_compressed)
-        self._downsampler.AddPipeBroadcaster(self.preview_stream)
         self._downsampler.AddWireBroadcaster(self.device_clock_now)
-        self.frame_stream.MaxBacklog = 2
-        self.frame_stream_compressed.MaxBacklog = 2
-        self.preview_stream.MaxBacklog = 2
+        ctx.AddServerServiceListener(self._service_listener)
+
+        # Pipe downsampling is applied by the subscriber trackers so frames are only encoded when a client
+        # will receive them
+        get_client_downsample = self._downsampler.GetClientDownsample
+        frame_downsample = lambda level: adaptive_frame_downsample[level]
+        self._frame_stream_subscribers = _PipeSubscribers(self.frame_stream, get_client_downsample,
+            self._adaptive_quality, frame_downsample)
+        self._frame_stream_compressed_subscribers = _PipeSubscribers(self.frame_stream_compressed,
+            get_client_downsample, self._adaptive_quality, frame_downsample,
+            packet_failed=self._compressed_packet_failed)
+        self._preview_stream_subscribers = _PipeSubscribers(self.preview_stream, get_client_downsample,
+            self._adaptive_quality, lambda level: adaptive_preview_downsample[level])
+        self._temperature_stream_subscribers = _PipeSubscribers(self.temperature_stream, get_client_downsample,
+            self._adaptive_quality, frame_downsample)
+        self._frame_stream_roi_subscribers = _PipeSubscribers(self.frame_stream_roi, get_client_downsample,
+            self._adaptive_quality, frame_downsample)
+        # Aggregated frames are already sent at a low rate, slow clients only drop windows when their backlog is full
+        aggregate_downsample = lambda level: 1
+        self._frame_stream_mean_subscribers = _PipeSubscribers(self.frame_stream_mean, get_client_downsample,
+            self._adaptive_quality, aggregate_downsample)
+        self._frame_stream_max_subscribers = _PipeSubscribers(self.frame_stream_max, get_client_downsample,
+            self._adaptive_quality, aggregate_downsample)
+        self._frame_stream_min_subscribers = _PipeSubscribers(self.frame_stream_min, get_client_downsample,
+            self._adaptive_quality, aggregate_downsample)
         
         # TODO: Broadcaster peek handler in Python
         self.device_clock_now.PeekInValueCallback = lambda ep: self._date_time_util.FillDeviceTime(self._camera_info.device_info,self._seqno)
         self._wires_init = True
 
+        self._stats_thread = threading.Thread(target=self._stats_threadfunc, name="thermal_camera_stats")
+        self._stats_thread.daemon = True
+        self._stats_thread.start()
+
     def _start(self):
         self._cam.Init()
-        self._nodemap = self._cam.GetNodeMap()
+        self._set_nodemap(self._cam.GetNodeMap())
         
-        fps = _get_fps(self._nodemap)
+        fps = _get_fps(self._nodes)
         if fps is not None:
             self._fps = fps
         else:
             print('Unable to retrieve frame rate')
 
-        ir_format_val = _gige_read_node_value(self._nodemap, "IRFormat")
+        ir_format_val = self._nodes.read("IRFormat")
         self._current_irformat = _ir_format_params_rev[ir_format_val]
+        self._update_scale_limits()
+
+        self._ingest_pipeline.start()
+        self._frame_pipeline.start()
+        self._aggregate_pipeline.start()
 
         self._image_event_handler = _ImageEventHandler(self)
         self._cam.RegisterEventHandler(self._image_event_handler)
@@ -92,6 +357,13 @@ class ThermalCameraImpl(object):
         self._cam.AcquisitionMode.SetValue(PySpin.AcquisitionMode_Continuous)
         self._cam.BeginAcquisition()
 
+    def _set_nodemap(self, nodemap):
+        # Resolve the parameter nodes and frame rates once so parameter access skips the node lookups
+        self._nodemap = nodemap
+        self._nodes = _GenICamNodes(nodemap)
+        self._nodes.resolve(_camera_node_names)
+        self._available_fps = dict(_get_available_fps(self._nodes))
+
     @property
     def device_info(self):
         return self._camera_info.device_info
@@ -100,63 +372,265 @@ class ThermalCameraImpl(object):
     def camera_info(self):
         return self._camera_info
 
-    def _cv_mat_to_image(self, mat):
+    def _new_image_info(self, width, height, ir_format, compression, data_header):
+        # The encoding, step and extended fields only change with the resolution, ir_format or compression,
+        # so they are built once and shared between frames
+        key = (width, height, ir_format, compression)
+        static_info = self._image_info_static.get(key)
+        if static_info is None:
+            extended = {
+                "ir_format": RR.VarValue(ir_format, "string")
+            }
+            if compression is None:
+                static_info = (self._image_consts["ImageEncoding"]["mono16"], width, extended)
+            else:
+                extended["compression"] = RR.VarValue(compression, "string")
+                static_info = (self._image_consts["ImageEncoding"]["compressed"], 0, extended)
+            self._image_info_static[key] = static_info
 
         image_info = self._image_info_type()
-        image_info.width =mat.shape[1]
-        image_info.height = mat.shape[0]
-        
-        image_info.step = mat.shape[1]
-        image_info.encoding = self._image_consts["ImageEncoding"]["mono16"]
-       
-        image_info.data_header = self._sensor_data_util.FillSensorDataHeader(self._camera_info.device_info,self._seqno)
-        image_info.extended = {
-            "ir_format": RR.VarValue(self._current_irformat, "string")
-        }
-        
+        image_info.width = width
+        image_info.height = height
+        image_info.encoding, image_info.step, image_info.extended = static_info
+        image_info.data_header = data_header
+        return image_info
+
+    def _cv_mat_to_image(self, mat, data_header = None, ir_format = None):
+        """
+        Pack mat into an Image without copying
+
+        image.data is a view of mat. The caller must keep mat unchanged until the view is released.
+        """
+        if data_header is None:
+            data_header = self._sensor_data_util.FillSensorDataHeader(self._camera_info.device_info,self._seqno)
+        if ir_format is None:
+            ir_format = self._current_irformat
 
         image = self._image_type()
-        image.image_info = image_info
-        image.data=mat.reshape(mat.size, order='C').tobytes()
+        image.image_info = self._new_image_info(mat.shape[1], mat.shape[0], ir_format, None, data_header)
+        image.data = np.ascontiguousarray(mat).reshape(-1).view(np.uint8)
+        return image
+
+    def _cv_mat_to_compressed_image(self, mat, data_header = None, ir_format = None):
+        if data_header is None:
+            data_header = self._sensor_data_util.FillSensorDataHeader(self._camera_info.device_info,self._seqno)
+        if ir_format is None:
+            ir_format = self._current_irformat
+
+        # jpg can't handle 16 bit images, use a lossless 16-bit compression instead
+        encimg, compression = self._frame_compressor.encode(mat)
+
+        image = self._compressed_image_type()
+        image.image_info = self._new_image_info(mat.shape[1], mat.shape[0], ir_format, compression, data_header)
+        image.data=encimg
         return image
 
-    def _cv_mat_to_compressed_image(self, mat, quality = 100):
+    def _cv_mat_to_preview_image(self, mat, ir_format, data_header, downscale=None, quality=None):
+
+        encimg, preview_shape, preview_range = self._preview_encoder.encode(mat, ir_format, self._scale_limits,
+            downscale, quality)
 
         image_info = self._image_info_type()
-        image_info.width =mat.shape[1]
-        image_info.height = mat.shape[0]
-        
+        image_info.width = preview_shape[1]
+        image_info.height = preview_shape[0]
+
         image_info.step = 0
         image_info.encoding = self._image_consts["ImageEncoding"]["compressed"]
-        image_info.data_header = self._sensor_data_util.FillSensorDataHeader(self._camera_info.device_info,self._seqno)
+        image_info.data_header = data_header
         image_info.extended = {
-            "ir_format": RR.VarValue(self._current_irformat, "string")
+            "ir_format": RR.VarValue(ir_format, "string"),
+            "preview_range_low": RR.VarValue(preview_range[0], "double"),
+            "preview_range_high": RR.VarValue(preview_range[1], "double")
         }
-        
+
         image = self._compressed_image_type()
         image.image_info = image_info
-        # jpg can't handle 16 bit images, use png instead
-        res, encimg = cv2.imencode(".png",mat)
-        assert res, "Could not compress frame!"
         image.data=encimg
         return image
 
-    def capture_frame(self):
+    def _cv_mat_to_temperature_image(self, mat, ir_format, data_header):
+        temperature_mat, output_format = self._temperature_lut.convert(mat, ir_format)
+        if temperature_mat is None:
+            return None
+
+        image_info = self._image_info_type()
+        image_info.width = mat.shape[1]
+        image_info.height = mat.shape[0]
+        if output_format == "celsius_f32":
+            image_info.encoding = self._image_consts["ImageEncoding"]["mono_f32"]
+            image_info.step = mat.shape[1] * 4
+            temperature_unit = "celsius"
+        else:
+            image_info.encoding = self._image_consts["ImageEncoding"]["depth_i16"]
+            image_info.step = mat.shape[1] * 2
+            temperature_unit = "centicelsius"
+        image_info.data_header = data_header
+        image_info.extended = {
+            "ir_format": RR.VarValue(ir_format, "string"),
+            "temperature_unit": RR.VarValue(temperature_unit, "string")
+        }
+
+        image = self._image_type()
+        image.image_info = image_info
+        image.data = temperature_mat.reshape(-1).view(np.uint8)
+        return image
+
+    def _frame_to_statistics(self, frame):
+        histogram_shift, regions = self._frame_statistics.compute(frame.mat)
+
+        frame_statistics = self._frame_statistics_type()
+        frame_statistics.data_header = frame.data_header
+        frame_statistics.ir_format = frame.ir_format
+        frame_statistics.histogram_shift = histogram_shift
+        frame_statistics.regions = []
+        for name, roi, region in regions:
+            region_statistics = self._region_statistics_type()
+            region_statistics.name = name
+            region_statistics.roi = np.array(roi, dtype=np.int32)
+            region_statistics.min = region["min"]
+            region_statistics.max = region["max"]
+            region_statistics.mean = region["mean"]
+            region_statistics.std = region["std"]
+            region_statistics.max_x = region["max_x"]
+            region_statistics.max_y = region["max_y"]
+            region_statistics.histogram = region["histogram"]
+            frame_statistics.regions.append(region_statistics)
+        return frame_statistics
+
+    def _read_radiometric_params(self):
+        # Cameras that convert to temperature on the camera, such as the A320, do not provide the Planck
+        # constants
+        params = dict()
+        for node_name in ("R", "B", "F"):
+            node_value = self._nodes.read(node_name)
+            if node_value is None:
+                return None
+            params[node_name] = float(node_value)
+        for node_name in ("J0", "J1"):
+            node_value = self._nodes.read(node_name)
+            if node_value is not None:
+                params[node_name] = float(node_value)
+        for param_name in ("object_emissivity", "reflected_temperature", "atmospheric_temperature",
+                "estimated_transmission", "ext_optics_temperature", "ext_optics_transmission"):
+            node_value = self._nodes.read(_normal_params[param_name][0])
+            if node_value is None:
+                return None
+            params[param_name] = float(node_value)
+        return params
+
+    def _update_scale_limits(self):
+        scale_limit_low = self._nodes.read("ScaleLimitLow")
+        scale_limit_upper = self._nodes.read("ScaleLimitUpper")
+        if scale_limit_low is None or scale_limit_upper is None:
+            self._scale_limits = None
+        else:
+            self._scale_limits = (scale_limit_low, scale_limit_upper)
+
+    def _frame_to_image(self, frame):
+        # Raw images are not cached since they are a view of the frame buffer and cost nothing to build.
+        # The frame is kept alive until the Robot Raconteur layer has released the view.
+        image = self._cv_mat_to_image(frame.mat, frame.data_header, frame.ir_format)
+        weakref.finalize(image.data, frame.retain().release)
+        return image
+
+    def _frame_to_compressed_image(self, frame):
+        return self._frame_cache.get_or_encode(frame.seqno, self._frame_compressor.cache_key,
+            lambda: self._cv_mat_to_compressed_image(frame.mat, frame.data_header, frame.ir_format), _image_nbytes)
+
+    def _retain_current_frame(self):
         with self._capture_lock:
-            mat = self._current_image
-            if mat is None:
+            frame = self._current_frame
+            if frame is None:
                 raise RR.OperationFailedException("Could not read from camera")
-        return self._cv_mat_to_image(mat)
+            return frame.retain()
 
-    def capture_frame_compressed(self):
+    def _retain_next_frame(self, after_seqno, timeout):
+        after_seqno = int(after_seqno)
+        timeout = float(timeout)
+        if not (0 <= timeout <= _capture_next_max_timeout):
+            raise RR.InvalidArgumentException(f"Timeout must be between 0 and {_capture_next_max_timeout} seconds")
         with self._capture_lock:
-            mat = self._current_image
-            if mat is None:
-                raise RRN.OperationFailedException("Could not read from camera")
-        return self._cv_mat_to_compressed_image(mat)
+            if not self._capture_cv.wait_for(lambda: self._current_frame is not None 
+                    and self._current_frame.seqno > after_seqno, timeout):
+                self._instrumentation.count("capture_next_timeouts")
+                raise RR.OperationTimeoutException(f"No frame after seqno {after_seqno} within {timeout} seconds")
+            return self._current_frame.retain()
+
+    def capture_frame(self):
+        frame = self._retain_current_frame()
+        try:
+            return self._frame_to_image(frame)
+        finally:
+            frame.release()
+
+    def capture_frame_compressed(self):
+        frame = self._retain_current_frame()
+        try:
+            return self._frame_to_compressed_image(frame)
+        finally:
+            frame.release()
+
+    def capture_frame_next(self, after_seqno, timeout):
+        frame = self._retain_next_frame(after_seqno, timeout)
+        try:
+            return self._frame_to_image(frame)
+        finally:
+            frame.release()
+
+    def capture_frame_compressed_next(self, after_seqno, timeout):
+        # Callers woken by the same frame share one encode through the frame cache
+        frame = self._retain_next_frame(after_seqno, timeout)
+        try:
+            return self._frame_to_compressed_image(frame)
+        finally:
+            frame.release()
 
     def trigger(self):
-        raise RR.NotImplementedException("Not available on this device")
+        if not self._pretrigger_buffer.enabled:
+            raise RR.NotImplementedException("Pre-trigger ring buffer is disabled")
+        try:
+            # The capture is released if the triggering client disconnects without releasing it
+            self._pretrigger_buffer.trigger(self._seqno, time.monotonic(), RR.ServerEndpoint.GetCurrentEndpoint())
+        except ValueError as e:
+            raise RR.InvalidOperationException(str(e))
+
+    def _get_trigger_capture(self, index, count):
+        # Captures are returned in chunks that fit in one message
+        try:
+            return self._pretrigger_buffer.get_capture(self._pretrigger_buffer.post_seconds + 5, int(index),
+                int(count), _trigger_capture_max_bytes)
+        except ValueError as e:
+            raise RR.InvalidOperationException(str(e))
+
+    def capture_trigger_frames(self, index, count):
+        _, _, frames, seqnos, timestamps, ir_formats, data_headers = self._get_trigger_capture(index, count)
+        # The images are views of the frame stack copied out of the ring buffer
+        return [self._cv_mat_to_image(frames[i], data_headers[i], ir_formats[i]) for i in range(len(seqnos))]
+
+    def capture_trigger_stack(self, index, count):
+        trigger_seqno, frame_count, frames, seqnos, timestamps, ir_formats, data_headers = \
+            self._get_trigger_capture(index, count)
+        trigger_capture = self._trigger_capture_type()
+        trigger_capture.trigger_seqno = trigger_seqno
+        trigger_capture.frame_count = frame_count
+        trigger_capture.first_index = index
+        trigger_capture.seqno = seqnos
+        trigger_capture.time_from_trigger = timestamps
+        trigger_capture.ir_format = ir_formats
+        trigger_capture.frames = frames
+        return trigger_capture
+
+    def release_trigger_capture(self):
+        self._pretrigger_buffer.release()
+
+    def start_recording(self, name):
+        try:
+            return self._frame_recorder.start(name)
+        except ValueError as e:
+            raise RR.InvalidOperationException(str(e))
+
+    def stop_recording(self):
+        self._frame_recorder.stop()
 
     def start_streaming(self):
         with self._settings_lock:
@@ -191,11 +665,18 @@ class ThermalCameraImpl(object):
 
     @property
     def capabilities(self):
+        if self._pretrigger_buffer.enabled:
+            return 0x1 | 0x2 | 0x4 | 0x10
         return 0x1 | 0x2 | 0x4
 
     def _close(self):
 
         self._cam.EndAcquisition()
+        self._ingest_pipeline.stop()
+        self._frame_pipeline.stop()
+        self._aggregate_pipeline.stop()
+        self._frame_recorder.stop()
+        self._shared_frame_ring.close()
 
         if self._streaming:
             self._streaming = False
@@ -209,72 +690,551 @@ class ThermalCameraImpl(object):
 
     def _close_rr(self):
         self._wires_init = False
+        self._stats_thread_stop.set()
 
     def _image_received(self, image):
         try:
-            self._seqno+=1
-            
-            device_now = self._date_time_util.FillDeviceTime(self._camera_info.device_info,self._seqno)
-            if self._wires_init:
-                self.device_clock_now.OutValue = device_now
+            self._begin_frame()
 
             if image.IsIncomplete():
                 # Deal with trailing buffer bug on ThermoVision A320
                 if image.GetImageStatus() != 5:
+                    self._instrumentation.count("incomplete_frames")
                     print('Image incomplete with image status %d...' % image.GetImageStatus())
                     return
+                self._instrumentation.count("trailing_buffer_frames")
 
-            image2 = image.Convert(PySpin.PixelFormat_Mono16)
-            mat = image2.GetNDArray()
-            self._current_image = mat
+            # Copy the frame once into a pooled buffer, only converting if the camera is not already
+            # sending Mono16
+            t0 = time.perf_counter()
+            if image.GetPixelFormat() == PySpin.PixelFormat_Mono16:
+                src_mat = image.GetNDArray()
+            else:
+                src_mat = image.Convert(PySpin.PixelFormat_Mono16).GetNDArray()
+            self._instrumentation.record("convert", time.perf_counter() - t0)
+            self._ingest_frame(src_mat)
 
+        except Exception:
+            self._instrumentation.count("callback_errors")
+            traceback.print_exc()
+
+    def _begin_frame(self):
+        self._seqno+=1
+        
+        device_now = self._date_time_util.FillDeviceTime(self._camera_info.device_info,self._seqno)
+        if self._wires_init:
+            self.device_clock_now.OutValue = device_now
+
+    def _ingest_frame(self, src_mat):
+        """Store a received uint16 frame and hand it to the ingest thread"""
+        t0 = time.perf_counter()
+        frame_buffer = self._frame_buffer_pool.acquire(src_mat.shape)
+        np.copyto(frame_buffer.mat, src_mat)
+        self._instrumentation.record("copy", time.perf_counter() - t0)
+
+        data_header = self._sensor_data_util.FillSensorDataHeader(self._camera_info.device_info,self._seqno)
+        # The initial buffer reference is owned by _current_frame
+        frame = _CapturedFrame(self._seqno, frame_buffer, self._current_irformat, data_header, time.monotonic())
+        with self._capture_lock:
+            prev_frame = self._current_frame
+            self._current_frame = frame
+            self._capture_cv.notify_all()
+        if prev_frame is not None:
+            prev_frame.release()
+
+        if not self._ingest_pipeline.submit(frame.retain()):
+            frame.release()
+
+    def _consume_frame(self, frame):
+        """Hand a frame to the ring buffer, recorder and streams, in acquisition order on the ingest thread"""
+        mat = frame.mat
+        if self._pretrigger_buffer.enabled:
+            self._pretrigger_buffer.push(frame.seqno, mat, frame.ir_format, frame.data_header, frame.received_time)
+
+        # Recorded frames are written by the recorder I/O thread
+        if self._frame_recorder.recording:
+            if not self._frame_recorder.submit(frame.retain()):
+                frame.release()
+
+        # Encoding is done by the frame pipeline workers so the ingest thread is not held up.
+        # IR static frames are not streamed.
+        if self._streaming and self._wires_init:
+            t0 = time.perf_counter()
+            changed = self._change_detector.is_changed(mat)
+            self._instrumentation.record("change_detect", time.perf_counter() - t0)
+            if changed and not self._frame_pipeline.submit(frame.retain()):
+                frame.release()
+
+        # Aggregates must include every frame, so they are accumulated here instead of by the frame pipeline,
+        # which drops frames when it falls behind and skips static frames
+        if self._streaming and self._wires_init and self._aggregate_streams_connected():
+            t0 = time.perf_counter()
+            aggregated_frame = self._frame_aggregator.add(mat, frame.ir_format, frame.seqno, frame.data_header)
+            if aggregated_frame is not None:
+                self._aggregate_pipeline.submit(aggregated_frame)
+            self._instrumentation.record("aggregate", time.perf_counter() - t0)
+        else:
+            self._frame_aggregator.reset()
+
+        # Published last so a shared memory failure does not hold back the streams
+        if self._shared_frame_ring.enabled:
+            t0 = time.perf_counter()
+            ts = frame.data_header.ts[0]
+            self._shared_frame_ring.write(frame.seqno, mat, frame.ir_format, ts["seconds"], ts["nanoseconds"])
+            self._instrumentation.record("shared_memory", time.perf_counter() - t0)
+
+    def _process_frame(self, frame):
+        if not (self._streaming and self._wires_init):
+            return
+
+        record = self._instrumentation.record
+        t_start = time.perf_counter()
+        mat = frame.mat
+        seqno = frame.seqno
+        # Reserved endpoints are released in the finally clause unless they were sent the frame, so a failed
+        # stage or an out of order frame does not leave packets in flight that will never complete
+        reserved = []
+        sent = set()
+        # Each entry is a list of reserved endpoints and the packet they are sent
+        sends = []
+        try:
+            image_endpoints = self._frame_stream_subscribers.endpoints_for_frame(seqno)
+            if len(image_endpoints) > 0:
+                reserved.append((self._frame_stream_subscribers, image_endpoints))
+                t0 = time.perf_counter()
+                sends.append((self._frame_stream_subscribers, image_endpoints, self._frame_to_image(frame)))
+                record("raw_pack", time.perf_counter() - t0)
+            compressed_endpoints = self._frame_stream_compressed_subscribers.endpoints_for_frame(seqno)
+            standalone_endpoints, delta_encoders, delta_endpoints = [], None, []
+            if len(compressed_endpoints) > 0:
+                reserved.append((self._frame_stream_compressed_subscribers, compressed_endpoints))
+                standalone_endpoints, delta_encoders, delta_endpoints = \
+                    self._split_compressed_endpoints(compressed_endpoints)
+                if len(standalone_endpoints) > 0:
+                    t0 = time.perf_counter()
+                    sends.append((self._frame_stream_compressed_subscribers, standalone_endpoints, 
+                        self._frame_to_compressed_image(frame)))
+                    record("compress", time.perf_counter() - t0)
+            preview_endpoints = self._preview_stream_subscribers.endpoints_for_frame(seqno)
+            if len(preview_endpoints) > 0:
+                reserved.append((self._preview_stream_subscribers, preview_endpoints))
+                t0 = time.perf_counter()
+                # Clients at adaptive quality levels with the same preview encoding share one image
+                preview_variants = dict()
+                for ep in preview_endpoints:
+                    variant = adaptive_preview_encoding(ep.level, self._preview_encoder.downscale, 
+                        self._preview_encoder.quality)
+                    preview_variants.setdefault(variant, []).append(ep)
+                for (downscale, quality), endpoints in preview_variants.items():
+                    sends.append((self._preview_stream_subscribers, endpoints, 
+                        self._cv_mat_to_preview_image(mat, frame.ir_format, frame.data_header, downscale, quality)))
+                record("preview", time.perf_counter() - t0)
+            frame_statistics = None
+            if self.frame_statistics.ActiveWireConnectionCount > 0:
+                t0 = time.perf_counter()
+                frame_statistics = self._frame_to_statistics(frame)
+                record("statistics", time.perf_counter() - t0)
+            temperature_endpoints = self._temperature_stream_subscribers.endpoints_for_frame(seqno)
+            if len(temperature_endpoints) > 0:
+                reserved.append((self._temperature_stream_subscribers, temperature_endpoints))
+                t0 = time.perf_counter()
+                temperature_image = self._cv_mat_to_temperature_image(mat, frame.ir_format, frame.data_header)
+                if temperature_image is not None:
+                    sends.append((self._temperature_stream_subscribers, temperature_endpoints, temperature_image))
+                record("temperature", time.perf_counter() - t0)
+            roi_endpoints = self._frame_stream_roi_subscribers.endpoints_for_frame(seqno)
+            if len(roi_endpoints) > 0:
+                reserved.append((self._frame_stream_roi_subscribers, roi_endpoints))
+                t0 = time.perf_counter()
+                sends.extend(self._frame_to_roi_images(frame, roi_endpoints))
+                record("roi", time.perf_counter() - t0)
+
+            with self._stream_lock:
+                # Workers may finish out of order, never send a frame older than one already sent
+                if seqno <= self._last_streamed_seqno:
+                    self._instrumentation.count("out_of_order_frames")
+                    return
+                self._last_streamed_seqno = seqno
+                for ep in standalone_endpoints:
+                    self._delta_encoders.discard(ep)
+                    self._adaptive_delta_encoders.discard(ep)
+                delta_sends = []
+                if len(delta_endpoints) > 0:
+                    # Delta frames depend on the last frame sent to each client, so they are encoded in send order
+                    t0 = time.perf_counter()
+                    if frame.ir_format != self._delta_ir_format:
+                        self._delta_encoders.reset()
+                        self._adaptive_delta_encoders.reset()
+                        self._delta_ir_format = frame.ir_format
+                    for delta_encoder, endpoints in delta_encoders.group(delta_endpoints, mat):
+                        sends.append((self._frame_stream_compressed_subscribers, endpoints,
+                            self._frame_to_delta_compressed_image(frame, delta_encoder)))
+                        delta_sends.append((delta_encoder, endpoints))
+                    record("delta_compress", time.perf_counter() - t0)
+                # Recorded before sending, since a failed send discards the client reference
+                for delta_encoder, endpoints in delta_sends:
+                    delta_encoders.sent(delta_encoder, endpoints)
+                t0 = time.perf_counter()
+                for subscribers, endpoints, packet in sends:
+                    # send_packet() completes the reservations even if sending fails
+                    sent.update(endpoints)
+                    subscribers.send_packet(endpoints, packet)
+                if frame_statistics is not None:
+                    self.frame_statistics.OutValue = frame_statistics
+                t_end = time.perf_counter()
+                record("send", t_end - t0)
+            record("process_frame", t_end - t_start)
+        finally:
+            for subscribers, endpoints in reserved:
+                subscribers.cancel([ep for ep in endpoints if ep not in sent])
+
+    def _aggregate_streams_connected(self):
+        return self._frame_stream_mean_subscribers.client_count > 0 \
+            or self._frame_stream_max_subscribers.client_count > 0 \
+            or self._frame_stream_min_subscribers.client_count > 0
+
+    def _send_aggregated_frame(self, aggregated_frame):
+        if not (self._streaming and self._wires_init):
+            return
+        # isoch_downsample applies to windows rather than frames
+        for aggregate, subscribers, mat in (
+                ("mean", self._frame_stream_mean_subscribers, aggregated_frame.mean),
+                ("max", self._frame_stream_max_subscribers, aggregated_frame.max),
+                ("min", self._frame_stream_min_subscribers, aggregated_frame.min)):
+            endpoints = subscribers.endpoints_for_frame(aggregated_frame.window_index)
+            if len(endpoints) == 0:
+                continue
+            # Release the reservations if packing fails, send_packet() completes them otherwise
+            sent = False
             try:
-                self._prev_image
-            except:
-                self._prev_image = np.zeros_like(mat)
-
-            if self._streaming and self._wires_init and not (self._current_image==self._prev_image).all():
-                self.frame_stream.AsyncSendPacket(self._cv_mat_to_image(mat),lambda: None)
-                self.frame_stream_compressed.AsyncSendPacket(self._cv_mat_to_compressed_image(mat),lambda: None)
-                self.preview_stream.AsyncSendPacket(self._cv_mat_to_compressed_image(mat,70),lambda: None)
-            
-            #IR static frame thrown
-            self._prev_image = copy.deepcopy(mat)
+                subscribers.send_packet(endpoints, self._aggregated_frame_to_image(aggregated_frame, aggregate, mat))
+                sent = True
+            finally:
+                if not sent:
+                    subscribers.cancel(endpoints)
+
+    def _aggregated_frame_to_image(self, aggregated_frame, aggregate, mat):
+        image = self._cv_mat_to_image(mat, aggregated_frame.data_header, aggregated_frame.ir_format)
+        # The shared extended map must not be modified
+        extended = dict(image.image_info.extended)
+        extended["aggregate"] = RR.VarValue(aggregate, "string")
+        extended["aggregate_frame_count"] = RR.VarValue(aggregated_frame.frame_count, "uint32")
+        extended["aggregate_first_seqno"] = RR.VarValue(aggregated_frame.first_seqno, "uint64")
+        image.image_info.extended = extended
+        return image
 
-        except Exception as e:
-            traceback.print_exc()
+    def _split_compressed_endpoints(self, compressed_endpoints):
+        """
+        Split frame_stream_compressed endpoints into those sent standalone frames and those sent delta frames
+
+        :return: Tuple of the standalone endpoints, the delta encoders, and the delta endpoints
+        """
+        if self._delta_encoders.enabled:
+            return [], self._delta_encoders, compressed_endpoints
+        adaptive_keyframe_interval = self._adaptive_quality.delta_keyframe_interval
+        if adaptive_keyframe_interval == 0:
+            return compressed_endpoints, None, []
+        # Only clients above level 0 are switched to delta frames, the others keep receiving standalone frames.
+        # Residuals reference the last frame sent to each client, so frames skipped at the lower frame rate of
+        # the level or dropped from a full backlog do not break decoding.
+        self._adaptive_delta_encoders.keyframe_interval = adaptive_keyframe_interval
+        standalone_endpoints = []
+        delta_endpoints = []
+        for ep in compressed_endpoints:
+            (delta_endpoints if ep.level > 0 else standalone_endpoints).append(ep)
+        return standalone_endpoints, self._adaptive_delta_encoders, delta_endpoints
+
+    def _instrumentation_stats(self):
+        ret = self._instrumentation.stats()
+        ingest_pipeline_stats = self._ingest_pipeline.stats()
+        ret["ingest_dropped_frames"] = ingest_pipeline_stats["dropped"]
+        ret["ingest_errors"] = ingest_pipeline_stats["errors"]
+        frame_pipeline_stats = self._frame_pipeline.stats()
+        ret["queue_dropped_frames"] = frame_pipeline_stats["dropped"]
+        ret["encode_errors"] = frame_pipeline_stats["errors"]
+        ret["suppressed_static_frames"] = self._change_detector.stats()["suppressed"]
+        ret["backlog_dropped_frames"] = 0
+        ret["degraded_clients"] = 0
+        if self._wires_init:
+            for _, subscribers in self._pipe_subscribers():
+                subscribers_stats = subscribers.stats()
+                ret["backlog_dropped_frames"] += subscribers_stats["backlog_dropped"]
+                ret["degraded_clients"] += subscribers_stats["degraded_clients"]
+        ret["recorder_dropped_frames"] = self._frame_recorder.stats()["dropped"]
+        return ret
+
+    def _stats_threadfunc(self):
+        camera_state_type = RRN.GetStructureType('com.robotraconteur.imaging.CameraState')
+        state_flags = self._imaging_consts["CameraStateFlags"]
+        last_log = time.perf_counter()
+        last_problem_count = 0
+        while not self._stats_thread_stop.wait(1.0):
+            try:
+                stats = self._instrumentation_stats()
+                # Warn if frames were lost since the last update
+                problem_count = sum(stats.get(k, 0) for k in ("incomplete_frames", "callback_errors", 
+                    "ingest_dropped_frames", "ingest_errors", "queue_dropped_frames", "encode_errors", "backlog_dropped_frames", "recorder_dropped_frames"))
+                camera_state = camera_state_type()
+                camera_state.ts = self._date_time_util.TimeSpec3Now()
+                camera_state.seqno = self._seqno
+                camera_state.state_flags = state_flags["ready"]
+                if self._streaming:
+                    camera_state.state_flags |= state_flags["streaming"]
+                if problem_count > last_problem_count:
+                    camera_state.state_flags |= state_flags["warning"]
+                last_problem_count = problem_count
+                camera_state.extended = _stats_to_varvalue(stats).data
+                if self._wires_init:
+                    self.camera_state.OutValue = camera_state
+
+                if self._stats_log_interval > 0 and time.perf_counter() - last_log >= self._stats_log_interval:
+                    last_log = time.perf_counter()
+                    print(f"seqno {self._seqno}, {self._instrumentation.summary()}, "
+                        f"queue_dropped_frames {stats['queue_dropped_frames']}, "
+                        f"suppressed_static_frames {stats['suppressed_static_frames']}")
+            except Exception:
+                traceback.print_exc()
+
+    def _service_listener(self, ctx, event_code, client_endpoint):
+        # ROI settings belong to the client session, so they survive reconnecting to frame_stream_roi
+        if event_code == RR.ServerServiceListenerEventType_ClientDisconnected:
+            with self._roi_lock:
+                self._roi_settings.pop(client_endpoint, None)
+            # A capture is never left frozen by a client that is gone
+            self._pretrigger_buffer.release(client_endpoint)
+
+    def _frame_to_roi_images(self, frame, roi_endpoints):
+        with self._roi_lock:
+            roi_settings = dict(self._roi_settings)
+
+        # Clients requesting the same region share one image
+        endpoints_by_key = dict()
+        settings_by_key = dict()
+        default_settings = RoiSettings()
+        for roi_ep in roi_endpoints:
+            settings = roi_settings.get(roi_ep.client_endpoint, default_settings)
+            endpoints_by_key.setdefault(settings.key, []).append(roi_ep)
+            settings_by_key[settings.key] = settings
+        ret = []
+        for key, endpoints in endpoints_by_key.items():
+            roi_image = self._cv_mat_to_roi_image(frame, settings_by_key[key])
+            # Endpoints without an image are released by _process_frame()
+            if roi_image is not None:
+                ret.append((self._frame_stream_roi_subscribers, endpoints, roi_image))
+        return ret
+
+    def _cv_mat_to_roi_image(self, frame, settings):
+        roi_mat, roi_origin = extract_roi(frame.mat, settings)
+        if roi_mat is None:
+            return None
+        image = self._cv_mat_to_image(roi_mat, frame.data_header, frame.ir_format)
+        image_info = image.image_info
+        image_info.extended = dict(image_info.extended)
+        image_info.extended["roi_x"] = RR.VarValue(roi_origin[0], "int32")
+        image_info.extended["roi_y"] = RR.VarValue(roi_origin[1], "int32")
+        image_info.extended["roi_decimation"] = RR.VarValue(settings.decimation, "int32")
+        image_info.extended["roi_decimation_mode"] = RR.VarValue(settings.decimation_mode, "string")
+        return image
+
+    def _compressed_packet_failed(self, ep):
+        # The client did not receive the frame, so it cannot be used as a delta reference
+        self._delta_encoders.discard(ep)
+        self._adaptive_delta_encoders.discard(ep)
+
+    def _frame_to_delta_compressed_image(self, frame, delta_encoder):
+        if delta_encoder.needs_keyframe(frame.mat):
+            keyframe = self._frame_to_compressed_image(frame)
+            delta_encoder.set_keyframe(frame.seqno, frame.mat)
+            # The cached keyframe is shared with capture_frame_compressed, so copy before tagging it
+            image_info = copy.copy(keyframe.image_info)
+            image_info.extended = dict(keyframe.image_info.extended)
+            image_info.extended["delta_frame_type"] = RR.VarValue("key", "string")
+            image = self._compressed_image_type()
+            image.image_info = image_info
+            image.data = keyframe.data
+            return image
+
+        data, compression, reference_seqno = delta_encoder.encode_delta(frame.seqno, frame.mat)
+
+        image_info = self._image_info_type()
+        image_info.width = frame.mat.shape[1]
+        image_info.height = frame.mat.shape[0]
+        image_info.step = 0
+        image_info.encoding = self._image_consts["ImageEncoding"]["compressed"]
+        image_info.data_header = frame.data_header
+        image_info.extended = {
+            "ir_format": RR.VarValue(frame.ir_format, "string"),
+            "compression": RR.VarValue(compression, "string"),
+            "delta_frame_type": RR.VarValue("delta", "string"),
+            "delta_reference_seqno": RR.VarValue(reference_seqno, "uint64")
+        }
+
+        image = self._compressed_image_type()
+        image.image_info = image_info
+        image.data = data
+        return image
+
+    def _stream_stats(self):
+        ret = {}
+        for name, subscribers in self._pipe_subscribers():
+            ret[name + "_encoded"] = subscribers.encoded_count
+            ret[name + "_skipped"] = subscribers.skipped_count
+            for k, v in subscribers.stats().items():
+                ret[name + "_" + k] = v
+        return ret
+
+    def _aggregate_stats(self):
+        ret = self._frame_aggregator.stats()
+        aggregate_pipeline_stats = self._aggregate_pipeline.stats()
+        ret["send_dropped"] = aggregate_pipeline_stats["dropped"]
+        ret["send_errors"] = aggregate_pipeline_stats["errors"]
+        return ret
+
+    def _pipe_subscribers(self):
+        return (("frame_stream", self._frame_stream_subscribers),
+            ("frame_stream_compressed", self._frame_stream_compressed_subscribers),
+            ("preview_stream", self._preview_stream_subscribers),
+            ("temperature_stream", self._temperature_stream_subscribers),
+            ("frame_stream_roi", self._frame_stream_roi_subscribers),
+            ("frame_stream_mean", self._frame_stream_mean_subscribers),
+            ("frame_stream_max", self._frame_stream_max_subscribers),
+            ("frame_stream_min", self._frame_stream_min_subscribers))
+
+    def _apply_driver_settings(self, driver_settings):
+        """Apply encoder settings from the driver_settings section of the config file"""
+        for param_name, param_value in driver_settings.items():
+            if param_name == "statistics_rois":
+                self._frame_statistics.rois = param_value
+                continue
+            _encoder_param = _encoder_params.get(param_name)
+            assert _encoder_param is not None, f"Invalid driver setting: {param_name}"
+            setattr(getattr(self, _encoder_param[0]), _encoder_param[1], param_value)
 
     def getf_param(self, param_name):
 
         _normal_param = _normal_params.get(param_name)
         if _normal_param is not None:
-            return RR.VarValue(_gige_read_node_value(self._nodemap, _normal_param[0]), _normal_param[1])
+            return RR.VarValue(self._nodes.read(_normal_param[0]), _normal_param[1])
 
         if param_name == "fps":
-            return RR.VarValue(_get_fps(self._nodemap), "double")
+            return RR.VarValue(_get_fps(self._nodes), "double")
 
         if param_name == "ir_format":
-            ir_format_val = _gige_read_node_value(self._nodemap, "IRFormat")
+            ir_format_val = self._nodes.read("IRFormat")
             return RR.VarValue(_ir_format_params_rev[ir_format_val], "string")
+
+        if param_name == "frame_pipeline_stats":
+            return _stats_to_varvalue(self._frame_pipeline.stats())
+
+        if param_name == "stream_stats":
+            return _stats_to_varvalue(self._stream_stats())
+
+        if param_name == "frame_cache_stats":
+            return _stats_to_varvalue(self._frame_cache.stats())
+
+        if param_name == "change_detector_stats":
+            return _stats_to_varvalue(self._change_detector.stats())
+
+        if param_name == "frame_buffer_stats":
+            return _stats_to_varvalue(self._frame_buffer_pool.stats())
+
+        if param_name == "temperature_lut_stats":
+            return _stats_to_varvalue(self._temperature_lut.stats())
+
+        if param_name == "frame_statistics_stats":
+            return _stats_to_varvalue(self._frame_statistics.stats())
+
+        if param_name == "aggregate_stats":
+            return _stats_to_varvalue(self._aggregate_stats())
+
+        if param_name == "instrumentation_stats":
+            return _stats_to_varvalue(self._instrumentation_stats())
+
+        if param_name == "recording_stats":
+            return _stats_to_varvalue(self._frame_recorder.stats())
+
+        if param_name == "shared_memory_ring":
+            return _stats_to_varvalue(self._shared_frame_ring.layout())
+
+        if param_name == "trigger_capture_stats":
+            return _stats_to_varvalue(self._pretrigger_buffer.stats())
+
+        if param_name == "adaptive_quality_levels":
+            # Levels of the calling client, like isoch_downsample
+            client_endpoint = RR.ServerEndpoint.GetCurrentEndpoint()
+            return RR.VarValue({name: RR.VarValue(subscribers.client_level(client_endpoint), "int32")
+                for name, subscribers in self._pipe_subscribers()}, "varvalue{string}")
+
+        if param_name == "statistics_rois":
+            return RR.VarValue({name: RR.VarValue(np.array(roi, dtype=np.int32), "int32[]") 
+                for name, roi in self._frame_statistics.rois.items()}, "varvalue{string}")
+
+        _roi_param = _roi_params.get(param_name)
+        if _roi_param is not None:
+            with self._roi_lock:
+                settings = self._roi_settings.get(RR.ServerEndpoint.GetCurrentEndpoint(), RoiSettings())
+            param_value = getattr(settings, _roi_param[0])
+            if param_name == "roi":
+                param_value = np.array(param_value if param_value is not None else [], dtype=np.int32)
+            return RR.VarValue(param_value, _roi_param[1])
+
+        _encoder_param = _encoder_params.get(param_name)
+        if _encoder_param is not None:
+            return RR.VarValue(getattr(getattr(self, _encoder_param[0]), _encoder_param[1]), _encoder_param[2])
         
         raise RR.InvalidArgumentException("Invalid parameter")
 
     def setf_param(self, param_name, value):
         _normal_param = _normal_params.get(param_name)
         if _normal_param is not None:
-            _gige_set_node_value(self._nodemap, _normal_param[0], value.data[0])
+            self._nodes.write(_normal_param[0], value.data[0])
+            self._temperature_lut.invalidate()
+            if param_name in ("scale_limit_low", "scale_limit_upper", "current_case"):
+                self._update_scale_limits()
+            return
+
+        _roi_param = _roi_params.get(param_name)
+        if _roi_param is not None:
+            # ROI settings are per client, like isoch_downsample
+            param_value = value.data if _roi_param[1] != "int32" else value.data[0]
+            client_endpoint = RR.ServerEndpoint.GetCurrentEndpoint()
+            with self._roi_lock:
+                settings = self._roi_settings.get(client_endpoint, None)
+                settings = RoiSettings(*settings.key) if settings is not None else RoiSettings()
+                try:
+                    setattr(settings, _roi_param[0], param_value)
+                except ValueError as e:
+                    raise RR.InvalidArgumentException(str(e))
+                self._roi_settings[client_endpoint] = settings
+            return
+
+        if param_name == "statistics_rois":
+            try:
+                self._frame_statistics.rois = {name: roi.data for name, roi in value.data.items()}
+            except ValueError as e:
+                raise RR.InvalidArgumentException(str(e))
+            return
+
+        _encoder_param = _encoder_params.get(param_name)
+        if _encoder_param is not None:
+            param_value = value.data if _encoder_param[2] == "string" else value.data[0]
+            try:
+                setattr(getattr(self, _encoder_param[0]), _encoder_param[1], param_value)
+            except ValueError as e:
+                raise RR.InvalidArgumentException(str(e))
             return
         if param_name == "fps":
-            available_fps = dict(_get_available_fps(self._nodemap))
-            assert float(value.data) in available_fps, f"Invalid fps specified: {value.data}"
-            _gige_set_node_value(self._nodemap, "IRFrameRate", available_fps[float(value.data)])
+            fps = float(value.data[0])
+            assert fps in self._available_fps, f"Invalid fps specified: {fps}"
+            self._nodes.write("IRFrameRate", self._available_fps[fps])
             return          
         
         if param_name == "ir_format":
             ir_format_e = _ir_format_params.get(value.data, None)
             if ir_format_e is not None:
-                _gige_set_node_value(self._nodemap, "IRFormat", ir_format_e)
+                self._nodes.write("IRFormat", ir_format_e)
                 self._current_irformat = value.data
+                self._temperature_lut.invalidate()
                 return
             else:
                 raise RR.InvalidArgumentException(f"Invalid ir_format specified: {value.data}")
@@ -282,6 +1242,42 @@ class ThermalCameraImpl(object):
 
         raise RR.InvalidArgumentException("Invalid parameter")
 
+    def read_params(self, param_names):
+        with self._params_lock:
+            return {param_name: self.getf_param(param_name) for param_name in param_names}
+
+    def write_params(self, params):
+        # Parameters are written in order under a lock, so batches from different clients do not interleave.
+        # Names are checked first so a batch with a misspelled name writes nothing.
+        for param_name in params:
+            if param_name not in _writable_params:
+                raise RR.InvalidArgumentException(f"Invalid parameter: {param_name}")
+        with self._params_lock:
+            for param_name, value in params.items():
+                self.setf_param(param_name, value)
+
+    def snapshot_params(self):
+        with self._params_lock:
+            ret = dict()
+            for param_name in _normal_params:
+                try:
+                    value = self.getf_param(param_name)
+                except RR.InvalidArgumentException:
+                    # Not available on this camera backend, for instance in replay
+                    continue
+                # Nodes that are not readable on this camera are left out
+                if value.data is not None:
+                    ret[param_name] = value
+            return ret
+
+    def restore_params(self, snapshot):
+        for param_name in snapshot:
+            if param_name not in _normal_params:
+                raise RR.InvalidArgumentException(f"Invalid snapshot parameter: {param_name}")
+        # current_case selects the temperature range the scale limits apply to, so it is restored first
+        self.write_params({param_name: snapshot[param_name] for param_name in 
+            sorted(snapshot, key=lambda param_name: param_name != "current_case")})
+
 _ir_format_params = {
     "temperature_linear_10mK": "TemperatureLinear10mK",
     "temperature_linear_100mK": "TemperatureLinear100mK",
@@ -310,246 +1306,182 @@ _normal_params = {
     "current_case": ("CurrentCase", "int32")
 }
 
-class PySpinSystem:
+# Nodes resolved when the camera is started
+_camera_node_names = [node_name for node_name, _ in _normal_params.values()] + ["IRFormat", "IRFrameRate",
+    "AcquisitionFrameRate", "R", "B", "F", "J0", "J1"]
 
-    def __init__(self):
-        self._system = None
+# Each waiting capture_frame_next() call holds a Robot Raconteur thread pool thread, so waits are bounded
+_capture_next_max_timeout = 10.0
 
-    def start(self):
-        self._system = PySpin.System.GetInstance()
+# Limit on the frames returned by one capture_trigger_frames() or capture_trigger_stack() call, so the reply fits
+# in the default 12 MB Robot Raconteur message size
+_trigger_capture_max_bytes = 8 * 1024 * 1024
 
-    def open_thermal_camera(self, serial_number = None, ip_address = None, mac_address = None):
+# Frames waiting for the ingest thread. The ring buffer, recorder and aggregates need every frame, so the queue
+# is longer than the encoder queue and only overflows if the ingest thread stalls.
+_ingest_queue_size = 8
 
-        ip_integer = _ip_str_to_gige_integer(ip_address)
-        mac_integer = _mac_str_to_gige_integer(mac_address)
+_robdef_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "experimental.flir_thermal_camera.robdef")
 
-        cam_list = self._system.GetCameras()
-        try:
-            
-            num_cameras = cam_list.GetSize()
-
-            assert num_cameras > 0, "Could not find any cameras!"
-
-            for i, cam in enumerate(cam_list):
-                if serial_number is None and ip_integer is None and mac_integer is None:
-                    return cam
-                nodemap_tldevice = cam.GetTLDeviceNodeMap()
-               
-                if serial_number is not None:
-                    device_serial_number = _gige_read_node_value(nodemap_tldevice, 'DeviceSerialNumber')
-                    if device_serial_number is not None:                    
-                        if device_serial_number.strip() == serial_number.strip():
-                            return cam
-                if ip_integer is not None:
-                    device_ip_integer = _gige_read_node_value(nodemap_tldevice, "GevDeviceIPAddress")
-                    if device_ip_integer == ip_integer:
-                        return cam
-                if mac_integer is not None:
-                    device_mac_integer = _gige_read_node_value(nodemap_tldevice, 'GevDeviceMACAddress')
-                    if device_mac_integer == mac_integer:
-                        return cam
-                
-            assert False, "Could not find requested camera!"
+_roi_params = {
+    "roi": ("roi", "int32[]"),
+    "roi_decimation": ("decimation", "int32"),
+    "roi_decimation_mode": ("decimation_mode", "string")
+}
 
-        finally:
-            cam_list.Clear()
-    
-    def print_detected_cameras(self):
-        cam_list = self._system.GetCameras()
-        try:
-            
-            num_cameras = cam_list.GetSize()
-
-            assert num_cameras > 0, "Could not find any cameras!"
-
-            for i, cam in enumerate(cam_list):
-                nodemap_tldevice = cam.GetTLDeviceNodeMap()
-                
-                device_vendor = _gige_read_node_value(nodemap_tldevice, 'DeviceVendorName')
-                device_model = _gige_read_node_value(nodemap_tldevice, 'DeviceModelName')
-                device_serial_number = _gige_read_node_value(nodemap_tldevice, 'DeviceSerialNumber')
-                device_id = _gige_read_node_value(nodemap_tldevice, 'DeviceID')
-                device_ip_address = _gige_integer_to_ip_str(_gige_read_node_value(\
-                    nodemap_tldevice, 'GevDeviceIPAddress'))
-                device_mac_address = _gige_integer_to_mac_str(_gige_read_node_value(\
-                    nodemap_tldevice, 'GevDeviceMACAddress'))
-
-                print(f"{device_vendor}, {device_model}, {device_serial_number}, {device_id}, {device_ip_address}, {device_mac_address}")
-        finally:
-            cam_list.Clear()
-
-    def close(self):
-        if self._system is not None:
-            self._system.ReleaseInstance()
-
-def _gige_integer_to_ip_str(ip_integer):
-    if ip_integer is None:
-        return None
-    # https://stackoverflow.com/questions/9590965/convert-an-ip-string-to-a-number-and-vice-versa
-    return socket.inet_ntoa(struct.pack("!L", ip_integer))
-def _ip_str_to_gige_integer(ip_str):
-    if ip_str is None:
-        return None
-    # https://stackoverflow.com/questions/9590965/convert-an-ip-string-to-a-number-and-vice-versa
-    packedIP = socket.inet_aton(ip_str)
-    return struct.unpack("!L", packedIP)[0]
-
-def _gige_integer_to_mac_str(mac_integer):
-    if mac_integer is None:
-        return None
-    # https://stackoverflow.com/questions/36857521/how-to-convert-mac-address-to-decimal-in-python
-    mac_hex = "{:012x}".format(mac_integer)
-    mac_str = ":".join(mac_hex[i:i+2] for i in range(0, len(mac_hex), 2))
-    return mac_str
-
-def _mac_str_to_gige_integer(mac_str):
-    if mac_str is None:
-        return None
-    # https://stackoverflow.com/questions/36857521/how-to-convert-mac-address-to-decimal-in-python
-    mac_int = int(mac_str.translate(str.maketrans('','', ":.- ")), 16)
-    return mac_int
-
-def _gige_read_node_value(nodemap_tldevice, nodename):
-    node = nodemap_tldevice.GetNode(nodename)
-    if node is None:
-        return None
-    node_type_code = node.GetPrincipalInterfaceType()
-    if node_type_code == PySpin.intfIString:
-        node_val = PySpin.CStringPtr(node)
-    elif node_type_code == PySpin.intfIInteger:
-        node_val = PySpin.CIntegerPtr(node)
-    elif node_type_code == PySpin.intfIFloat:
-        node_val = PySpin.CFloatPtr(node)
-    elif node_type_code == PySpin.intfIEnumeration:
-        node_val = PySpin.CEnumerationPtr(node)
-    if not (PySpin.IsAvailable(node_val) and PySpin.IsReadable(node_val)):
-        return None
-    if hasattr(node_val, "GetIntValue"):
-        return node_val.GetEntry(node_val.GetIntValue()).GetDisplayName()
-    return node_val.GetValue()
-
-def _gige_set_node_value(nodemap_tldevice, nodename, value):
-    node = nodemap_tldevice.GetNode(nodename)
-    assert node is not None, "Invalid flir attribute node"
-    node_type_code = node.GetPrincipalInterfaceType()
-    if node_type_code == PySpin.intfIString:
-        node_val = PySpin.CStringPtr(node)
-        node_val.SetValue(value)
-    elif node_type_code == PySpin.intfIInteger:
-        node_val = PySpin.CIntegerPtr(node)
-        node_val.SetValue(int(value))
-    elif node_type_code == PySpin.intfIFloat:
-        node_val = PySpin.CFloatPtr(node)
-        node_val.SetValue(float(value))
-    elif node_type_code == PySpin.intfIEnumeration:
-        node_val = PySpin.CEnumerationPtr(node)
-        node_entry = node_val.GetEntryByName(value)
-        assert node_entry is not None
-        node_entry_int = PySpin.CEnumEntryPtr(node_entry).GetValue()
-        node_val.SetIntValue(node_entry_int)
-    else:
-        assert False, "Unsupported node type"
-
-def _get_fps(nodemap):
-    acquisition_framerate = _gige_read_node_value(nodemap, 'AcquisitionFrameRate')
+def _image_nbytes(image):
+    return len(image.data)
+
+def _stats_to_varvalue(stats):
+    ret = {}
+    for k, v in stats.items():
+        if isinstance(v, str):
+            ret[k] = RR.VarValue(v, "string")
+        elif isinstance(v, float):
+            ret[k] = RR.VarValue(v, "double")
+        elif isinstance(v, np.ndarray):
+            ret[k] = RR.VarValue(v.astype(np.uint64), "uint64[]")
+        else:
+            ret[k] = RR.VarValue(int(v), "uint64")
+    return RR.VarValue(ret, "varvalue{string}")
+
+_encoder_params = {
+    "preview_downscale": ("_preview_encoder", "downscale", "int32"),
+    "preview_quality": ("_preview_encoder", "quality", "int32"),
+    "preview_colormap": ("_preview_encoder", "colormap", "string"),
+    "preview_scale_mode": ("_preview_encoder", "scale_mode", "string"),
+    "compression_mode": ("_frame_compressor", "mode", "string"),
+    "png_compression_level": ("_frame_compressor", "png_level", "int32"),
+    "zlib_compression_level": ("_frame_compressor", "zlib_level", "int32"),
+    "delta_keyframe_interval": ("_delta_encoders", "keyframe_interval", "int32"),
+    "change_detector_mode": ("_change_detector", "mode", "string"),
+    "change_detector_stride": ("_change_detector", "stride", "int32"),
+    "change_detector_threshold": ("_change_detector", "threshold", "double"),
+    "temperature_output_format": ("_temperature_lut", "output_format", "string"),
+    "statistics_histogram_shift": ("_frame_statistics", "histogram_shift", "int32"),
+    "aggregate_window_frames": ("_frame_aggregator", "window_frames", "int32"),
+    "trigger_pre_seconds": ("_pretrigger_buffer", "pre_seconds", "double"),
+    "trigger_post_seconds": ("_pretrigger_buffer", "post_seconds", "double"),
+    "trigger_release_timeout": ("_pretrigger_buffer", "release_timeout", "double"),
+    "adaptive_quality_enabled": ("_adaptive_quality", "enabled", "int32"),
+    "adaptive_quality_latency_threshold": ("_adaptive_quality", "latency_threshold", "double"),
+    "adaptive_quality_recovery_time": ("_adaptive_quality", "recovery_time", "double"),
+    "adaptive_delta_keyframe_interval": ("_adaptive_quality", "delta_keyframe_interval", "int32")
+}
+
+_writable_params = set(_normal_params) | set(_roi_params) | set(_encoder_params) \
+    | {"fps", "ir_format", "statistics_rois"}
+
+class _GenICamNodes(object):
+    """
+    Typed GenICam node pointers of a node map, resolved once and reused
+
+    Looking up a node and building its typed pointer takes several calls into Spinnaker, so pointers are
+    built on first use and cached by node name, including nodes that do not exist. The entries of
+    enumeration nodes are cached as maps between the entry names and integer values. Availability is still
+    checked on every access since it can change with the camera state.
+    """
+
+    def __init__(self, nodemap):
+        self.nodemap = nodemap
+        self._nodes = dict()
+        self._enum_entries = dict()
+
+    def resolve(self, nodenames):
+        for nodename in nodenames:
+            self._node(nodename)
+
+    def _node(self, nodename):
+        ret = self._nodes.get(nodename)
+        if ret is not None:
+            return ret
+        node = self.nodemap.GetNode(nodename)
+        node_type_code = None
+        node_ptr = None
+        if node is not None:
+            node_type_code = node.GetPrincipalInterfaceType()
+            if node_type_code == PySpin.intfIString:
+                node_ptr = PySpin.CStringPtr(node)
+            elif node_type_code == PySpin.intfIInteger:
+                node_ptr = PySpin.CIntegerPtr(node)
+            elif node_type_code == PySpin.intfIFloat:
+                node_ptr = PySpin.CFloatPtr(node)
+            elif node_type_code == PySpin.intfIEnumeration:
+                node_ptr = PySpin.CEnumerationPtr(node)
+                entries = []
+                for entry in node_ptr.GetEntries():
+                    entry_ptr = PySpin.CEnumEntryPtr(entry)
+                    entries.append((entry_ptr, entry_ptr.GetValue(), entry_ptr.GetSymbolic(), 
+                        str(entry_ptr.GetDisplayName())))
+                self._enum_entries[nodename] = entries
+        ret = (node_type_code, node_ptr)
+        self._nodes[nodename] = ret
+        return ret
+
+    def read(self, nodename):
+        node_type_code, node_ptr = self._node(nodename)
+        if node_ptr is None or not (PySpin.IsAvailable(node_ptr) and PySpin.IsReadable(node_ptr)):
+            return None
+        if node_type_code == PySpin.intfIEnumeration:
+            int_value = node_ptr.GetIntValue()
+            for _, entry_value, _, display_name in self._enum_entries[nodename]:
+                if entry_value == int_value:
+                    return display_name
+            return node_ptr.GetEntry(int_value).GetDisplayName()
+        return node_ptr.GetValue()
+
+    def write(self, nodename, value):
+        node_type_code, node_ptr = self._node(nodename)
+        assert node_ptr is not None, "Invalid flir attribute node"
+        if node_type_code == PySpin.intfIString:
+            node_ptr.SetValue(value)
+        elif node_type_code == PySpin.intfIInteger:
+            node_ptr.SetValue(int(value))
+        elif node_type_code == PySpin.intfIFloat:
+            node_ptr.SetValue(float(value))
+        elif node_type_code == PySpin.intfIEnumeration:
+            for _, entry_value, symbolic, _ in self._enum_entries[nodename]:
+                if symbolic == value:
+                    node_ptr.SetIntValue(entry_value)
+                    return
+            node_entry = node_ptr.GetEntryByName(value)
+            assert node_entry is not None
+            node_ptr.SetIntValue(PySpin.CEnumEntryPtr(node_entry).GetValue())
+        else:
+            assert False, "Unsupported node type"
+
+    def enum_entries(self, nodename):
+        """Display names of the available and readable entries of an enumeration node"""
+        self._node(nodename)
+        return [display_name for entry_ptr, _, _, display_name in self._enum_entries.get(nodename, [])
+            if PySpin.IsAvailable(entry_ptr) and PySpin.IsReadable(entry_ptr)]
+
+def _get_fps(nodes):
+    acquisition_framerate = nodes.read('AcquisitionFrameRate')
     if acquisition_framerate is not None:
         return acquisition_framerate
 
-    ir_framerate = _gige_read_node_value(nodemap, 'IRFrameRate')
+    ir_framerate = nodes.read('IRFrameRate')
     if ir_framerate is not None:
         re_match = re.match(r".*Rate(\d+)Hz$", ir_framerate)
         if not re_match:
-            print("Could not parse IRFrameRate enum")
+            print(f"Could not parse IRFrameRate enum {ir_framerate}")
+            return None
         return float(re_match.group(1))
 
     return None
 
-def _get_available_fps(nodemap):
-    fps_enum_node = PySpin.CEnumerationPtr(nodemap.GetNode("IRFrameRate"))
-    assert PySpin.IsAvailable(fps_enum_node) or not PySpin.IsReadable(fps_enum_node), \
-        "Could not find IRFrameRate gige node"
-    fps_enum_entries = fps_enum_node.GetEntries()
+def _get_available_fps(nodes):
     ret = []
-    for fps_enum_entry in fps_enum_entries:
-        node_entry = PySpin.CEnumEntryPtr(fps_enum_entry)
-        if not PySpin.IsAvailable(node_entry) or not PySpin.IsReadable(node_entry):
-            continue
-        re_match = re.match(r".*Rate(\d+)Hz$", node_entry.GetDisplayName())
+    for display_name in nodes.enum_entries("IRFrameRate"):
+        re_match = re.match(r".*Rate(\d+)Hz$", display_name)
         if not re_match:
-            print("Could not parse IRFrameRate enum")
-        ret.append((float(re_match.group(1)), str(node_entry.GetDisplayName())))
+            # Entries that are not frame rates are skipped rather than failing driver startup
+            print(f"Could not parse IRFrameRate enum {display_name}, skipping")
+            continue
+        ret.append((float(re_match.group(1)), display_name))
     return ret
 
-    
-def main():
-    parser = argparse.ArgumentParser(description="Flir thermal camera driver service for Robot Raconteur")
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument("--camera-info-file", type=argparse.FileType('r'),default=None,help="Camera info file (required)")
-    group.add_argument("--list-cameras", action='store_true',default=False,help="List available cameras and exit")
-    group2 = parser.add_mutually_exclusive_group()
-    group2.add_argument("--camera-serial-number", type=str, default=None, help="Serial number of desired camera")
-    group2.add_argument("--camera-ip-address", type=str, default=None, help="IP address of desired camera")
-    group2.add_argument("--camera-mac-address", type=str, default=None, help="MAC address of desired camera")
-    parser.add_argument("--wait-signal",action='store_const',const=True,default=False, help="wait for SIGTERM orSIGINT (Linux only)")
-
-    args, _ = parser.parse_known_args()
-
-    if (args.list_cameras):
-        cam_sys = PySpinSystem()
-        cam_sys.start()
-        cam_sys.print_detected_cameras()
-        return
-
-    rr_args = ["--robotraconteur-jumbo-message=true"] + sys.argv
-
-    #RRN.RegisterServiceTypesFromFiles(['com.robotraconteur.imaging'],True)
-    RRC.RegisterStdRobDefServiceTypes(RRN)
-
-    with args.camera_info_file:
-        camera_info_text = args.camera_info_file.read()
-
-    info_loader = InfoFileLoader(RRN)
-    camera_info, camera_ident_fd = info_loader.LoadInfoFileFromString(camera_info_text, "com.robotraconteur.imaging.camerainfo.CameraInfo", "camera")
-
-    attributes_util = AttributesUtil(RRN)
-    camera_attributes = attributes_util.GetDefaultServiceAttributesFromDeviceInfo(camera_info.device_info)
-    
-    cam_sys = PySpinSystem()
-    cam_sys.start()
-    cam = cam_sys.open_thermal_camera(args.camera_serial_number, args.camera_ip_address, args.camera_mac_address)
-
-    # Use weakref.proxy to avoid creating dangling references to camera
-    weak_cam_proxy = weakref.proxy(cam)
-    camera = ThermalCameraImpl(weak_cam_proxy, camera_info)
-    try:
-        camera._start()
 
-        
-        with RR.ServerNodeSetup("experimental.flir_thermal_camera",60827,argv=rr_args):
-
-            service_ctx = RRN.RegisterService("camera","com.robotraconteur.imaging.Camera",camera)
-            service_ctx.SetServiceAttributes(camera_attributes)
-            time.sleep(1)
-            camera.start_streaming()
-
-            if args.wait_signal:  
-                #Wait for shutdown signal if running in service mode          
-                print("Press Ctrl-C to quit...")
-                import signal
-                signal.sigwait([signal.SIGTERM,signal.SIGINT])
-            else:            
-                input("Server started, press enter to quit...")
-            
-            camera._close_rr()
-            time.sleep(0.1)
-    finally:
-        camera._close_rr()
-        with suppress(Exception):
-            camera._close()
-        del camera
-
-        del cam
-
-        with suppress(Exception):
-            cam_sys.close()
-        del cam_sys
\ No newline at end of file
+# The entry point moved to driver_main, which only imports this module when the driver is started
+from .driver_main import main
@@ -0,0 +1,78 @@
+from flir_thermal_camera_robotraconteur_driver.adaptive_quality import AdaptiveQualitySettings, \
+    AdaptiveQualityController, adaptive_quality_max_level, adaptive_preview_encoding
+
+
+def test_dropped_frames_raise_level_with_hold_time():
+    controller = AdaptiveQualityController(AdaptiveQualitySettings(enabled=1))
+    controller.packet_dropped(10.0)
+    assert controller.level == 1
+    # Congestion within half a second of a level change does not raise the level again
+    controller.packet_dropped(10.2)
+    assert controller.level == 1
+    controller.packet_dropped(10.5)
+    assert controller.level == 2
+    for t in (11.0, 11.5, 12.0):
+        controller.packet_dropped(t)
+    assert controller.level == adaptive_quality_max_level
+    assert controller.escalation_count == adaptive_quality_max_level
+
+
+def test_high_latency_raises_level():
+    controller = AdaptiveQualityController(AdaptiveQualitySettings(enabled=1, latency_threshold=0.1))
+    t = 10.0
+    while controller.latency <= 0.1:
+        assert controller.level == 0
+        controller.packet_sent(0.5, t)
+        t += 0.01
+    assert controller.level == 1
+
+
+def test_level_recovers_after_recovery_time():
+    controller = AdaptiveQualityController(AdaptiveQualitySettings(enabled=1, recovery_time=2.0))
+    controller.packet_dropped(10.0)
+    controller.packet_dropped(10.5)
+    assert controller.level == 2
+    controller.packet_sent(0.0, 12.0)
+    assert controller.level == 2
+    controller.packet_sent(0.0, 12.5)
+    assert controller.level == 1
+    # Each step down waits for another recovery time
+    controller.packet_sent(0.0, 13.0)
+    assert controller.level == 1
+    controller.packet_sent(0.0, 14.5)
+    assert controller.level == 0
+
+
+def test_congestion_delays_recovery():
+    controller = AdaptiveQualityController(AdaptiveQualitySettings(enabled=1, recovery_time=2.0))
+    for t in (10.0, 10.5, 11.0, 11.5):
+        controller.packet_dropped(t)
+    assert controller.level == adaptive_quality_max_level
+    controller.packet_dropped(12.4)
+    controller.packet_sent(0.0, 13.6)
+    assert controller.level == adaptive_quality_max_level
+    controller.packet_sent(0.0, 14.4)
+    assert controller.level == adaptive_quality_max_level - 1
+
+
+def test_disabled():
+    settings = AdaptiveQualitySettings()
+    controller = AdaptiveQualityController(settings)
+    # Disabled by default
+    controller.packet_dropped(9.0)
+    assert controller.level == 0
+    settings.enabled = 1
+    controller.packet_dropped(10.0)
+    assert controller.level == 1
+    settings.enabled = 0
+    assert controller.level == 0
+    controller.packet_dropped(11.0)
+    settings.enabled = 1
+    assert controller.level == 0
+
+
+def test_preview_encoding():
+    assert adaptive_preview_encoding(0, 2, 70) == (2, 70)
+    assert adaptive_preview_encoding(1, 2, 70) == (2, 35)
+    assert adaptive_preview_encoding(2, 2, 70) == (4, 35)
+    assert adaptive_preview_encoding(1, 2, 15) == (2, 10)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.frame_aggregator import FrameAggregator
+
+
+def _frames(count, shape=(4, 6), seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 65536, shape).astype(np.uint16) for _ in range(count)]
+
+
+def test_window_mean_max_min():
+    aggregator = FrameAggregator(window_frames=3)
+    frames = _frames(6)
+    results = [aggregator.add(mat, "temperature_linear_10mK", seqno, None) for seqno, mat in enumerate(frames, 1)]
+    assert results[0] is None and results[1] is None and results[3] is None and results[4] is None
+    for window_index, result in enumerate((results[2], results[5])):
+        window = np.stack(frames[window_index * 3:window_index * 3 + 3])
+        assert result.window_index == window_index
+        assert (result.first_seqno, result.last_seqno) == (window_index * 3 + 1, window_index * 3 + 3)
+        assert result.frame_count == 3
+        assert result.mean.dtype == np.uint16
+        np.testing.assert_array_equal(result.mean, np.floor(window.mean(axis=0) + 0.5).astype(np.uint16))
+        np.testing.assert_array_equal(result.max, window.max(axis=0))
+        np.testing.assert_array_equal(result.min, window.min(axis=0))
+    # Each window gets its own arrays
+    assert results[2].max is not results[5].max
+    assert aggregator.stats()["aggregated"] == 2
+
+
+def test_format_change_discards_partial_window():
+    aggregator = FrameAggregator(window_frames=2)
+    frames = _frames(3)
+    assert aggregator.add(frames[0], "temperature_linear_10mK", 1, None) is None
+    assert aggregator.add(frames[1], "radiometric", 2, None) is None
+    result = aggregator.add(frames[2], "radiometric", 3, None)
+    assert result.first_seqno == 2
+    assert result.ir_format == "radiometric"
+    assert aggregator.stats()["discarded_windows"] == 1
+
+
+def test_reset():
+    aggregator = FrameAggregator(window_frames=2)
+    frames = _frames(3)
+    aggregator.add(frames[0], "temperature_linear_10mK", 1, None)
+    aggregator.reset()
+    aggregator.reset()
+    assert aggregator.add(frames[1], "temperature_linear_10mK", 2, None) is None
+    assert aggregator.add(frames[2], "temperature_linear_10mK", 3, None).first_seqno == 2
+    assert aggregator.stats()["discarded_windows"] == 1
+
+
+def test_window_frames_range():
+    with pytest.raises(ValueError):
+        FrameAggregator(window_frames=0)
+    with pytest.raises(ValueError):
+        FrameAggregator(window_frames=65537)
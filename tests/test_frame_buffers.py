@@ -0,0 +1,63 @@
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.frame_buffers import FrameBufferPool
+
+
+def test_released_buffer_is_reused():
+    pool = FrameBufferPool()
+    buf = pool.acquire((4, 6))
+    assert buf.mat.shape == (4, 6)
+    buf.release()
+    assert pool.acquire((4, 6)) is buf
+    stats = pool.stats()
+    assert stats["allocated"] == 1
+    assert stats["reused"] == 1
+    assert stats["in_use"] == 1
+
+
+def test_buffer_returned_after_last_release():
+    pool = FrameBufferPool()
+    buf = pool.acquire((4, 6))
+    assert buf.retain() is buf
+    buf.release()
+    assert pool.stats()["free"] == 0
+    assert pool.acquire((4, 6)) is not buf
+    buf.release()
+    assert pool.stats()["free"] == 1
+    assert pool.stats()["in_use"] == 1
+
+
+def test_release_errors():
+    pool = FrameBufferPool()
+    buf = pool.acquire((4, 6))
+    buf.release()
+    with pytest.raises(AssertionError):
+        buf.release()
+    with pytest.raises(AssertionError):
+        buf.retain()
+
+
+def test_shape_change_discards_free_buffers():
+    pool = FrameBufferPool()
+    small = pool.acquire((4, 6))
+    held = pool.acquire((4, 6))
+    small.release()
+    large = pool.acquire((8, 12))
+    assert large.mat.shape == (8, 12)
+    # Buffers of the old shape are discarded instead of returned to the pool
+    held.release()
+    stats = pool.stats()
+    assert stats["discarded"] == 2
+    assert stats["free"] == 0
+    assert stats["in_use"] == 1
+
+
+def test_max_free():
+    pool = FrameBufferPool(max_free=2)
+    bufs = [pool.acquire((4, 6)) for _ in range(3)]
+    for buf in bufs:
+        buf.release()
+    stats = pool.stats()
+    assert stats["free"] == 2
+    assert stats["discarded"] == 1
+    assert stats["in_use"] == 0
@@ -0,0 +1,106 @@
+import threading
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.frame_cache import EncodedFrameCache
+
+
+def _get(cache, seqno, encoding="png", size=10, calls=None):
+    def encode():
+        if calls is not None:
+            calls.append((seqno, encoding))
+        return f"{encoding}{seqno}"
+    return cache.get_or_encode(seqno, encoding, encode, lambda value: size)
+
+
+def test_hit_does_not_encode_again():
+    cache = EncodedFrameCache(max_entries=4)
+    calls = []
+    assert _get(cache, 1, calls=calls) == "png1"
+    assert _get(cache, 1, calls=calls) == "png1"
+    assert _get(cache, 1, "mono16", calls=calls) == "mono161"
+    assert calls == [(1, "png"), (1, "mono16")]
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 2
+
+
+def test_evicts_least_recently_used_entry():
+    cache = EncodedFrameCache(max_entries=2)
+    _get(cache, 1)
+    _get(cache, 2)
+    # Using frame 1 makes frame 2 the least recently used
+    _get(cache, 1)
+    _get(cache, 3)
+    calls = []
+    _get(cache, 1, calls=calls)
+    _get(cache, 2, calls=calls)
+    assert calls == [(2, "png")]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_evicts_by_total_size():
+    cache = EncodedFrameCache(max_entries=8, max_bytes=100)
+    for seqno in range(1, 4):
+        _get(cache, seqno, size=40)
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 80
+    assert stats["evictions"] == 1
+
+
+def test_oversized_entry_is_not_cached():
+    cache = EncodedFrameCache(max_entries=8, max_bytes=100)
+    _get(cache, 1, size=10)
+    assert _get(cache, 2, size=200) == "png2"
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 10
+    assert stats["evictions"] == 0
+
+
+def test_clear():
+    cache = EncodedFrameCache()
+    _get(cache, 1)
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
+    calls = []
+    _get(cache, 1, calls=calls)
+    assert calls == [(1, "png")]
+
+
+def test_encode_error_is_not_cached():
+    cache = EncodedFrameCache()
+
+    def fail():
+        raise RuntimeError("encode failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_encode(1, "png", fail, len)
+    assert _get(cache, 1) == "png1"
+
+
+def test_concurrent_requests_encode_once():
+    cache = EncodedFrameCache()
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def encode():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return "png1"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_encode(1, "png", encode, len)))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_encode(1, "png", encode, len)))
+    waiter.start()
+    finish.set()
+    owner.join(5)
+    waiter.join(5)
+    assert results == ["png1", "png1"]
+    assert calls == [1]
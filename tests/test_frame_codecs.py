@@ -0,0 +1,204 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.frame_codecs import FrameCompressor, DeltaFrameEncoder, \
+    DeltaEncoderGroups, DeltaFrameDecoder, compression_modes, decode_compressed_frame, split_byte_planes, join_byte_planes
+
+
+def _thermal_frame(height=48, width=64, seed=0):
+    # Temperature linear 10 mK counts around 300 K, with noise across the low byte
+    rng = np.random.default_rng(seed)
+    return (30000 + rng.integers(-500, 500, (height, width))).astype(np.uint16)
+
+
+def test_byte_planes_round_trip():
+    mat = _thermal_frame()
+    planes = split_byte_planes(mat)
+    assert len(planes) == mat.nbytes
+    assert planes[:mat.size] == (mat & 0xFF).astype(np.uint8).tobytes()
+    assert planes[mat.size:] == (mat >> 8).astype(np.uint8).tobytes()
+    decoded = join_byte_planes(planes, *mat.shape)
+    assert decoded.dtype == np.uint16
+    np.testing.assert_array_equal(decoded, mat)
+
+
+@pytest.mark.parametrize("mode", compression_modes)
+def test_compression_round_trip(mode):
+    mat = _thermal_frame()
+    data, compression = FrameCompressor(mode).encode(mat)
+    assert compression == mode
+    assert data.dtype == np.uint8
+    decoded = decode_compressed_frame(data, mat.shape[0], mat.shape[1], compression)
+    assert decoded.dtype == np.uint16
+    np.testing.assert_array_equal(decoded, mat)
+
+
+@pytest.mark.parametrize("mode", compression_modes)
+def test_compression_round_trip_full_range(mode):
+    mat = np.arange(256 * 256, dtype=np.uint32).astype(np.uint16).reshape(256, 256)
+    data, compression = FrameCompressor(mode).encode(mat)
+    np.testing.assert_array_equal(decode_compressed_frame(data, 256, 256, compression), mat)
+
+
+def test_compression_levels_round_trip():
+    mat = _thermal_frame()
+    for level in (0, 9):
+        compressor = FrameCompressor("png", png_level=level)
+        assert compressor.cache_key == f"png{level}"
+        data, _ = compressor.encode(mat)
+        np.testing.assert_array_equal(decode_compressed_frame(data, *mat.shape), mat)
+        compressor = FrameCompressor("byteplane_zlib", zlib_level=level)
+        assert compressor.cache_key == f"byteplane_zlib{level}"
+        data, _ = compressor.encode(mat)
+        np.testing.assert_array_equal(decode_compressed_frame(data, *mat.shape, "byteplane_zlib"), mat)
+
+
+def test_compressor_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        FrameCompressor("jpeg")
+    with pytest.raises(ValueError):
+        FrameCompressor(png_level=10)
+    with pytest.raises(ValueError):
+        FrameCompressor(zlib_level=-1)
+    with pytest.raises(ValueError):
+        decode_compressed_frame(np.zeros(4, dtype=np.uint8), 1, 2, "jpeg")
+
+
+def _var(data):
+    return SimpleNamespace(data=data)
+
+
+def _delta_packet(encoder, compressor, seqno, mat):
+    # Packs frames the way the driver sends them on frame_stream_compressed in delta mode
+    if encoder.needs_keyframe(mat):
+        data, compression = compressor.encode(mat)
+        encoder.set_keyframe(seqno, mat)
+        extended = {"compression": _var(compression), "delta_frame_type": _var("key")}
+    else:
+        data, compression, reference_seqno = encoder.encode_delta(seqno, mat)
+        extended = {"compression": _var(compression), "delta_frame_type": _var("delta"),
+            "delta_reference_seqno": _var(np.array([reference_seqno], dtype=np.uint64))}
+    image_info = SimpleNamespace(height=mat.shape[0], width=mat.shape[1], extended=extended,
+        data_header=SimpleNamespace(seqno=seqno))
+    return SimpleNamespace(image_info=image_info, data=data)
+
+
+def test_delta_zigzag_round_trip():
+    # Differences across the whole uint16 range, including wrap around in both directions
+    reference = np.array([[0, 65535, 1, 32768, 30000, 0]], dtype=np.uint16)
+    mat = np.array([[65535, 0, 0, 32767, 30001, 32768]], dtype=np.uint16)
+    encoder = DeltaFrameEncoder(keyframe_interval=10)
+    compressor = FrameCompressor("byteplane_zlib")
+    decoder = DeltaFrameDecoder()
+    packets = [_delta_packet(encoder, compressor, 1, reference), _delta_packet(encoder, compressor, 2, mat)]
+    assert packets[1].image_info.extended["delta_frame_type"].data == "delta"
+    np.testing.assert_array_equal(decoder.decode(packets[0]), reference)
+    np.testing.assert_array_equal(decoder.decode(packets[1]), mat)
+
+
+def test_delta_zigzag_small_changes_are_small():
+    reference = np.full((4, 4), 30000, dtype=np.uint16)
+    encoder = DeltaFrameEncoder(keyframe_interval=10)
+    encoder.set_keyframe(1, reference)
+    mat = reference.copy()
+    mat[0, 0] -= 1
+    mat[0, 1] += 1
+    data, compression, _ = encoder.encode_delta(2, mat)
+    zigzag = decode_compressed_frame(data, 4, 4, compression[len("delta_"):])
+    assert zigzag[0, 0] == 1
+    assert zigzag[0, 1] == 2
+    assert np.count_nonzero(zigzag) == 2
+
+
+def test_delta_stream_round_trip():
+    encoder = DeltaFrameEncoder(keyframe_interval=4)
+    compressor = FrameCompressor("byteplane_zlib")
+    decoder = DeltaFrameDecoder()
+    frame_types = []
+    for seqno in range(1, 11):
+        mat = _thermal_frame(seed=seqno)
+        packet = _delta_packet(encoder, compressor, seqno, mat)
+        frame_types.append(packet.image_info.extended["delta_frame_type"].data)
+        np.testing.assert_array_equal(decoder.decode(packet), mat)
+    assert frame_types == ["key", "delta", "delta", "delta", "key", "delta", "delta", "delta", "key", "delta"]
+    assert decoder.decoded_count == 10
+    assert decoder.missed_count == 0
+
+
+def test_delta_decoder_waits_for_keyframe_after_missed_frame():
+    encoder = DeltaFrameEncoder(keyframe_interval=3)
+    compressor = FrameCompressor("byteplane_zlib")
+    decoder = DeltaFrameDecoder()
+    frames = [_thermal_frame(seed=seqno) for seqno in range(1, 7)]
+    packets = [_delta_packet(encoder, compressor, seqno, mat) for seqno, mat in enumerate(frames, 1)]
+    assert decoder.decode(packets[0]) is not None
+    # packets[1] is lost, so the residual in packets[2] cannot be applied, nor any residual after it
+    assert decoder.decode(packets[2]) is None
+    np.testing.assert_array_equal(decoder.decode(packets[3]), frames[3])
+    np.testing.assert_array_equal(decoder.decode(packets[4]), frames[4])
+    assert decoder.missed_count == 1
+
+
+def test_delta_encoder_reset_forces_keyframe():
+    encoder = DeltaFrameEncoder(keyframe_interval=100)
+    mat = _thermal_frame()
+    assert encoder.needs_keyframe(mat)
+    encoder.set_keyframe(1, mat)
+    assert not encoder.needs_keyframe(mat)
+    assert encoder.needs_keyframe(_thermal_frame(height=24))
+    encoder.reset()
+    assert encoder.needs_keyframe(mat)
+    with pytest.raises(ValueError):
+        encoder.keyframe_interval = -1
+
+
+class _Client(object):
+    def __init__(self, downsample):
+        self.downsample = downsample
+        self.decoder = DeltaFrameDecoder()
+        self.frame_types = []
+
+
+def _send_delta_groups(groups, compressor, seqno, mat, clients):
+    for encoder, group_clients in groups.group(clients, mat):
+        packet = _delta_packet(encoder, compressor, seqno, mat)
+        groups.sent(encoder, group_clients)
+        for client in group_clients:
+            client.frame_types.append(packet.image_info.extended["delta_frame_type"].data)
+            np.testing.assert_array_equal(client.decoder.decode(packet), mat)
+
+
+def test_delta_groups_clients_at_different_downsample():
+    groups = DeltaEncoderGroups(keyframe_interval=6)
+    compressor = FrameCompressor("byteplane_zlib")
+    clients = [_Client(1), _Client(2), _Client(2)]
+    for seqno in range(1, 25):
+        mat = _thermal_frame(seed=seqno)
+        _send_delta_groups(groups, compressor, seqno, mat, [c for c in clients if seqno % c.downsample == 0])
+    assert clients[0].frame_types == (["key"] + ["delta"] * 5) * 4
+    assert clients[1].frame_types == (["key"] + ["delta"] * 5) * 2
+    # Clients sent the same frames share the encoded frames
+    assert clients[2].frame_types == clients[1].frame_types
+    for client in clients:
+        assert client.decoder.missed_count == 0
+
+
+def test_delta_groups_keyframe_after_missed_frame():
+    groups = DeltaEncoderGroups(keyframe_interval=100)
+    compressor = FrameCompressor("byteplane_zlib")
+    clients = [_Client(1), _Client(1)]
+    for seqno in range(1, 9):
+        mat = _thermal_frame(seed=seqno)
+        # The second client drops frame 4 because its backlog is full, and sending frame 6 fails
+        _send_delta_groups(groups, compressor, seqno, mat, clients if seqno != 4 else clients[:1])
+        if seqno == 6:
+            groups.discard(clients[1])
+    assert clients[0].frame_types == ["key"] + ["delta"] * 7
+    assert clients[1].frame_types == ["key", "delta", "delta", "key", "delta", "key", "delta"]
+    for client in clients:
+        assert client.decoder.missed_count == 0
+    groups.reset()
+    assert groups.group(clients, _thermal_frame())[0][1] == clients
+    with pytest.raises(ValueError):
+        groups.keyframe_interval = -1
@@ -0,0 +1,77 @@
+import os
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.frame_recorder import FrameRecorder, RecordingReader
+
+
+def _frame(seqno, shape=(4, 6), ir_format="temperature_linear_10mK"):
+    ts = np.zeros(1, dtype=[("seconds", "<i8"), ("nanoseconds", "<i4")])
+    ts["seconds"] = 1000 + seqno // 10
+    ts["nanoseconds"] = (seqno % 10) * 100000000
+    mat = (np.arange(shape[0] * shape[1], dtype=np.uint16).reshape(shape) + seqno).astype(np.uint16)
+    return SimpleNamespace(seqno=seqno, mat=mat, ir_format=ir_format, data_header=SimpleNamespace(ts=ts))
+
+
+def test_disabled(tmp_path):
+    recorder = FrameRecorder(None)
+    assert not recorder.enabled
+    with pytest.raises(ValueError):
+        recorder.start()
+    assert not recorder.submit(_frame(1))
+
+
+def test_record_and_read(tmp_path):
+    released = []
+    recorder = FrameRecorder(str(tmp_path), chunk_frames=4, release_frame=released.append)
+    path = recorder.start("test")
+    assert recorder.recording
+    frames = [_frame(seqno) for seqno in range(1, 11)]
+    frames[7].ir_format = "radiometric"
+    for frame in frames:
+        assert recorder.submit(frame)
+    recorder.stop()
+    assert not recorder.recording
+    assert len(released) == 10
+
+    stats = recorder.stats()
+    assert stats["recorded"] == 10
+    assert stats["dropped"] == 0
+    assert stats["chunks"] == 3
+    # The last chunk is truncated to the frames written
+    assert os.path.getsize(os.path.join(path, "chunk_00002.raw")) == 2 * frames[0].mat.nbytes
+
+    reader = RecordingReader(path)
+    assert len(reader) == 10
+    for i, frame in enumerate(frames):
+        mat, seqno, ts, ir_format = reader.read(i)
+        np.testing.assert_array_equal(mat, frame.mat)
+        assert seqno == frame.seqno
+        assert ts == pytest.approx(1000 + frame.seqno // 10 + (frame.seqno % 10) * 0.1)
+        assert ir_format == frame.ir_format
+    assert reader.find_seqno(5) == 4
+    assert reader.find_seqno(11) == -1
+
+
+def test_resolution_change_starts_new_chunk(tmp_path):
+    recorder = FrameRecorder(str(tmp_path), chunk_frames=8)
+    path = recorder.start("test")
+    recorder.submit(_frame(1))
+    recorder.submit(_frame(2, shape=(8, 12)))
+    recorder.stop()
+    reader = RecordingReader(path)
+    assert reader.read(0)[0].shape == (4, 6)
+    assert reader.read(1)[0].shape == (8, 12)
+
+
+def test_invalid_and_existing_names(tmp_path):
+    recorder = FrameRecorder(str(tmp_path))
+    with pytest.raises(ValueError):
+        recorder.start("../test")
+    recorder.start("test")
+    with pytest.raises(ValueError):
+        recorder.start("other")
+    recorder.stop()
+    with pytest.raises(ValueError):
+        recorder.start("test")
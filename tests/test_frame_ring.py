@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.frame_ring import PretriggerRingBuffer
+
+
+def _frame(seqno):
+    return np.full((4, 6), seqno, dtype=np.uint16)
+
+
+def _push(ring, seqnos, fps=10.0):
+    for seqno in seqnos:
+        ring.push(seqno, _frame(seqno), "temperature_linear_10mK", f"header{seqno}", seqno / fps)
+
+
+def test_disabled():
+    ring = PretriggerRingBuffer()
+    assert not ring.enabled
+    with pytest.raises(ValueError):
+        ring.trigger(1, 0.0)
+
+
+def test_capacity_from_max_bytes():
+    ring = PretriggerRingBuffer(max_bytes=5 * 4 * 6 * 2 + 10)
+    _push(ring, range(1, 3))
+    assert ring.stats()["capacity"] == 5
+    assert ring.stats()["frames"] == 2
+
+
+def test_frame_larger_than_buffer_is_skipped():
+    ring = PretriggerRingBuffer(max_bytes=10)
+    _push(ring, [1])
+    assert ring.stats()["skipped"] == 1
+    assert ring.stats()["frames"] == 0
+
+
+def test_trigger_window():
+    # 10 fps, 1 s before and 0.5 s after the trigger
+    ring = PretriggerRingBuffer(max_bytes=100 * 4 * 6 * 2, pre_seconds=1.0, post_seconds=0.5)
+    _push(ring, range(1, 31))
+    ring.trigger(30, 3.0)
+    assert ring.state == "post_trigger"
+    _push(ring, range(31, 35))
+    assert ring.state == "post_trigger"
+    _push(ring, [35])
+    assert ring.state == "captured"
+
+    trigger_seqno, frame_count, frames, seqnos, timestamps, ir_formats, data_headers = ring.get_capture(0)
+    assert trigger_seqno == 30
+    assert frame_count == 16
+    np.testing.assert_array_equal(seqnos, np.arange(20, 36))
+    np.testing.assert_allclose(timestamps, np.arange(20, 36) / 10.0 - 3.0)
+    np.testing.assert_array_equal(frames[:, 0, 0], np.arange(20, 36))
+    assert ir_formats == ["temperature_linear_10mK"] * 16
+    assert data_headers[0] == "header20"
+    assert data_headers[-1] == "header35"
+
+    # The capture is frozen until released
+    _push(ring, [36])
+    assert ring.stats()["skipped"] == 1
+    assert ring.get_capture(0)[3][-1] == 35
+    ring.release()
+    assert ring.state == "recording"
+    with pytest.raises(ValueError):
+        ring.get_capture(0)
+
+
+def test_trigger_window_limited_by_capacity():
+    ring = PretriggerRingBuffer(max_bytes=8 * 4 * 6 * 2, pre_seconds=2.0, post_seconds=0.0)
+    _push(ring, range(1, 31))
+    ring.trigger(30, 3.0)
+    assert ring.state == "captured"
+    _, _, frames, seqnos, _, _, _ = ring.get_capture(0)
+    # The ring wrapped, only the newest 8 frames are left, oldest first
+    np.testing.assert_array_equal(seqnos, np.arange(23, 31))
+    np.testing.assert_array_equal(frames[:, 0, 0], np.arange(23, 31))
+
+
+def test_trigger_state_errors():
+    ring = PretriggerRingBuffer(max_bytes=10 * 4 * 6 * 2, pre_seconds=1.0, post_seconds=1.0)
+    _push(ring, range(1, 5))
+    ring.trigger(4, 0.4)
+    with pytest.raises(ValueError):
+        ring.trigger(4, 0.4)
+    # Post-trigger frames have not arrived yet
+    with pytest.raises(ValueError):
+        ring.get_capture(0.01)
+
+
+def test_resolution_change_discards_frames():
+    ring = PretriggerRingBuffer(max_bytes=10 * 8 * 12 * 2)
+    _push(ring, range(1, 5))
+    ring.push(5, np.zeros((8, 12), dtype=np.uint16), "temperature_linear_10mK", None, 0.5)
+    assert ring.stats()["frames"] == 1
+    assert ring.stats()["capacity"] == 10
+
+
+def test_capture_in_chunks():
+    ring = PretriggerRingBuffer(max_bytes=100 * 4 * 6 * 2, pre_seconds=1.0, post_seconds=0.0)
+    _push(ring, range(1, 31))
+    ring.trigger(30, 3.0)
+    _, frame_count, _, seqnos, _, _, data_headers = ring.get_capture(0, 4, 5)
+    assert frame_count == 11
+    np.testing.assert_array_equal(seqnos, np.arange(24, 29))
+    assert data_headers == [f"header{i}" for i in range(24, 29)]
+    # The chunk is limited to max_bytes, but holds at least one frame
+    np.testing.assert_array_equal(ring.get_capture(0, 0, 0, 3 * 4 * 6 * 2)[3], [20, 21, 22])
+    np.testing.assert_array_equal(ring.get_capture(0, 9, 5, 3 * 4 * 6 * 2)[3], [29, 30])
+    np.testing.assert_array_equal(ring.get_capture(0, 2, 0, 10)[3], [22])
+    assert len(ring.get_capture(0, 11)[3]) == 0
+
+
+def test_release_timeout_and_owner():
+    ring = PretriggerRingBuffer(max_bytes=100 * 4 * 6 * 2, pre_seconds=1.0, post_seconds=0.0, release_timeout=2.0)
+    _push(ring, range(1, 11))
+    ring.trigger(10, 1.0, owner="client1")
+    # Releasing for another client leaves the capture frozen
+    ring.release("client2")
+    _push(ring, range(11, 30))
+    assert ring.state == "captured"
+    assert ring.stats()["skipped"] == 19
+    # Not released within 2 s of completing, the frame at 3 s discards the capture and is recorded
+    _push(ring, [30])
+    assert ring.state == "recording"
+    assert ring.stats()["expired"] == 1
+
+    ring.trigger(30, 3.0, owner="client1")
+    ring.release("client1")
+    assert ring.state == "recording"
+    with pytest.raises(ValueError):
+        ring.release_timeout = -1
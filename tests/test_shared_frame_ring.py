@@ -0,0 +1,114 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+from flir_thermal_camera_robotraconteur_driver.shared_frame_ring import SharedFrameRingWriter, \
+    SharedFrameRingReader
+
+
+@pytest.fixture
+def writer():
+    writer = SharedFrameRingWriter(slot_count=3)
+    yield writer
+    writer.close()
+
+
+def _open_reader(name):
+    reader = SharedFrameRingReader(name)
+    if os.name == "posix" and sys.version_info < (3, 13):
+        # Attaching unregisters the segment from the resource tracker, which removes the registration of the
+        # writer when both are in the same process
+        from multiprocessing import resource_tracker
+        resource_tracker.register(reader._shm._name, "shared_memory")
+    return reader
+
+
+def _write(writer, seqno, shape=(4, 6)):
+    mat = np.full(shape, seqno, dtype=np.uint16)
+    writer.write(seqno, mat, "temperature_linear_10mK", 1000 + seqno, 500)
+    return mat
+
+
+def test_disabled():
+    writer = SharedFrameRingWriter()
+    assert not writer.enabled
+    assert writer.layout()["name"] == ""
+
+
+def test_read_frames(writer):
+    _write(writer, 11)
+    layout = writer.layout()
+    assert layout["slot_count"] == 3
+    assert (layout["width"], layout["height"]) == (6, 4)
+    reader = _open_reader(layout["name"])
+    try:
+        assert reader.frames_written == 1
+        frame = reader.read()
+        assert frame.frame_index == 0
+        assert frame.seqno == 11
+        assert frame.ir_format == "temperature_linear_10mK"
+        assert frame.timestamp == pytest.approx(1011.0000005)
+        np.testing.assert_array_equal(frame.mat, np.full((4, 6), 11))
+        for seqno in range(12, 15):
+            _write(writer, seqno)
+        assert reader.frames_written == 4
+        assert reader.read().seqno == 14
+        assert reader.read(1).seqno == 12
+        # Frame 0 was overwritten by frame 3
+        assert reader.read(0) is None
+        assert reader.read(4) is None
+        assert reader.wait(3, 0)
+        assert not reader.wait(4, 0.01)
+    finally:
+        reader.close()
+
+
+def test_view_invalidated_by_overwrite(writer):
+    _write(writer, 1)
+    reader = _open_reader(writer.layout()["name"])
+    try:
+        frame = reader.view()
+        assert frame.seqno == 1
+        _write(writer, 2)
+        _write(writer, 3)
+        assert reader.valid(frame)
+        _write(writer, 4)
+        assert not reader.valid(frame)
+        frame = None
+    finally:
+        reader.close()
+
+
+def test_slot_being_written_is_not_read(writer):
+    _write(writer, 1)
+    reader = _open_reader(writer.layout()["name"])
+    try:
+        # Odd sequence while the writer is copying the frame
+        slot_header = writer._slot_headers[0]
+        slot_header["sequence"] += 1
+        assert reader.view(0) is None
+        assert reader.read(0) is None
+        slot_header["sequence"] += 1
+        frame = reader.view(0)
+        assert frame is not None
+        # The writer starts overwriting the slot while the frame is in use
+        slot_header["sequence"] += 1
+        assert not reader.valid(frame)
+        frame = None
+    finally:
+        reader.close()
+
+
+def test_resolution_change_creates_new_segment(writer):
+    _write(writer, 1)
+    name = writer.layout()["name"]
+    _write(writer, 2, shape=(8, 12))
+    layout = writer.layout()
+    assert layout["name"] != name
+    assert layout["frames_written"] == 1
+    reader = _open_reader(layout["name"])
+    try:
+        assert reader.read().mat.shape == (8, 12)
+    finally:
+        reader.close()